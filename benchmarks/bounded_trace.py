@@ -0,0 +1,53 @@
+"""
+Overhead of keeping a BoundedTrace attached to an interpreter of the elevator example, compared
+to no trace and to log_trace, in time per macro step and in memory at the end of the run.
+
+Usage: python benchmarks/bounded_trace.py [events] [capacity]
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from sismic.clock import SimulatedClock
+from sismic.helpers import BoundedTrace, log_trace
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+
+
+def run(statechart, events: int, attach):
+    rng = random.Random(0)
+    clock = SimulatedClock()
+    interpreter = Interpreter(statechart, clock=clock)
+    trace = attach(interpreter)
+
+    tracemalloc.start()
+    steps = 0
+    start = time.perf_counter()
+    for _ in range(events):
+        interpreter.queue('floorSelected', floor=rng.randrange(6))
+        clock.time += 10
+        steps += len(interpreter.execute())
+    duration = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del trace
+    return duration / steps, memory
+
+
+def main(events: int=2000, capacity: int=1000) -> None:
+    statechart = import_from_yaml(filepath='docs/examples/elevator/elevator.yaml')
+
+    for name, attach in (
+        ('no trace', lambda interpreter: None),
+        ('log_trace', log_trace),
+        ('BoundedTrace', lambda interpreter: BoundedTrace(interpreter, capacity)),
+    ):
+        run(statechart, min(events, 100), attach)  # Warm up
+        duration, memory = run(statechart, events, attach)
+        print('{:>12}: {:.2f} us per step, {:.1f} kB in memory'.format(name, duration * 1e6, memory / 1000))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
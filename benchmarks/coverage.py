@@ -0,0 +1,55 @@
+"""
+Time and memory to compute the coverage of a synthetic statechart with log_trace and
+coverage_from_trace, compared to a CoverageCollector attached to the interpreter.
+
+Usage: python benchmarks/coverage.py [events]
+"""
+import sys
+import time
+import tracemalloc
+
+from sismic.generator import generate_events, generate_statechart
+from sismic.helpers import coverage_from_trace, log_trace
+from sismic.interpreter import CoverageCollector, Interpreter
+
+
+def run(statechart, events, collect):
+    interpreter = Interpreter(statechart)
+    interpreter.execute()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    coverage = collect(interpreter, events)
+    duration = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return coverage, duration / len(events), memory
+
+
+def with_trace(interpreter, events):
+    trace = log_trace(interpreter)
+    for event in events:
+        interpreter.queue(event).execute()
+    return coverage_from_trace(trace)
+
+
+def with_collector(interpreter, events):
+    collector = CoverageCollector(interpreter.statechart)
+    collector.attach(interpreter)
+    for event in events:
+        interpreter.queue(event).execute()
+    return collector.coverage()
+
+
+def main(events: int=20000) -> None:
+    statechart = generate_statechart(depth=3, regions=3, transitions=100, guards=0.5, actions=0.5, history=0.3)
+    workload = generate_events(statechart, events)
+
+    for name, collect in (('log_trace', with_trace), ('collector', with_collector)):
+        coverage, duration, memory = run(statechart, workload, collect)
+        print('{:>9}: {:.2f} us per event, {:.1f} kB in memory, {} transitions covered'.format(
+            name, duration * 1e6, memory / 1000, len(coverage['processed transitions'])))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
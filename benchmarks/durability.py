@@ -0,0 +1,58 @@
+"""
+Throughput of the elevator example when its execution is recorded in a WriteAheadLog, for several
+values of sync_every (with and without fsync), and time to recover it from its latest checkpoint
+and the tail of its log.
+
+Usage: python benchmarks/durability.py [events] [checkpoint_every]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sismic.clock import SimulatedClock
+from sismic.interpreter import Interpreter, WriteAheadLog
+from sismic.io import import_from_yaml
+
+
+def run(statechart, log, events: int) -> float:
+    rng = random.Random(0)
+    clock = SimulatedClock()
+    interpreter = Interpreter(statechart, clock=clock) if log is None else log.recover(statechart, clock=clock)
+
+    start = time.perf_counter()
+    for _ in range(events):
+        interpreter.queue('floorSelected', floor=rng.randrange(6))
+        clock.time += 10
+        interpreter.execute()
+    duration = time.perf_counter() - start
+
+    if log is not None:
+        log.close()
+    return duration / events
+
+
+def main(events: int=2000, checkpoint_every: int=1000) -> None:
+    statechart = import_from_yaml(filepath='docs/examples/elevator/elevator.yaml')
+
+    print('{:>26}: {:.2f} us per event'.format('no log', run(statechart, None, events) * 1e6))
+    for fsync in (True, False):
+        for sync_every in (1, 10, 100):
+            with tempfile.TemporaryDirectory() as directory:
+                log = WriteAheadLog(directory, sync_every=sync_every, fsync=fsync, checkpoint_every=checkpoint_every)
+                duration = run(statechart, log, events)
+
+                start = time.perf_counter()
+                log = WriteAheadLog(directory, checkpoint_every=None)
+                log.recover(statechart)
+                recovery = time.perf_counter() - start
+                log.close()
+
+            print('{:>26}: {:.2f} us per event, {:.2f} ms to recover ({} records replayed)'.format(
+                'sync_every={}{}'.format(sync_every, '' if fsync else ' (no fsync)'),
+                duration * 1e6, recovery * 1e3, log.replayed))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,88 @@
+"""
+Throughput of PythonEvaluator when code is evaluated with eval/exec, and when
+code is compiled into functions (see the compile_functions parameter).
+
+Both a micro-benchmark on a guard and an action, and the execution of a
+statechart that mostly evaluates guards and executes actions, are measured.
+
+Usage: python benchmarks/evaluator.py [events]
+"""
+import sys
+import timeit
+
+from functools import partial
+
+from sismic.code import PythonEvaluator
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+
+
+STATECHART = """
+statechart:
+  name: counter
+  preamble: |
+    x = 0
+    y = []
+  root state:
+    name: root
+    initial: s1
+    states:
+    - name: s1
+      transitions:
+      - target: s2
+        event: go
+        guard: active('s1') and isinstance(x, int) and len(y) < 1000 and event.data['v'] > 0
+        action: |
+          for i in range(event.data['v']):
+              x += abs(i) + 1
+          y.append(min(x, max(y, default=0)))
+    - name: s2
+      transitions:
+      - target: s1
+        event: go
+        guard: event is not None and active('s2') and (x % 2 == 0 or x % 2 == 1)
+        action: |
+          if len(y) > 500:
+              y.clear()
+          send('done', total=x)
+"""
+
+
+def micro_benchmark(compile_functions: bool, number: int) -> float:
+    interpreter = Interpreter(import_from_yaml(STATECHART),
+                              evaluator_klass=partial(PythonEvaluator, compile_functions=compile_functions))
+    evaluator = interpreter._evaluator
+
+    def run():
+        guard = "event is None and active('s1') and len(y) < 1000"
+        evaluator._evaluate_code(guard, additional_context={'event': None})
+        evaluator._execute_code('for i in range(10):\n    x = max(x, i) + 1\ny.append(len(y))\ny.clear()')
+
+    return min(timeit.repeat(run, repeat=10, number=number)) / number
+
+
+def statechart_benchmark(compile_functions: bool, events: int) -> float:
+    statechart = import_from_yaml(STATECHART)
+
+    def run():
+        interpreter = Interpreter(statechart,
+                                  evaluator_klass=partial(PythonEvaluator, compile_functions=compile_functions))
+        for _ in range(events):
+            interpreter.queue('go', v=5)
+        interpreter.execute()
+
+    return min(timeit.repeat(run, repeat=5, number=1)) / events
+
+
+def main(events: int=2000) -> None:
+    for compile_functions in (False, True):
+        label = 'functions' if compile_functions else 'eval/exec'
+        print('{:>9}: guard + action {:.2f} us, statechart {:.2f} us per event'.format(
+            label,
+            micro_benchmark(compile_functions, 10000) * 1e6,
+            statechart_benchmark(compile_functions, events) * 1e6,
+        ))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,52 @@
+"""
+Memory footprint of idle interpreters, for Interpreter and CompactInterpreter.
+
+A given number of interpreters are created for the elevator example, and each of them
+receives a few events. The memory they use is measured with tracemalloc, and compared with
+the footprint computed by memory_footprint. The time to process events is reported as well.
+
+Usage: python benchmarks/footprint.py [interpreters] [events]
+"""
+import sys
+import timeit
+import tracemalloc
+
+from sismic.interpreter import CompactInterpreter, Interpreter, memory_footprint
+from sismic.io import import_from_yaml
+
+
+def create(klass, statechart, events: int):
+    interpreter = klass(statechart)
+    for i in range(events):
+        interpreter.queue('floorSelected', floor=i % 5)
+        interpreter.execute()
+    return interpreter
+
+
+def measure(klass, statechart, interpreters: int, events: int):
+    create(klass, statechart, events)  # Warm up shared caches, if any
+
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        instances = [create(klass, statechart, events) for _ in range(interpreters)]
+        allocated = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+    footprint = memory_footprint(instances[0])['total']
+    duration = min(timeit.repeat(lambda: create(klass, statechart, events), repeat=5, number=10)) / 10
+    return allocated / interpreters, footprint, duration / max(events, 1)
+
+
+def main(interpreters: int=1000, events: int=10) -> None:
+    statechart = import_from_yaml(filepath='docs/examples/elevator/elevator.yaml')
+
+    for klass in (Interpreter, CompactInterpreter):
+        allocated, footprint, duration = measure(klass, statechart, interpreters, events)
+        print('{:>18}: {:>8.0f} bytes per interpreter (tracemalloc), {:>6} bytes (memory_footprint), '
+              '{:.2f} us per event (including creation)'.format(klass.__name__, allocated, footprint, duration * 1e6))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
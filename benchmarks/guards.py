@@ -0,0 +1,55 @@
+"""
+Throughput of guard evaluation for a state acting as a dispatch table, ie. having
+many guarded transitions for a same event, when guards are evaluated one by one,
+and when they are compiled into a single function (see the compile_functions
+parameter of PythonEvaluator).
+
+Usage: python benchmarks/guards.py [branches] [events]
+"""
+import sys
+import timeit
+
+from functools import partial
+
+from sismic.code import PythonEvaluator
+from sismic.interpreter import Interpreter
+from sismic.model import BasicState, CompoundState, Statechart, Transition
+
+
+def dispatch_statechart(branches: int) -> Statechart:
+    statechart = Statechart('dispatch', preamble='x = 0')
+    statechart.add_state(CompoundState('root', initial='dispatch'), None)
+    statechart.add_state(BasicState('dispatch'), 'root')
+
+    for branch in range(branches):
+        statechart.add_transition(Transition(
+            'dispatch', event='go', guard='event.data["v"] % {} == {} and x >= 0'.format(branches, branch),
+            action='x += 1'
+        ))
+
+    return statechart
+
+
+def benchmark(statechart: Statechart, compile_functions: bool, events: int) -> float:
+    def run():
+        interpreter = Interpreter(statechart,
+                                  evaluator_klass=partial(PythonEvaluator, compile_functions=compile_functions))
+        for value in range(events):
+            interpreter.queue('go', v=value)
+        interpreter.execute()
+
+    return min(timeit.repeat(run, repeat=5, number=1)) / events
+
+
+def main(branches: int=25, events: int=1000) -> None:
+    statechart = dispatch_statechart(branches)
+    for compile_functions in (False, True):
+        print('{:>9}: {} branches, {:.2f} us per event'.format(
+            'functions' if compile_functions else 'eval',
+            branches,
+            benchmark(statechart, compile_functions, events) * 1e6,
+        ))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
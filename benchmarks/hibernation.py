@@ -0,0 +1,34 @@
+"""
+Size of hibernated interpreters, compared to the memory footprint of resident ones, and time
+needed to hibernate and revive them, for the elevator example.
+
+Usage: python benchmarks/hibernation.py [events]
+"""
+import sys
+import timeit
+
+from sismic.interpreter import (CompactInterpreter, Interpreter, hibernate, memory_footprint, revive,
+                                statechart_fingerprint)
+from sismic.io import import_from_yaml
+
+
+def main(events: int=10) -> None:
+    statechart = import_from_yaml(filepath='docs/examples/elevator/elevator_contract.yaml')
+    fingerprint = statechart_fingerprint(statechart)
+
+    for klass in (Interpreter, CompactInterpreter):
+        interpreter = klass(statechart)
+        for i in range(events):
+            interpreter.queue('floorSelected', floor=i % 5).execute()
+
+        blob = hibernate(interpreter, fingerprint=fingerprint)
+        hibernation = min(timeit.repeat(lambda: hibernate(interpreter, fingerprint=fingerprint), repeat=5, number=100))
+        revival = min(timeit.repeat(
+            lambda: revive(blob, statechart, fingerprint=fingerprint, interpreter_klass=klass), repeat=5, number=100))
+
+        print('{:>18}: {:>6} bytes resident, {:>4} bytes hibernated, {:.2f} us to hibernate, {:.2f} us to revive'.format(
+            klass.__name__, memory_footprint(interpreter)['total'], len(blob), hibernation * 1e4, revival * 1e4))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,43 @@
+"""
+Benchmark for Statechart.leaf_for on a wide orthogonal statechart.
+
+The statechart has a root orthogonal state with many regions, each region
+being a chain of nested compound states. Its whole set of states is used as
+the configuration, which is the worst case for leaf_for.
+
+Usage: python benchmarks/leaf_for.py [regions] [depth]
+"""
+import sys
+import timeit
+
+from sismic.model import BasicState, CompoundState, OrthogonalState, Statechart
+
+
+def wide_orthogonal_statechart(regions: int, depth: int) -> Statechart:
+    statechart = Statechart('wide orthogonal')
+    statechart.add_state(OrthogonalState('root'), None)
+
+    for region in range(regions):
+        parent = 'root'
+        for level in range(depth):
+            name = 'r{}_{}'.format(region, level)
+            statechart.add_state(CompoundState(name, initial='r{}_{}'.format(region, level + 1)), parent)
+            parent = name
+        statechart.add_state(BasicState('r{}_{}'.format(region, depth)), parent)
+
+    return statechart
+
+
+def main(regions: int=200, depth: int=10, repeat: int=5, number: int=20) -> None:
+    statechart = wide_orthogonal_statechart(regions, depth)
+    configuration = statechart.states
+
+    timings = timeit.repeat(lambda: statechart.leaf_for(configuration), repeat=repeat, number=number)
+    best = min(timings) / number
+
+    print('leaf_for: {} states, {} leaves, {:.3f} ms per call'.format(
+        len(configuration), len(statechart.leaf_for(configuration)), best * 1000))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,33 @@
+"""
+Execution time of a statechart acting as a dispatch table (see guards.py), without
+metrics, and with the performance counters of InterpreterMetrics.
+
+Usage: python benchmarks/metrics.py [branches] [events]
+"""
+import sys
+import timeit
+
+from sismic.interpreter import Interpreter, InterpreterMetrics
+
+from guards import dispatch_statechart
+
+
+def benchmark(statechart, events: int, metrics: bool) -> float:
+    def run():
+        interpreter = Interpreter(statechart, metrics=InterpreterMetrics() if metrics else None)
+        for value in range(events):
+            interpreter.queue('go', v=value)
+        interpreter.execute()
+
+    return min(timeit.repeat(run, repeat=5, number=1)) / events
+
+
+def main(branches: int=25, events: int=1000) -> None:
+    statechart = dispatch_statechart(branches)
+    for metrics in (False, True):
+        print('{:>10}: {} branches, {:.2f} us per event'.format(
+            'metrics' if metrics else 'no metrics', branches, benchmark(statechart, events, metrics) * 1e6))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
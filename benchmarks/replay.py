@@ -0,0 +1,45 @@
+"""
+Throughput of the replay of a recording of the elevator example, compared to its recorded
+execution, with and without checking that the replayed macro steps are reproduced.
+
+Usage: python benchmarks/replay.py [events]
+"""
+import io
+import random
+import sys
+import time
+
+from sismic.clock import SimulatedClock
+from sismic.interpreter import EventRecorder, Interpreter, replay
+from sismic.io import import_from_yaml
+
+
+def main(events: int=5000) -> None:
+    statechart = import_from_yaml(filepath='docs/examples/elevator/elevator.yaml')
+    rng = random.Random(0)
+
+    clock = SimulatedClock()
+    interpreter = Interpreter(statechart, clock=clock)
+    recording = io.StringIO()
+    recorder = EventRecorder(recording)
+    recorder.attach(interpreter)
+
+    start = time.perf_counter()
+    for _ in range(events):
+        interpreter.queue('floorSelected', floor=rng.randrange(6))
+        clock.time += rng.random() * 20
+        interpreter.execute()
+    duration = time.perf_counter() - start
+    recorder.detach()
+
+    print('{:>16}: {} steps, {:.0f} steps per second, {:.1f} kB recorded'.format(
+        'recorded', recorder.steps, recorder.steps / duration, len(recording.getvalue()) / 1000))
+    for check in (True, False):
+        report = replay(recording.getvalue().splitlines(), statechart, check=check)
+        print('{:>16}: {} steps, {:.0f} steps per second, {} divergences'.format(
+            'replayed' + (' (check)' if check else ''), report.steps, report.steps_per_second,
+            len(report.divergences)))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
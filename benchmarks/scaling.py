@@ -0,0 +1,73 @@
+"""
+Growth of the time and memory per macro step with the size of a statechart, using synthetic
+statecharts (see sismic.generator). Starting from a small statechart, each dimension (nesting
+depth, orthogonal regions, transitions, guards and history states) is swept in turn, the other
+ones keeping their base value.
+
+Memory is measured with tracemalloc, as the memory allocated for the statechart and an interpreter
+after its initialization ("size"), and as the peak of allocated memory once the events are
+processed ("peak").
+
+Usage: python benchmarks/scaling.py [events] [seed]
+"""
+import sys
+import time
+import tracemalloc
+
+from sismic.generator import generate_events, generate_statechart
+from sismic.interpreter import Interpreter
+
+
+BASE = dict(depth=2, width=3, regions=1, transitions=50, events=10)
+
+SWEEPS = [
+    ('depth', [1, 5, 10, 20]),
+    ('regions', [1, 10, 50, 200]),
+    ('transitions', [10, 100, 1000, 10000]),
+    ('guards', [0.0, 0.5, 1.0]),
+    ('history', [0.0, 0.5, 1.0]),
+]
+
+
+def benchmark(parameters, events: int, seed: int):
+    tracemalloc.start()
+    try:
+        statechart = generate_statechart(seed=seed, actions=0.5, **parameters)
+        interpreter = Interpreter(statechart)
+        interpreter.execute()
+        size = tracemalloc.get_traced_memory()[0]
+
+        workload = generate_events(statechart, events, seed=seed)
+        for event in workload:
+            interpreter.queue(event)
+        interpreter.execute()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    interpreter = Interpreter(statechart)
+    interpreter.execute()
+    for event in workload:
+        interpreter.queue(event)
+
+    start = time.perf_counter()
+    steps = len(interpreter.execute())
+    duration = time.perf_counter() - start
+
+    return len(statechart.states), duration / max(steps, 1), size, peak
+
+
+def main(events: int=100, seed: int=0) -> None:
+    # Warm up (e.g. caches of compiled code)
+    benchmark(BASE, events, seed)
+
+    for dimension, values in SWEEPS:
+        for value in values:
+            parameters = dict(BASE, **{dimension: value})
+            states, duration, size, peak = benchmark(parameters, events, seed)
+            print('{:>11} = {:<6} {:>5} states, {:>10.2f} us per step, size {:>7.1f} KiB, peak {:>7.1f} KiB'.format(
+                dimension, value, states, duration * 1e6, size / 1024, peak / 1024))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,56 @@
+"""
+Throughput of a SessionManager delivering events to many sessions of the elevator example,
+when only some of them fit in memory, for each kind of store. The peak of memory allocated
+during the run is reported as well, to show that it is bounded by the capacity.
+
+Usage: python benchmarks/sessions.py [sessions] [capacity] [events]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sismic.interpreter import CompactInterpreter, DirectoryStore, Event, MemoryStore, SessionManager, SqliteStore
+from sismic.io import import_from_yaml
+
+
+def run(statechart, store, sessions: int, capacity: int, events: int):
+    rng = random.Random(0)
+    manager = SessionManager(statechart, store, capacity=capacity, interpreter_klass=CompactInterpreter)
+    items = [('session-{}'.format(rng.randrange(sessions)), Event('floorSelected', floor=rng.randrange(6)))
+             for _ in range(events)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        for i in range(0, len(items), 100):
+            manager.deliver_all(items[i:i + 100], max_steps=20)
+        duration = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        manager.close()
+
+    return duration / events, peak, manager.revivals, manager.hibernations
+
+
+def main(sessions: int=10000, capacity: int=1000, events: int=20000) -> None:
+    statechart = import_from_yaml(filepath='docs/examples/elevator/elevator.yaml')
+
+    with tempfile.TemporaryDirectory() as directory:
+        stores = [
+            ('memory', MemoryStore()),
+            ('directory', DirectoryStore(os.path.join(directory, 'sessions'))),
+            ('directory (no fsync)', DirectoryStore(os.path.join(directory, 'sessions-no-fsync'), fsync=False)),
+            ('sqlite', SqliteStore(os.path.join(directory, 'sessions.db'))),
+        ]
+        for name, store in stores:
+            duration, peak, loads, evictions = run(statechart, store, sessions, capacity, events)
+            print('{:>20}: {:.2f} us per event, peak {:.1f} MiB, {} loads, {} evictions'.format(
+                name, duration * 1e6, peak / 2 ** 20, loads, evictions))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:4]))
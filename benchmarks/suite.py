@@ -0,0 +1,280 @@
+"""
+A benchmark suite for the execution of statecharts, their import and export.
+
+The following benchmarks are run:
+
+ - "macro step": time per macro step, and memory per macro step, when executing the
+   statecharts of docs/examples and tests/yaml. Each statechart is driven by a script of
+   events that is generated once (using a seeded random generator, among the events
+   that can be handled by the active configuration, the clock being advanced by one
+   second between two events) and replayed on a fresh interpreter for each measure.
+   Memory is measured with tracemalloc: "peak_bytes" is the peak of memory allocated
+   during the run, and "retained_bytes_per_step" is the memory still allocated at the end
+   of the run, divided by the number of macro steps.
+ - "macro step with properties": the same, with property statecharts bound to the
+   interpreter. The overhead with respect to "macro step" is reported in "overhead".
+ - "compiled macro step": the same, with the interpreter generated by sismic.compiler for
+   the statechart. The speedup with respect to "macro step" is reported in "speedup".
+ - "import_from_yaml", "export_to_yaml" and "export_to_plantuml": time per call.
+
+Results are written in JSON (to stdout, or to the file given with --output). A previous
+result file can be given with --compare to print the relative change of each time.
+
+Usage: python benchmarks/suite.py [--steps n] [--repeat n] [--seed n] [--output file] [--compare file]
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import sismic
+
+from sismic.compiler import compile_statechart, load_compiled_statechart
+from sismic.exceptions import SismicError
+from sismic.interpreter import Event, Interpreter
+from sismic.io import export_to_plantuml, export_to_yaml, import_from_yaml
+from sismic.model import Statechart
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+#: Statecharts to execute, relative to ROOT
+STATECHARTS = [
+    'docs/examples/elevator/elevator.yaml',
+    'docs/examples/elevator/elevator_contract.yaml',
+    'docs/examples/microwave/microwave.yaml',
+    'docs/examples/microwave/microwave_with_contracts.yaml',
+    'docs/examples/stopwatch/stopwatch.yaml',
+    'docs/examples/writer_options.yaml',
+] + sorted(
+    os.path.relpath(path, ROOT) for path in glob.glob(os.path.join(ROOT, 'tests', 'yaml', '*.yaml'))
+    # Non-deterministic by design, even before any event is sent
+    if os.path.basename(path) != 'nondeterministic.yaml'
+)
+
+#: Property statecharts to bind, for a given statechart
+PROPERTIES = {
+    'docs/examples/elevator/elevator.yaml': [
+        'docs/examples/elevator/tester_elevator_7th_floor_never_reached.yaml',
+        'docs/examples/elevator/tester_elevator_moves_after_10s.yaml',
+    ],
+    'docs/examples/microwave/microwave.yaml': [
+        'docs/examples/microwave/heating_on_property.yaml',
+        'docs/examples/microwave/heating_off_property.yaml',
+    ],
+}
+
+#: Parameters of the events that expect some
+PARAMETERS = {
+    'floorSelected': lambda rng: {'floor': rng.randint(0, 6)},
+    'keyPress': lambda rng: {'key': rng.choice('abc ')},
+}  # type: Dict[str, Callable[[random.Random], Dict[str, Any]]]
+
+# A script is a list of events, each of them being sent one second after the previous one
+Script = List[Optional[Event]]
+
+
+def load(path: str) -> Statechart:
+    return import_from_yaml(filepath=os.path.join(ROOT, path))
+
+
+def generate_script(statechart: Statechart, steps: int, seed: int) -> Script:
+    """
+    Generate a script of given length for given statechart, by executing it and by randomly
+    choosing, at each step, one of the events that the active configuration can handle.
+    Events whose processing raises an error (e.g. because of conflicting transitions) are excluded.
+    """
+    excluded = set()  # type: Set[str]
+    while True:
+        rng = random.Random(seed)
+        interpreter = Interpreter(statechart)
+        interpreter.execute(max_steps=steps)
+
+        script = []  # type: Script
+        for _ in range(steps):
+            names = [name for name in statechart.events_for(interpreter.configuration) if name not in excluded]
+            if len(names) == 0:
+                event = None
+            else:
+                name = rng.choice(names)
+                event = Event(name, **PARAMETERS.get(name, lambda rng: {})(rng))
+            script.append(event)
+
+            interpreter.clock.time += 1
+            if event is not None:
+                interpreter.queue(event)
+            try:
+                interpreter.execute(max_steps=steps)
+            except SismicError:
+                excluded.add(event.name)
+                break
+            if interpreter.final:
+                return script
+        else:
+            return script
+
+
+def replay(interpreter: Interpreter, script: Script, max_steps: int) -> int:
+    """
+    Replay given script on given interpreter, and return the number of executed macro steps.
+    At most *max_steps* macro steps are executed after each event.
+    """
+    count = len(interpreter.execute(max_steps=max_steps))
+    for event in script:
+        interpreter.clock.time += 1
+        if event is not None:
+            interpreter.queue(event)
+        count += len(interpreter.execute(max_steps=max_steps))
+    return count
+
+
+def measure_execution(statechart: Statechart, script: Script, repeat: int,
+                      properties: List[Statechart]=(), compiled: bool=False) -> Dict[str, Any]:
+    """
+    Measure the time and the memory per macro step when replaying given script.
+    If *compiled* is True, the interpreter generated by sismic.compiler for the statechart is used.
+    """
+    max_steps = len(script) + 1
+    if compiled:
+        klass = load_compiled_statechart(compile_statechart(statechart))
+        factory = lambda: klass()  # noqa: E731
+    else:
+        factory = lambda: Interpreter(statechart)  # noqa: E731
+
+    def create():
+        interpreter = factory()
+        for property_statechart in properties:
+            interpreter.bind_property_statechart(property_statechart)
+        return interpreter
+
+    durations = []
+    for _ in range(repeat):
+        interpreter = create()
+        start = time.perf_counter()
+        steps = replay(interpreter, script, max_steps)
+        durations.append(time.perf_counter() - start)
+
+    interpreter = create()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        replay(interpreter, script, max_steps)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'steps': steps,
+        'time': min(durations) / max(steps, 1),
+        'peak_bytes': peak - baseline,
+        'retained_bytes_per_step': (current - baseline) / max(steps, 1),
+    }
+
+
+def measure_call(func: Callable[[], Any], repeat: int, number: int=10) -> Dict[str, Any]:
+    """
+    Measure the time per call of given function.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        durations.append((time.perf_counter() - start) / number)
+    return {'time': min(durations)}
+
+
+def run(steps: int, repeat: int, seed: int) -> List[Dict[str, Any]]:
+    results = []  # type: List[Dict[str, Any]]
+
+    for path in STATECHARTS:
+        statechart = load(path)
+        script = generate_script(statechart, steps, seed)
+        result = measure_execution(statechart, script, repeat)
+        results.append(dict(benchmark='macro step', subject=path, **result))
+
+        if path in PROPERTIES:
+            properties = [load(property_path) for property_path in PROPERTIES[path]]
+            with_properties = measure_execution(statechart, script, repeat, properties)
+            with_properties['overhead'] = with_properties['time'] / result['time'] - 1
+            results.append(dict(benchmark='macro step with properties', subject=path, **with_properties))
+
+        compiled = measure_execution(statechart, script, repeat, compiled=True)
+        compiled['speedup'] = result['time'] / compiled['time']
+        results.append(dict(benchmark='compiled macro step', subject=path, **compiled))
+
+    for path in STATECHARTS:
+        with open(os.path.join(ROOT, path)) as f:
+            text = f.read()
+        statechart = import_from_yaml(text)
+
+        results.append(dict(benchmark='import_from_yaml', subject=path,
+                            **measure_call(lambda: import_from_yaml(text), repeat)))
+        results.append(dict(benchmark='export_to_yaml', subject=path,
+                            **measure_call(lambda: export_to_yaml(statechart), repeat)))
+        results.append(dict(benchmark='export_to_plantuml', subject=path,
+                            **measure_call(lambda: export_to_plantuml(statechart), repeat)))
+
+    return results
+
+
+def compare(results: List[Dict[str, Any]], previous: List[Dict[str, Any]]) -> List[Tuple[str, str, float, float]]:
+    """
+    Return, for each benchmark and subject in both results, the previous and current times.
+    """
+    times = {(r['benchmark'], r['subject']): r['time'] for r in previous}
+    return [
+        (r['benchmark'], r['subject'], times[r['benchmark'], r['subject']], r['time'])
+        for r in results if (r['benchmark'], r['subject']) in times
+    ]
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser(description='Run the benchmark suite of Sismic.')
+    parser.add_argument('--steps', type=int, default=200, help='Number of events sent to each statechart')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of measures, the best one being kept')
+    parser.add_argument('--seed', type=int, default=0, help='Seed used to generate the scripts of events')
+    parser.add_argument('--output', type=str, default=None, help='File in which results are written')
+    parser.add_argument('--compare', type=str, default=None, help='Previous results to compare with')
+    args = parser.parse_args(args)
+
+    # Some statecharts print on stdout, on which results could be written
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results = run(args.steps, args.repeat, args.seed)
+    report = {
+        'metadata': {
+            'sismic': sismic.__version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'steps': args.steps, 'repeat': args.repeat, 'seed': args.seed,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['results']
+        for benchmark, subject, before, after in compare(results, previous):
+            print('{:>28} {:<55} {:>10.2f} us {:>10.2f} us {:>+7.1%}'.format(
+                benchmark, subject, before * 1e6, after * 1e6, after / before - 1), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Memory used to keep the trace of the elevator example with log_trace, compared to the size of a
+binary trace written by a BinaryTraceWriter and to the memory used by a BinaryTraceReader, and the
+time of coverage_from_trace on both traces.
+
+Usage: python benchmarks/tracelog.py [events]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sismic.clock import SimulatedClock
+from sismic.helpers import coverage_from_trace, log_trace
+from sismic.interpreter import BinaryTraceReader, BinaryTraceWriter, Interpreter
+from sismic.io import import_from_yaml
+
+
+def run(statechart, events: int, trace_factory):
+    rng = random.Random(0)
+    clock = SimulatedClock()
+    interpreter = Interpreter(statechart, clock=clock)
+    trace = trace_factory(interpreter)
+
+    start = time.perf_counter()
+    for _ in range(events):
+        interpreter.queue('floorSelected', floor=rng.randrange(6))
+        clock.time += 10
+        interpreter.execute()
+    return trace, time.perf_counter() - start
+
+
+def main(events: int=5000) -> None:
+    statechart = import_from_yaml(filepath='docs/examples/elevator/elevator.yaml')
+
+    tracemalloc.start()
+    trace, duration = run(statechart, events, log_trace)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    coverage_from_trace(trace)
+    coverage = time.perf_counter() - start
+    print('{:>9}: {} steps, {:.2f} us per step, {:.1f} kB in memory, {:.2f} ms for coverage'.format(
+        'log_trace', len(trace), duration / len(trace) * 1e6, memory / 1000, coverage * 1e3))
+    del trace
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, 'trace.bin')
+        writer = BinaryTraceWriter(filepath)
+
+        def attach(interpreter):
+            writer.attach(interpreter)
+            return writer
+
+        _, duration = run(statechart, events, attach)
+        writer.close()
+
+        tracemalloc.start()
+        reader = BinaryTraceReader(filepath, statechart=statechart)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        coverage_from_trace(reader)
+        coverage = time.perf_counter() - start
+        print('{:>9}: {} steps, {:.2f} us per step, {:.1f} kB on disk, {:.1f} kB in memory, '
+              '{:.2f} ms for coverage'.format(
+                  'binary', len(reader), duration / len(reader) * 1e6, os.path.getsize(filepath) / 1000,
+                  memory / 1000, coverage * 1e3))
+        reader.close()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,44 @@
+"""
+Execution time of a statechart acting as a dispatch table (see guards.py), with
+and without the trusted mode of Interpreter, which stops guard evaluation at the
+first enabled transition and skips non-determinism and conflict checks.
+
+Usage: python benchmarks/trusted.py [branches] [events]
+"""
+import sys
+import timeit
+
+from functools import partial
+
+from sismic.code import PythonEvaluator
+from sismic.interpreter import Interpreter
+
+from guards import dispatch_statechart
+
+
+def benchmark(statechart, events: int, **kwargs) -> float:
+    compile_functions = kwargs.pop('compile_functions', False)
+
+    def run():
+        interpreter = Interpreter(
+            statechart, evaluator_klass=partial(PythonEvaluator, compile_functions=compile_functions), **kwargs)
+        for value in range(events):
+            interpreter.queue('go', v=value)
+        interpreter.execute()
+
+    return min(timeit.repeat(run, repeat=5, number=1)) / events
+
+
+def main(branches: int=25, events: int=1000) -> None:
+    statechart = dispatch_statechart(branches)
+    for label, kwargs in [
+        ('default', {}),
+        ('trusted', {'trusted': True}),
+        ('trusted, compiled functions', {'trusted': True, 'compile_functions': True}),
+    ]:
+        print('{:>28}: {} branches, {:.2f} us per event'.format(
+            label, branches, benchmark(statechart, events, **kwargs) * 1e6))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
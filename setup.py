@@ -56,6 +56,9 @@ setup(
         'console_scripts': [
             'sismic-bdd=sismic.bdd.__main__:cli',
             'sismic-plantuml=sismic.io.plantuml:cli',
+            'sismic-compile=sismic.compiler:cli',
+            'sismic-profile=sismic.code.profiler:cli',
+            'sismic-replay=sismic.interpreter.recording:cli',
         ],
     },
 
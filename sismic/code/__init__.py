@@ -1,5 +1,6 @@
 from .evaluator import Evaluator
 from .dummy import DummyEvaluator
-from .python import PythonEvaluator
+from .profiler import FragmentProfile, Profiler
+from .python import CompactPythonEvaluator, PythonEvaluator
 
-__all__ = ['Evaluator', 'DummyEvaluator', 'PythonEvaluator']
+__all__ = ['Evaluator', 'CompactPythonEvaluator', 'DummyEvaluator', 'FragmentProfile', 'Profiler', 'PythonEvaluator']
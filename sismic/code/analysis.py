@@ -0,0 +1,102 @@
+import ast
+
+from typing import FrozenSet, Iterable, Optional, Set
+
+__all__ = ['CodeInfo', 'analyze_code', 'VOLATILE_NAMES', 'PURE_BUILTINS']
+
+
+#: Names exposed by *PythonEvaluator* whose value may change without any assignment in the context.
+VOLATILE_NAMES = frozenset(['time', 'after', 'idle', 'active', 'sent', 'received', 'event'])
+
+#: Builtin functions whose result only depends on their arguments.
+PURE_BUILTINS = frozenset([
+    'abs', 'all', 'any', 'bool', 'dict', 'divmod', 'float', 'frozenset', 'int', 'isinstance', 'len',
+    'list', 'max', 'min', 'round', 'set', 'sorted', 'str', 'sum', 'tuple',
+])
+
+
+class CodeInfo:
+    """
+    Result of the static analysis of a piece of Python code.
+
+    :param names: names that are read by the code
+    :param stored: names that are assigned or deleted by the code
+    :param calls: True if the code calls something else than a builtin in *PURE_BUILTINS*
+    :param old_attributes: attributes of *__old__* that are accessed by the code, or None if
+        *__old__* is used in another way than through attribute access (e.g. passed to a function).
+    """
+
+    __slots__ = ['names', 'stored', 'calls', 'old_attributes']
+
+    def __init__(self, names: FrozenSet[str], stored: FrozenSet[str], calls: bool,
+                 old_attributes: Optional[FrozenSet[str]]=frozenset()) -> None:
+        self.names = names
+        self.stored = stored
+        self.calls = calls
+        self.old_attributes = old_attributes
+
+    def is_pure(self, *, exposed: Iterable[str]=()) -> bool:
+        """
+        Return True if the value of the code only depends on the variables it reads in the context,
+        ie. if it does not call a function, does not assign a variable, and does not read a name
+        in *VOLATILE_NAMES* (except the ones in *exposed*).
+
+        :param exposed: names in *VOLATILE_NAMES* that can be read
+        :return: True if the code is pure
+        """
+        return (
+            not self.calls and len(self.stored) == 0
+            and self.names.isdisjoint(VOLATILE_NAMES.difference(exposed))
+        )
+
+    def __repr__(self):
+        return '{}(names={!r}, stored={!r}, calls={!r}, old_attributes={!r})'.format(
+            self.__class__.__name__, sorted(self.names), sorted(self.stored), self.calls,
+            None if self.old_attributes is None else sorted(self.old_attributes))
+
+
+class _CodeVisitor(ast.NodeVisitor):
+    def __init__(self) -> None:
+        self.names = set()  # type: Set[str]
+        self.stored = set()  # type: Set[str]
+        self.calls = False
+        self.old_attributes = set()  # type: Set[str]
+        self.old_anyhow = False
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.names.add(node.id)
+            if node.id == '__old__':
+                self.old_anyhow = True
+        else:
+            self.stored.add(node.id)
+
+    def visit_Attribute(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id == '__old__' and isinstance(node.value.ctx, ast.Load):
+            self.names.add('__old__')
+            self.old_attributes.add(node.attr)
+        else:
+            self.generic_visit(node)
+
+    def visit_Call(self, node):
+        if not (isinstance(node.func, ast.Name) and node.func.id in PURE_BUILTINS):
+            self.calls = True
+        self.generic_visit(node)
+
+
+def analyze_code(code: str) -> CodeInfo:
+    """
+    Statically analyze given piece of Python code (either an expression or a sequence of statements).
+
+    The analysis is conservative: names that are local to a comprehension or a lambda are
+    considered as read from the context.
+
+    :param code: code to analyze
+    :return: a *CodeInfo* instance
+    :raise SyntaxError: if code cannot be parsed
+    """
+    visitor = _CodeVisitor()
+    visitor.visit(ast.parse(code, '<string>', 'exec'))
+
+    old_attributes = None if visitor.old_anyhow else frozenset(visitor.old_attributes)
+    return CodeInfo(frozenset(visitor.names), frozenset(visitor.stored), visitor.calls, old_attributes)
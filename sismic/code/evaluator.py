@@ -1,5 +1,5 @@
 import abc
-from typing import Any, Optional, Iterable, List, Mapping
+from typing import Any, Optional, Iterable, List, Mapping, Sequence
 
 from ..model import Statechart, StateMixin, Transition, Event
 from ..exceptions import CodeEvaluationError
@@ -25,7 +25,7 @@ class Evaluator(metaclass=abc.ABCMeta):
 
     @abc.abstractmethod
     def __init__(self, interpreter=None, *, initial_context: Mapping[str, Any]=None) -> None:
-        pass
+        self._interpreter = interpreter
 
     @property
     @abc.abstractmethod
@@ -60,6 +60,26 @@ class Evaluator(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError()
 
+    def _sent(self, name: str) -> bool:
+        """
+        Return True if an event with given name was sent during the current step of the interpreter.
+        This runs in constant time, as the interpreter maintains the multiset of the names of sent events.
+
+        :param name: name of an event
+        :return: True if such an event was sent
+        """
+        return name in self._interpreter._sent_event_names
+
+    def _received(self, name: str, event: Optional[Event]) -> bool:
+        """
+        Return True if given event (the one that is currently processed) has given name.
+
+        :param name: name of an event
+        :param event: the currently processed event, if any
+        :return: True if such an event is received
+        """
+        return name == getattr(event, 'name', None)
+
     def execute_statechart(self, statechart: Statechart):
         """
         Execute the initial code of a statechart.
@@ -84,6 +104,27 @@ class Evaluator(metaclass=abc.ABCMeta):
             return self._evaluate_code(transition.guard, additional_context={'event': event})
         return None
 
+    def evaluate_guards(self, transitions: Sequence[Transition], event: Optional[Event]=None, *,
+                        first: bool=False) -> List[int]:
+        """
+        Evaluate the guards of given transitions, and return the indices of the transitions whose
+        guard holds or is not defined, in increasing order.
+        This method is called by the interpreter for each group of transitions that share a same
+        source state and a same priority, instead of calling *evaluate_guard* for each of them.
+
+        :param transitions: the considered transitions, sharing a same source state
+        :param event: instance of *Event* if any
+        :param first: set to True to stop at the first enabled transition
+        :return: indices of the enabled transitions
+        """
+        enabled = []  # type: List[int]
+        for index, transition in enumerate(transitions):
+            if transition.guard is None or self.evaluate_guard(transition, event):
+                enabled.append(index)
+                if first:
+                    break
+        return enabled
+
     def execute_action(self, transition: Transition, event: Optional[Event]=None) -> List[Event]:
         """
         Execute the action for given transition.
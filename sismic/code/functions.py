@@ -0,0 +1,225 @@
+import ast
+import builtins
+
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Set
+
+__all__ = ['compile_function', 'compile_guards', 'GuardError', 'EXPOSED_NAMES', 'NOT_APPLICABLE']
+
+
+#: Names that can be exposed by *PythonEvaluator* when a piece of code is evaluated or executed.
+EXPOSED_NAMES = frozenset([
+    'active', 'time', 'after', 'idle', 'send', 'notify', 'setdefault', 'sent', 'received', 'event', '__old__',
+])
+
+#: Value returned by a compiled function when it cannot be used instead of its code.
+NOT_APPLICABLE = object()
+
+# Nodes whose semantics depend on the scope in which the code is executed
+_UNSUPPORTED_NODES = tuple(getattr(ast, name) for name in [
+    'Lambda', 'ListComp', 'SetComp', 'DictComp', 'GeneratorExp', 'FunctionDef', 'AsyncFunctionDef', 'ClassDef',
+    'Import', 'ImportFrom', 'Global', 'Nonlocal', 'Yield', 'YieldFrom', 'Await', 'NamedExpr', 'Return', 'Match',
+] if hasattr(ast, name))
+
+# Builtins that inspect or change the scope in which they are called
+_UNSUPPORTED_NAMES = frozenset(['dir', 'eval', 'exec', 'globals', 'locals', 'vars'])
+
+# Prefix of the names used by compiled functions
+_PREFIX = '__sismic_'
+_CONTEXT = _PREFIX + 'context__'
+_EXPOSED = _PREFIX + 'exposed__'
+_NOT_APPLICABLE = _PREFIX + 'not_applicable__'
+_GUARD_ERROR = _PREFIX + 'guard_error__'
+
+
+class GuardError(Exception):
+    """
+    Raised by a function returned by *compile_guards* when the evaluation of a guard failed.
+    The original exception is available in *__cause__*.
+
+    :param index: index of the guard whose evaluation failed
+    """
+    def __init__(self, index: int) -> None:
+        super().__init__(index)
+        self.index = index
+
+
+class _CodeChecker(ast.NodeVisitor):
+    def __init__(self) -> None:
+        self.supported = True
+        self.loaded = set()  # type: Set[str]
+        self.stored = set()  # type: Set[str]
+
+    def generic_visit(self, node):
+        if isinstance(node, _UNSUPPORTED_NODES):
+            self.supported = False
+        elif isinstance(node, ast.ExceptHandler) and node.name is not None:
+            self.supported = False
+        super().generic_visit(node)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.loaded.add(node.id)
+        else:
+            self.stored.add(node.id)
+            # A variable that is deleted must be defined, as for a variable that is read
+            if isinstance(node.ctx, ast.Del):
+                self.loaded.add(node.id)
+
+    def visit_AugAssign(self, node):
+        # The target of an augmented assignment is read before it is assigned
+        if isinstance(node.target, ast.Name):
+            self.loaded.add(node.target.id)
+        self.generic_visit(node)
+
+
+class _ContextTransformer(ast.NodeTransformer):
+    def __init__(self, context_names: Set[str]) -> None:
+        self.context_names = context_names
+
+    def visit_Name(self, node):
+        if node.id not in self.context_names:
+            return node
+        subscript = ast.parse('{}[{!r}]'.format(_CONTEXT, node.id), mode='eval').body
+        subscript.ctx = node.ctx
+        return ast.copy_location(subscript, node)
+
+
+def _check(trees: Sequence[ast.AST]) -> Optional[_CodeChecker]:
+    """
+    Return a *_CodeChecker* that visited given trees, or None if they cannot be compiled into a function.
+    """
+    checker = _CodeChecker()
+    for tree in trees:
+        checker.visit(tree)
+
+    names = checker.loaded | checker.stored
+    if (not checker.supported or not checker.stored.isdisjoint(EXPOSED_NAMES)
+            or not names.isdisjoint(_UNSUPPORTED_NAMES) or any(name.startswith(_PREFIX) for name in names)):
+        return None
+    return checker
+
+
+def _compile(checker: _CodeChecker, trees: Sequence[ast.AST], template: Callable[[], List[str]],
+             fill: Callable[[List[ast.stmt], List[ast.AST]], List[ast.stmt]]) -> Callable:
+    """
+    Compile a function whose body is the prologue (that checks applicability and binds
+    exposed names) followed by the statements returned by *fill*, given the parsed lines
+    of *template* and the transformed trees.
+    """
+    parameters = sorted(checker.loaded & EXPOSED_NAMES)
+    builtin_names = {name for name in checker.loaded - EXPOSED_NAMES - checker.stored if hasattr(builtins, name)}
+    context_names = (checker.loaded | checker.stored) - EXPOSED_NAMES - builtin_names
+
+    transformer = _ContextTransformer(context_names)
+    trees = [transformer.visit(tree) for tree in trees]
+
+    # Variables that are only assigned do not need to be in the context
+    conditions = []  # type: List[str]
+    conditions.extend('{!r} in {}'.format(name, _CONTEXT) for name in sorted(context_names & checker.loaded))
+    conditions.extend('{!r} in {}'.format(name, _EXPOSED) for name in parameters)
+    conditions.extend('{!r} not in {}'.format(name, _CONTEXT) for name in sorted(builtin_names) + parameters)
+
+    lines = ['def function({}, {}):'.format(_CONTEXT, _EXPOSED)]
+    if len(conditions) > 0:
+        lines.append('    if not ({}):'.format(' and '.join(conditions)))
+        lines.append('        return {}'.format(_NOT_APPLICABLE))
+    lines.extend('    {} = {}[{!r}]'.format(name, _EXPOSED, name) for name in parameters)
+    prologue_size = (1 if len(conditions) > 0 else 0) + len(parameters)
+
+    module = ast.parse('\n'.join(lines + ['    ' + line for line in template()]))
+    function_def = module.body[0]
+    function_def.body[prologue_size:] = fill(function_def.body[prologue_size:], trees)
+    ast.fix_missing_locations(module)
+
+    namespace = {
+        '__builtins__': builtins, _NOT_APPLICABLE: NOT_APPLICABLE, _GUARD_ERROR: GuardError,
+    }  # type: Dict[str, Any]
+    exec(compile(module, '<string>', 'exec'), namespace)
+    return namespace['function']
+
+
+def compile_function(code: str, mode: str) -> Optional[Callable[[Mapping[str, Any], Mapping[str, Any]], Any]]:
+    """
+    Compile given piece of code into a function that accepts a context and a mapping of
+    exposed names (see *EXPOSED_NAMES*), and that returns the value of the code (if *mode* is 'eval')
+    or None (if *mode* is 'exec').
+
+    In this function, the variables of the context are accessed through subscripts on the context,
+    and the exposed names it reads are bound to local variables. It has the same semantics than the
+    code evaluated or executed with the exposed names as globals and the context as locals, but
+    returns *NOT_APPLICABLE* without running the code if it reads (including with an augmented
+    assignment such as ``x += 1``, or a deletion) a variable that is not defined in the context, an
+    exposed name that is not provided, or if a builtin or an exposed name it reads is shadowed by a
+    variable of the context. In these cases, evaluating or executing the code would raise a *NameError*
+    (or use the builtin) instead of failing on a missing key of the context.
+
+    Code that relies on the scope in which it is executed (e.g. comprehensions, lambdas, imports,
+    function definitions, assignments of exposed names, calls to *locals*) is not supported.
+
+    :param code: code to compile
+    :param mode: either 'eval' (for an expression) or 'exec' (for a sequence of statements)
+    :return: a function, or None if code is not supported
+    :raise SyntaxError: if code cannot be parsed
+    """
+    tree = ast.parse(code, '<string>', mode)
+    checker = _check([tree])
+    if checker is None:
+        return None
+
+    def fill(body, trees):
+        if mode == 'eval':
+            body[0].value = trees[0].body
+        elif len(trees[0].body) > 0:
+            body[:] = trees[0].body
+        return body
+
+    return _compile(checker, [tree], lambda: ['return None'], fill)
+
+
+def compile_guards(guards: Sequence[Optional[str]], *,
+                   first: bool=False) -> Optional[Callable[[Mapping[str, Any], Mapping[str, Any]], Any]]:
+    """
+    Compile given guards into a single function that accepts a context and a mapping of exposed
+    names, and that returns the (ordered) list of the indices of the guards that hold. A guard that is
+    None always holds. Guards are evaluated in order, each of them being evaluated exactly once.
+    If *first* is set, the function returns as soon as a guard holds.
+
+    If the evaluation of a guard raises an exception, a *GuardError* is raised from it.
+    As for *compile_function*, *NOT_APPLICABLE* is returned (before evaluating any guard) if the
+    function cannot be used instead of the guards.
+
+    :param guards: guards to compile
+    :param first: set to True to stop at the first guard that holds
+    :return: a function, or None if one of the guards is not supported
+    :raise SyntaxError: if a guard cannot be parsed
+    """
+    trees = [ast.parse(guard, '<string>', 'eval') for guard in guards if guard is not None]
+    checker = _check(trees)
+    if checker is None:
+        return None
+
+    enabled, index, error = _PREFIX + 'enabled__', _PREFIX + 'index__', _PREFIX + 'error__'
+
+    def template():
+        lines = ['{} = []'.format(enabled), '{} = 0'.format(index), 'try:', '    pass']
+        for i, guard in enumerate(guards):
+            if i > 0:
+                lines.append('    {} = {}'.format(index, i))
+            found = 'return [{}]'.format(i) if first else '{}.append({})'.format(enabled, i)
+            if guard is None:
+                lines.append('    ' + found)
+            else:
+                lines.append('    if None:')
+                lines.append('        ' + found)
+        lines.append('except Exception as {}:'.format(error))
+        lines.append('    raise {}({}) from {}'.format(_GUARD_ERROR, index, error))
+        lines.append('return {}'.format(enabled))
+        return lines
+
+    def fill(body, trees):
+        conditions = [statement for statement in body[2].body if isinstance(statement, ast.If)]
+        for condition, tree in zip(conditions, trees):
+            condition.test = tree.body
+        return body
+
+    return _compile(checker, trees, template, fill)
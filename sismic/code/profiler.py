@@ -0,0 +1,226 @@
+import argparse
+import json
+import sys
+
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+__all__ = ['Profiler', 'FragmentProfile']
+
+
+class FragmentProfile:
+    """
+    Profile of a piece of code of a statechart.
+
+    :param owner: name of the state, string representation of the transition, or name of the statechart
+        (for its preamble) that owns the code.
+    :param kind: either "preamble", "on_entry", "on_exit", "guard", "action", "precondition",
+        "postcondition" or "invariant".
+    :param code: the piece of code
+    :param calls: number of times the code was evaluated or executed
+    :param total: cumulative time spent to evaluate or execute the code, in seconds
+    :param peak: maximal time spent to evaluate or execute the code once, in seconds
+    """
+
+    __slots__ = ['owner', 'kind', 'code', 'calls', 'total', 'peak']
+
+    def __init__(self, owner: Optional[str], kind: str, code: str, calls: int, total: float, peak: float) -> None:
+        self.owner = owner
+        self.kind = kind
+        self.code = code
+        self.calls = calls
+        self.total = total
+        self.peak = peak
+
+    @property
+    def mean(self) -> float:
+        """
+        Mean time spent to evaluate or execute the code once, in seconds.
+        """
+        return self.total / self.calls if self.calls > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Return a dict representation of this profile, that can be serialized (e.g. to JSON).
+
+        :return: a dict
+        """
+        return {
+            'owner': self.owner, 'kind': self.kind, 'code': self.code,
+            'calls': self.calls, 'total': self.total, 'peak': self.peak, 'mean': self.mean,
+        }
+
+    def __repr__(self):
+        return '{}(owner={!r}, kind={!r}, code={!r}, calls={!r}, total={!r}, peak={!r})'.format(
+            self.__class__.__name__, self.owner, self.kind, self.code, self.calls, self.total, self.peak)
+
+
+class Profiler:
+    """
+    A profiler that accumulates, for each piece of code of a statechart, the number of times it was
+    evaluated or executed, and the cumulative and peak (wall) time spent for it.
+
+    Pieces of code are identified by the state, the transition or the statechart that owns them,
+    by their kind (e.g. "guard" or "invariant") and by the code itself. A profiler is provided to a
+    *PythonEvaluator* using its *profiler* parameter. It can be shared by several evaluators.
+
+    :param timer: a callable that returns the current time in seconds (default to *time.perf_counter*).
+    """
+
+    def __init__(self, *, timer: Callable[[], float]=perf_counter) -> None:
+        self.timer = timer
+        self._stats = {}  # type: Dict[Tuple[int, str, str], List]
+
+    def record(self, owner: Any, kind: str, code: str, duration: float) -> None:
+        """
+        Record that given piece of code was evaluated or executed once.
+
+        :param owner: a *StateMixin*, a *Transition*, a *Statechart*, or None if unknown
+        :param kind: kind of code (see *FragmentProfile*)
+        :param code: the piece of code
+        :param duration: time spent to evaluate or execute the code, in seconds
+        """
+        # States are not necessarily hashable, and transitions are compared by value
+        key = (id(owner), kind, code)
+        stats = self._stats.get(key, None)
+        if stats is None:
+            self._stats[key] = [owner, 1, duration, duration]
+        else:
+            stats[1] += 1
+            stats[2] += duration
+            if duration > stats[3]:
+                stats[3] = duration
+
+    def reset(self) -> None:
+        """
+        Discard all the recorded data.
+        """
+        self._stats.clear()
+
+    def report(self, *, sort: str='total') -> List[FragmentProfile]:
+        """
+        Return the profile of each piece of code that was evaluated or executed, sorted in decreasing
+        order of given attribute.
+
+        :param sort: either "total", "calls", "peak" or "mean"
+        :return: a list of *FragmentProfile* instances
+        """
+        if sort not in ('total', 'calls', 'peak', 'mean'):
+            raise ValueError('Unknown sort key: {}'.format(sort))
+
+        profiles = [
+            FragmentProfile(
+                None if owner is None else str(getattr(owner, 'name', owner)), kind, code, calls, total, peak
+            ) for (_, kind, code), (owner, calls, total, peak) in self._stats.items()
+        ]
+        return sorted(profiles, key=lambda p: (-getattr(p, sort), str(p.owner), p.kind, p.code))
+
+    def format(self, *, sort: str='total', limit: int=None) -> str:
+        """
+        Return a textual representation of the report, one piece of code per line.
+
+        :param sort: either "total", "calls", "peak" or "mean"
+        :param limit: maximal number of pieces of code to include
+        :return: a string
+        """
+        profiles = self.report(sort=sort)[:limit]
+        width = max([len('owner')] + [len(str(profile.owner)) for profile in profiles])
+        template = '{:>8} {:>12} {:>12} {:>12}  {:<13} {:<%d}  {}' % width
+
+        lines = [template.format('calls', 'total (ms)', 'mean (us)', 'peak (us)', 'kind', 'owner', 'code')]
+        for profile in profiles:
+            lines.append(template.format(
+                profile.calls, '{:.3f}'.format(profile.total * 1e3), '{:.3f}'.format(profile.mean * 1e6),
+                '{:.3f}'.format(profile.peak * 1e6), profile.kind, str(profile.owner), ' '.join(profile.code.split())
+            ))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return '{}({} pieces of code)'.format(self.__class__.__name__, len(self._stats))
+
+
+def _load_script(filepath: str) -> List[Dict[str, Any]]:
+    """
+    Load a YAML event script, ie. a list whose items are either the name of an event to send,
+    a mapping with an *event* name and optional *parameters*, or a mapping with a number of seconds
+    to *wait*.
+    """
+    import ruamel.yaml as yaml
+
+    with open(filepath) as f:
+        text = f.read()
+
+    if yaml.version_info < (0, 15):
+        items = yaml.safe_load(text) or []
+    else:
+        items = yaml.YAML(typ='safe', pure=True).load(text) or []
+
+    script = []
+    for item in items:
+        if isinstance(item, str):
+            item = {'event': item}
+        if not isinstance(item, dict) or not (('event' in item) ^ ('wait' in item)):
+            raise ValueError('Invalid item in event script: {!r}'.format(item))
+        script.append(item)
+    return script
+
+
+def cli(args=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='sismic-profile',
+        description='Command-line utility to profile the pieces of code of a YAML statechart, '
+                    'by running it against a YAML event script.\n'
+                    'The script is a list whose items are either an event name, a mapping with an "event" '
+                    'name and optional "parameters", or a mapping with a number of seconds to "wait".'
+    )
+
+    parser.add_argument('statechart', metavar='statechart', type=str,
+                        help='A YAML file describing a statechart')
+    parser.add_argument('script', metavar='script', type=str,
+                        help='A YAML file describing the events to send')
+    parser.add_argument('--repeat', metavar='n', type=int, default=1,
+                        help='Number of times the script is run, each time on a new interpreter')
+    parser.add_argument('--sort', choices=['total', 'calls', 'peak', 'mean'], default='total',
+                        help='Attribute used to sort the report')
+    parser.add_argument('--limit', metavar='n', type=int, default=None,
+                        help='Maximal number of pieces of code to report')
+    parser.add_argument('--json', action='store_true', default=False,
+                        help='Report as JSON')
+    parser.add_argument('--compile-functions', action='store_true', default=False,
+                        help='Compile pieces of code into functions (see PythonEvaluator)')
+
+    args = parser.parse_args(args)
+
+    from functools import partial
+    from .python import PythonEvaluator
+    from ..clock import SimulatedClock
+    from ..interpreter import Interpreter
+    from ..io import import_from_yaml
+
+    statechart = import_from_yaml(filepath=args.statechart)
+    script = _load_script(args.script)
+    profiler = Profiler()
+
+    for _ in range(args.repeat):
+        clock = SimulatedClock()
+        interpreter = Interpreter(
+            statechart, clock=clock,
+            evaluator_klass=partial(PythonEvaluator, profiler=profiler, compile_functions=args.compile_functions)
+        )
+        interpreter.execute()
+        for item in script:
+            if 'wait' in item:
+                clock.time += float(item['wait'])
+            else:
+                interpreter.queue(item['event'], **item.get('parameters', {}))
+            interpreter.execute()
+
+    if args.json:
+        print(json.dumps([profile.as_dict() for profile in profiler.report(sort=args.sort)[:args.limit]], indent=2))
+    else:
+        print(profiler.format(sort=args.sort, limit=args.limit))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
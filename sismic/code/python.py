@@ -1,15 +1,40 @@
 import collections
 import copy
+import weakref
 
 from types import CodeType
-from typing import Any, Dict, List, Optional, Mapping, Iterator
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Mapping, Iterator, Sequence, Set, Tuple
 
 from . import Evaluator
+from .analysis import CodeInfo, analyze_code
+from .functions import NOT_APPLICABLE, GuardError, compile_function, compile_guards
+from .profiler import Profiler
 from ..exceptions import CodeEvaluationError
-from ..model import Event, InternalEvent, MetaEvent, Transition
+from ..model import Event, InternalEvent, MetaEvent, StateMixin, Statechart, Transition
+from ..utilities import LazyContainer
 
 
-__all__ = ['PythonEvaluator']
+__all__ = ['PythonEvaluator', 'CompactPythonEvaluator']
+
+
+# Attributes of PythonEvaluator that cache compiled or analyzed code, and that only depend on the code
+_CODE_CACHES = ('_evaluable_code', '_executable_code', '_functions', '_guards_functions', '_code_info')
+
+# Types whose instances cannot be changed in place (subclasses are excluded, as they could be)
+_IMMUTABLE_TYPES = frozenset([type(None), bool, int, float, complex, str, bytes, range])
+
+
+def _is_immutable(value: Any) -> bool:
+    """
+    Return True if given value cannot be changed in place, ie. if it is an instance of a builtin
+    immutable type, or a tuple or a frozenset of such values.
+    """
+    kind = type(value)
+    if kind in _IMMUTABLE_TYPES:
+        return True
+    if kind is tuple or kind is frozenset:
+        return all(_is_immutable(item) for item in value)
+    return False
 
 
 class FrozenContext(collections.Mapping):
@@ -44,6 +69,69 @@ class FrozenContext(collections.Mapping):
         return iter(self.__frozencontext)
 
 
+class VersionedContext(dict):
+    """
+    A dict that records, for each of its keys, the version at which it was last assigned or deleted.
+    The version is a counter that is incremented on each change, or explicitly using *touch*.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__()
+        self.version = 0
+        self.versions = {}  # type: Dict[str, int]
+        self.update(*args, **kwargs)
+
+    def touch(self, names: Iterable[str]=()) -> int:
+        """
+        Increment the version, and mark given names as changed in this version.
+
+        :param names: names to mark as changed
+        :return: the new version
+        """
+        self.version += 1
+        for name in names:
+            self.versions[name] = self.version
+        return self.version
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.touch((key,))
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.touch((key,))
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, key, *default):
+        if key in self:
+            self.touch((key,))
+        return super().pop(key, *default)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.touch((key,))
+        return key, value
+
+    def clear(self):
+        self.touch(list(self.keys()))
+        super().clear()
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),), self.__dict__
+
+
 class PythonEvaluator(Evaluator):
     """
     A code evaluator that understands Python.
@@ -76,6 +164,8 @@ class PythonEvaluator(Evaluator):
         - A variable *__old__* that has an attribute *x* for every *x* in the context when either the state
           was entered (if the condition involves a state) or the transition was processed (if the condition
           involves a transition). The value of *__old__.x* is a shallow copy of *x* at that time.
+          Only the variables that are accessed through *__old__* by the invariants and postconditions of
+          the state or transition are copied.
     - On contract evaluation:
         - A *sent(name: str) -> bool* function that takes an event name and return True if an event with the same name
           was sent during the current step.
@@ -85,24 +175,76 @@ class PythonEvaluator(Evaluator):
     If an exception occurred while executing or evaluating a piece of code, it is propagated by the
     evaluator.
 
+    If *incremental_invariants* is set, the invariants of a state are only evaluated if the state was entered,
+    or if one of the variables they read was assigned, or possibly modified by a piece of code, since they
+    were last satisfied. Invariants that rely on *time*, *after*, *idle*, *active*, *sent*, *received* or
+    *event*, that call a function (except builtins such as *len*), or that read a variable whose value could
+    be changed in place (ie. that is not a number, a string, None, or a tuple or a frozenset of such values),
+    are always evaluated.
+
+    If *cache_guards* is set, the value of a guard is reused until one of the variables it reads is
+    assigned or possibly modified by a piece of code, or until the considered event changes.
+    Guards that rely on *time*, *after*, *idle* or *active*, that call a function (except builtins
+    such as *len*) or assign a variable, or that read a variable whose value could be changed in place,
+    are always evaluated.
+
+    If *compile_functions* is set, each piece of code is compiled into a function in which the variables
+    of the context are accessed through subscripts, and the exposed functions and variables are passed as
+    parameters. This avoids the name resolution through the context, the exposed names and the builtins
+    that is done by *eval* and *exec*. The code is evaluated or executed as usual if it relies on the
+    scope in which it is run (e.g. comprehensions, lambdas, imports), if it reads a variable that is not
+    yet defined, or if a variable of the context shadows a builtin or an exposed name.
+    Moreover, the guards of the transitions that share a same source state and a same priority are
+    compiled into a single function, so that they are evaluated at once (see *evaluate_guards*).
+
+    If a *Profiler* is provided, the time spent to evaluate or execute each piece of code is recorded,
+    together with the state, the transition or the statechart that owns it. In this case, guards are
+    always evaluated one by one.
+
     :param interpreter: the interpreter that will use this evaluator,
         is expected to be an *Interpreter* instance
     :param initial_context: a dictionary that will be used as *__locals__*
+    :param incremental_invariants: set to True to skip the invariants of states whose variables did not change.
+    :param cache_guards: set to True to reuse the value of guards whose variables did not change.
+    :param compile_functions: set to True to compile code into functions.
+    :param profiler: an optional *Profiler* instance to profile pieces of code.
     """
-    def __init__(self, interpreter=None, *, initial_context: Mapping[str, Any]=None) -> None:
+    def __init__(self, interpreter=None, *, initial_context: Mapping[str, Any]=None,
+                 incremental_invariants: bool=False, cache_guards: bool=False,
+                 compile_functions: bool=False, profiler: Profiler=None) -> None:
         super().__init__(interpreter, initial_context=initial_context)
 
-        self._context = {}  # type: Dict[str, Any]
+        self._context = VersionedContext()  # type: VersionedContext
         self._context.update(initial_context if initial_context else {})
-        self._interpreter = interpreter
 
         # Precompiled code
         self._evaluable_code = {}  # type: Dict[str, CodeType]
         self._executable_code = {}  # type: Dict[str, CodeType]
 
+        # Code compiled into functions
+        self.compile_functions = compile_functions
+        self._functions = {}  # type: Dict[Tuple[str, str], Optional[Callable]]
+        self._guards_functions = {}  # type: Dict[Tuple[Tuple[Optional[str], ...], bool], Optional[Callable]]
+
+        # Static analysis of code
+        self._code_info = {}  # type: Dict[str, CodeInfo]
+
         # Frozen context for __old__
         self._memory = {}  # type: Dict[int, FrozenContext]
 
+        # Incremental checking of invariants
+        self.incremental_invariants = incremental_invariants
+        self._entry_versions = {}  # type: Dict[str, int]
+        self._checked_invariants = {}  # type: Dict[Tuple[str, str], int]
+
+        # Cached values of guards
+        self.cache_guards = cache_guards
+        self._guard_cache = {}  # type: Dict[str, Tuple[bool, int, Optional[Event]]]
+
+        # Profiling, with the owner and the kind of the code that is evaluated or executed
+        self.profiler = profiler
+        self._fragment = (None, 'code')  # type: Tuple[Any, str]
+
     @property
     def context(self) -> Mapping:
         return self._context
@@ -117,6 +259,46 @@ class PythonEvaluator(Evaluator):
         """
         return self._context.setdefault(name, value)
 
+    def _analyze_code(self, code: str) -> CodeInfo:
+        """
+        Return the (cached) result of the static analysis of given code.
+
+        :param code: code to analyze
+        :return: a *CodeInfo* instance
+        """
+        info = self._code_info.get(code, None)
+        if info is None:
+            info = self._code_info.setdefault(code, analyze_code(code))
+        return info
+
+    def _function_for(self, code: str, mode: str) -> Optional[Callable]:
+        """
+        Return the (cached) function for given code, or None if it cannot be compiled into a function.
+
+        :param code: code to compile
+        :param mode: either 'eval' or 'exec'
+        :return: a function (see *compile_function*) or None
+        """
+        key = (code, mode)
+        try:
+            return self._functions[key]
+        except KeyError:
+            return self._functions.setdefault(key, compile_function(code, mode))
+
+    def _guards_function_for(self, guards: Tuple[Optional[str], ...], first: bool) -> Optional[Callable]:
+        """
+        Return the (cached) function for given guards, or None if they cannot be compiled into a function.
+
+        :param guards: guards to compile
+        :param first: True to stop at the first guard that holds
+        :return: a function (see *compile_guards*) or None
+        """
+        key = (guards, first)
+        try:
+            return self._guards_functions[key]
+        except KeyError:
+            return self._guards_functions.setdefault(key, compile_guards(guards, first=first))
+
     def _evaluate_code(self, code: Optional[str], *, additional_context: Mapping[str, Any]=None) -> bool:
         """
         Evaluate given code using Python.
@@ -138,11 +320,23 @@ class PythonEvaluator(Evaluator):
         }
         exposed_context.update(additional_context if additional_context is not None else {})
 
+        profiler = self.profiler
+        if profiler is not None:
+            start = profiler.timer()
+
         try:
+            if self.compile_functions:
+                function = self._function_for(code, 'eval')
+                if function is not None:
+                    value = function(self._context, exposed_context)
+                    if value is not NOT_APPLICABLE:
+                        return bool(value)
             return bool(eval(compiled_code, exposed_context, self._context))
         except Exception as e:
             raise CodeEvaluationError('"{}" occurred while evaluating "{}"'.format(e, code)) from e
-
+        finally:
+            if profiler is not None:
+                profiler.record(self._fragment[0], self._fragment[1], code, profiler.timer() - start)
 
     def _execute_code(self, code: Optional[str], *, additional_context: Mapping[str, Any]=None) -> List[Event]:
         """
@@ -161,6 +355,10 @@ class PythonEvaluator(Evaluator):
 
         sent_events = []  # type: List[Event]
 
+        # Values of the variables used by this code may be changed in place
+        info = self._analyze_code(code)
+        self._context.touch(info.names | info.stored)
+
         exposed_context = {
             'active': lambda name: name in self._interpreter.configuration,
             'time': self._interpreter.time,
@@ -170,11 +368,67 @@ class PythonEvaluator(Evaluator):
         }
         exposed_context.update(additional_context if additional_context is not None else {})
 
+        profiler = self.profiler
+        if profiler is not None:
+            start = profiler.timer()
+
         try:
+            if self.compile_functions:
+                function = self._function_for(code, 'exec')
+                if function is not None and function(self._context, exposed_context) is not NOT_APPLICABLE:
+                    return sent_events
             exec(compiled_code, exposed_context, self._context)  # type: ignore
             return sent_events
         except Exception as e:
             raise CodeEvaluationError('"{}" occurred while executing "{}"'.format(e, code)) from e
+        finally:
+            if profiler is not None:
+                profiler.record(self._fragment[0], self._fragment[1], code, profiler.timer() - start)
+
+    def execute_statechart(self, statechart: Statechart):
+        """
+        Execute the initial code of a statechart.
+        This method is called at the very beginning of the execution.
+
+        :param statechart: statechart to consider
+        """
+        self._fragment = (statechart, 'preamble')
+        super().execute_statechart(statechart)
+
+    def execute_on_entry(self, state: StateMixin) -> List[Event]:
+        """
+        Execute the on entry action for given state.
+        This method is called for every state that is entered, even those with no *on_entry*.
+
+        :param state: the considered state
+        :return: a list of sent events
+        """
+        self._entry_versions[state.name] = self._context.touch()
+        self._fragment = (state, 'on_entry')
+        return super().execute_on_entry(state)
+
+    def execute_on_exit(self, state: StateMixin) -> List[Event]:
+        """
+        Execute the on exit action for given state.
+        This method is called for every state that is exited, even those with no *on_exit*.
+
+        :param state: the considered state
+        :return: a list of sent events
+        """
+        self._fragment = (state, 'on_exit')
+        return super().execute_on_exit(state)
+
+    def execute_action(self, transition: Transition, event: Optional[Event]=None) -> List[Event]:
+        """
+        Execute the action for given transition.
+        This method is called for every transition that is processed, even those with no *action*.
+
+        :param transition: the considered transition
+        :param event: instance of *Event* if any
+        :return: a list of sent events
+        """
+        self._fragment = (transition, 'action')
+        return super().execute_action(transition, event)
 
     def evaluate_guard(self, transition: Transition, event: Optional[Event]=None) -> bool:
         """
@@ -184,12 +438,81 @@ class PythonEvaluator(Evaluator):
         :param event: instance of *Event* if any
         :return: truth value of *code*
         """
+        guard = getattr(transition, 'guard', None)
+        self._fragment = (transition, 'guard')
+        if self.cache_guards and guard is not None:
+            info = self._analyze_code(guard)
+            if info.is_pure(exposed=['event']):
+                cached = self._guard_cache.get(guard, None)
+                if cached is not None:
+                    value, version, cached_event = cached
+                    if ('event' not in info.names or cached_event is event) and self._unchanged(info.names, version):
+                        return value
+
+                value = self._evaluate_code(guard, additional_context={'event': event})
+                self._guard_cache[guard] = (value, self._context.version, event)
+                return value
+
         additional_context = {
             'after': lambda seconds: self._interpreter.time - seconds >= self._interpreter._entry_time[transition.source],
             'idle': lambda seconds: self._interpreter.time - seconds >= self._interpreter._idle_time[transition.source],
             'event': event,
         }
-        return self._evaluate_code(getattr(transition, 'guard', None), additional_context=additional_context)
+        return self._evaluate_code(guard, additional_context=additional_context)
+
+    def evaluate_guards(self, transitions: Sequence[Transition], event: Optional[Event]=None, *,
+                        first: bool=False) -> List[int]:
+        """
+        Evaluate the guards of given transitions, and return the indices of the transitions whose
+        guard holds or is not defined, in increasing order.
+
+        If *compile_functions* is set (and neither *cache_guards* nor *profiler* are), the guards are
+        compiled into a single function that evaluates all of them at once.
+
+        :param transitions: the considered transitions, sharing a same source state
+        :param event: instance of *Event* if any
+        :param first: set to True to stop at the first enabled transition
+        :return: indices of the enabled transitions
+        """
+        if self.compile_functions and not self.cache_guards and self.profiler is None and len(transitions) > 0:
+            guards = tuple(transition.guard for transition in transitions)
+            function = self._guards_function_for(guards, first)
+            if function is not None:
+                source = transitions[0].source
+                exposed_context = {
+                    'active': lambda name: name in self._interpreter.configuration,
+                    'time': self._interpreter.time,
+                    'after': lambda seconds: self._interpreter.time - seconds >= self._interpreter._entry_time[source],
+                    'idle': lambda seconds: self._interpreter.time - seconds >= self._interpreter._idle_time[source],
+                    'event': event,
+                }
+
+                try:
+                    indices = function(self._context, exposed_context)
+                except GuardError as e:
+                    raise CodeEvaluationError('"{}" occurred while evaluating "{}"'.format(
+                        e.__cause__, guards[e.index])) from e.__cause__
+
+                if indices is not NOT_APPLICABLE:
+                    return indices
+
+        return super().evaluate_guards(transitions, event, first=first)
+
+    def _old_attributes_for(self, obj) -> Optional[FrozenSet[str]]:
+        """
+        Return the names of the variables that are accessed through *__old__* by the invariants and
+        the postconditions of given object, or None if the whole context could be accessed.
+
+        :param obj: the considered state or transition
+        :return: a (possibly empty) set of names, or None
+        """
+        old_attributes = set()  # type: Set[str]
+        for condition in getattr(obj, 'invariants', []) + getattr(obj, 'postconditions', []):
+            attributes = self._analyze_code(condition).old_attributes
+            if attributes is None:
+                return None
+            old_attributes.update(attributes)
+        return frozenset(old_attributes)
 
     def evaluate_preconditions(self, obj, event: Optional[Event]=None) -> Iterator[str]:
         """
@@ -201,19 +524,22 @@ class PythonEvaluator(Evaluator):
         :return: list of unsatisfied conditions
         """
         additional_context = {
-            'received': lambda name: name == getattr(event, 'name', None),
-            'sent': lambda name: name in [e.name for e in self._interpreter._sent_events],
+            'received': lambda name: self._received(name, event),
+            'sent': self._sent,
             'event': event,
         }
 
-        # Deal with __old__ in contracts, only required if there is an invariant or a postcondition
-        if len(getattr(obj, 'invariants', [])) > 0 or len(getattr(obj, 'postconditions', [])) > 0:
+        # Deal with __old__ in contracts, only required if an invariant or a postcondition refers to it
+        old_attributes = self._old_attributes_for(obj)
+        if old_attributes is None:
             self._memory[id(obj)] = FrozenContext(self._context)
+        elif len(old_attributes) > 0:
+            self._memory[id(obj)] = FrozenContext(
+                {name: self._context[name] for name in old_attributes if name in self._context}
+            )
 
-        return filter(
-            lambda c: not self._evaluate_code(c, additional_context=additional_context),
-            getattr(obj, 'preconditions', [])
-        )
+        conditions = getattr(obj, 'preconditions', [])
+        return self._evaluate_conditions(obj, 'precondition', conditions, additional_context)
 
     def evaluate_invariants(self, obj, event: Optional[Event]=None) -> Iterator[str]:
         """
@@ -230,15 +556,76 @@ class PythonEvaluator(Evaluator):
             '__old__': self._memory.get(id(obj), None),
             'after': lambda seconds: self._interpreter.time - seconds >= self._interpreter._entry_time[state_name],
             'idle': lambda seconds: self._interpreter.time - seconds >= self._interpreter._idle_time[state_name],
-            'received': lambda name: name == getattr(event, 'name', None),
-            'sent': lambda name: name in [e.name for e in self._interpreter._sent_events],
+            'received': lambda name: self._received(name, event),
+            'sent': self._sent,
             'event': event,
         }
 
-        return filter(
-            lambda c: not self._evaluate_code(c, additional_context=additional_context),
-            getattr(obj, 'invariants', [])
-        )
+        if isinstance(obj, StateMixin) and self.incremental_invariants:
+            return self._evaluate_state_invariants(obj, additional_context)
+
+        conditions = getattr(obj, 'invariants', [])
+        return self._evaluate_conditions(obj, 'invariant', conditions, additional_context)
+
+    def _evaluate_conditions(self, obj, kind: str, conditions: Sequence[str],
+                             additional_context: Mapping[str, Any]) -> Iterator[str]:
+        """
+        Evaluate given conditions of given object, and return the unsatisfied ones.
+
+        :param obj: the considered state or transition
+        :param kind: either "precondition", "postcondition" or "invariant"
+        :param conditions: conditions to evaluate
+        :param additional_context: additional context to expose
+        :return: unsatisfied conditions
+        """
+        for condition in conditions:
+            self._fragment = (obj, kind)
+            if not self._evaluate_code(condition, additional_context=additional_context):
+                yield condition
+
+    def _unchanged(self, names: Iterable[str], version: int) -> bool:
+        """
+        Return True if the variables of the context with given names were not assigned, and were not
+        possibly modified by a piece of code, since given version, and if their value cannot be changed
+        in place (in which case a modification may not be visible).
+
+        :param names: names of the variables, names that are not in the context are ignored
+        :param version: a version of the context
+        :return: True if the variables did not change
+        """
+        context = self._context
+        versions = context.versions
+        for name in names:
+            if versions.get(name, 0) > version:
+                return False
+            if name in context and not _is_immutable(context[name]):
+                return False
+        return True
+
+    def _evaluate_state_invariants(self, state: StateMixin, additional_context: Mapping[str, Any]) -> Iterator[str]:
+        """
+        Evaluate the invariants of given state, except the ones that were satisfied since the state
+        was entered and whose variables were not changed since then. Return the unsatisfied ones.
+
+        :param state: the considered state
+        :param additional_context: additional context to expose
+        :return: unsatisfied conditions
+        """
+        entry_version = self._entry_versions.get(state.name, 0)
+
+        for condition in getattr(state, 'invariants', []):
+            key = (state.name, condition)
+            checked = self._checked_invariants.get(key, None)
+            if checked is not None and entry_version <= checked:
+                info = self._analyze_code(condition)
+                if info.is_pure() and self._unchanged(info.names, checked):
+                    continue
+
+            self._fragment = (state, 'invariant')
+            if self._evaluate_code(condition, additional_context=additional_context):
+                self._checked_invariants[key] = self._context.version
+            else:
+                yield condition
 
     def evaluate_postconditions(self, obj, event: Optional[Event]=None) -> Iterator[str]:
         """
@@ -255,18 +642,93 @@ class PythonEvaluator(Evaluator):
             '__old__': self._memory.get(id(obj), None),
             'after': lambda seconds: self._interpreter.time - seconds >= self._interpreter._entry_time[state_name],
             'idle': lambda seconds: self._interpreter.time - seconds >= self._interpreter._idle_time[state_name],
-            'received': lambda name: name == getattr(event, 'name', None),
-            'sent': lambda name: name in [e.name for e in self._interpreter._sent_events],
+            'received': lambda name: self._received(name, event),
+            'sent': self._sent,
             'event': event,
         }
 
-        return filter(
-            lambda c: not self._evaluate_code(c, additional_context=additional_context),
-            getattr(obj, 'postconditions', [])
-        )
+        conditions = getattr(obj, 'postconditions', [])
+        return self._evaluate_conditions(obj, 'postcondition', conditions, additional_context)
 
     def __getstate__(self):
         attributes = self.__dict__.copy()
         attributes['_executable_code'] = dict()  # Code fragment cannot be pickled
         attributes['_evaluable_code'] = dict()  # Code fragment cannot be pickled
+        attributes['_functions'] = dict()  # Compiled functions cannot be pickled
+        attributes['_guards_functions'] = dict()  # Compiled functions cannot be pickled
         return attributes
+
+
+class CompactPythonEvaluator(PythonEvaluator):
+    """
+    A *PythonEvaluator* with a smaller memory footprint, for applications that keep many
+    interpreters in memory (see *CompactInterpreter*).
+
+    Its attributes are stored in slots, and pieces of code are compiled and analyzed once for all the
+    instances whose interpreters share a same statechart, in caches that are released with the statechart
+    (or that can be emptied with *clear_shared_caches*). The containers that are not used by every statechart
+    (e.g. the frozen contexts exposed through *__old__*) are only allocated when they are first accessed.
+
+    It accepts the same parameters as *PythonEvaluator*.
+    """
+
+    __slots__ = (
+        '_interpreter', '_context', '_evaluable_code', '_executable_code', 'compile_functions', '_functions',
+        '_guards_functions', '_code_info', 'incremental_invariants', '_entry_versions', 'cache_guards',
+        'profiler', '_fragment', '_lazy_memory', '_lazy_checked_invariants', '_lazy_guard_cache',
+    )
+
+    # Caches shared by the instances for a same statechart, as compiled code does not depend on the context
+    _shared_caches = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+    _memory = LazyContainer('_lazy_memory', dict)
+    _checked_invariants = LazyContainer('_lazy_checked_invariants', dict)
+    _guard_cache = LazyContainer('_lazy_guard_cache', dict)
+
+    def __init__(self, interpreter=None, *, initial_context: Mapping[str, Any]=None,
+                 incremental_invariants: bool=False, cache_guards: bool=False,
+                 compile_functions: bool=False, profiler: Profiler=None) -> None:
+        super().__init__(
+            interpreter, initial_context=initial_context, incremental_invariants=incremental_invariants,
+            cache_guards=cache_guards, compile_functions=compile_functions, profiler=profiler,
+        )
+        self._share_caches(getattr(interpreter, 'statechart', None))
+
+    def _share_caches(self, statechart: Optional[Statechart]) -> None:
+        """
+        Use the caches that are shared by the instances for given statechart (if any).
+        """
+        if statechart is None:
+            return
+        caches = self._shared_caches.get(statechart, None)
+        if caches is None:
+            caches = self._shared_caches[statechart] = {name: {} for name in _CODE_CACHES}
+        for name, cache in caches.items():
+            setattr(self, name, cache)
+
+    @classmethod
+    def clear_shared_caches(cls) -> None:
+        """
+        Empty the caches of compiled and analyzed code that are shared by the instances of this class.
+        Code is compiled and analyzed again when it is next evaluated or executed.
+        """
+        for caches in cls._shared_caches.values():
+            for cache in caches.values():
+                cache.clear()
+
+    def __getstate__(self):
+        state = {
+            name: getattr(self, name) for name in self.__slots__
+            if name not in _CODE_CACHES and hasattr(self, name)
+        }
+        state['statechart'] = getattr(self._interpreter, 'statechart', None)
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        statechart = state.pop('statechart', None)
+        for name, value in state.items():
+            setattr(self, name, value)
+        for name in _CODE_CACHES:
+            setattr(self, name, {})
+        self._share_caches(statechart)
@@ -0,0 +1,520 @@
+"""
+Ahead-of-time compilation of statecharts into Python modules (see *compile_statechart*).
+
+A generated module contains a *CompiledInterpreter* subclass with one dispatch method per event, that
+selects the triggered transitions without grouping and sorting them at each step, and precomputed tables
+for the states that are exited, entered and stabilized. Guards and actions are compiled into functions by
+the evaluator (see the *compile_functions* parameter of *PythonEvaluator*) rather than inlined in the
+generated module, so that evaluators, profilers and contracts apply to compiled interpreters as well.
+Configuration, history and stabilization are driven by the tables, and are not unrolled into code.
+"""
+import argparse
+import keyword
+import pprint
+import re
+import sys
+import types
+import weakref
+
+from functools import partial
+from itertools import groupby
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from . import __version__
+from .clock import Clock
+from .code import Evaluator, PythonEvaluator
+from .code.python import _CODE_CACHES
+from .interpreter import AsyncContractChecker, ContractPolicy, Interpreter, InterpreterMetrics
+from .interpreter.hibernation import statechart_fingerprint
+from .model import (BasicState, CompoundState, DeepHistoryState, Event, FinalState, MicroStep,
+                    OrthogonalState, ShallowHistoryState, Statechart, Transition)
+
+__all__ = ['CompiledInterpreter', 'compile_statechart', 'load_compiled_statechart']
+
+
+
+class CompiledInterpreter(Interpreter):
+    """
+    Base class of the interpreters that are generated by *compile_statechart*.
+
+    A compiled interpreter embeds its statechart, one generated method per event that selects the transitions
+    triggered by this event, and precomputed tables on the structure of the statechart. Dispatch methods check
+    the active source states and evaluate the guards of their transitions in the order of *Interpreter*, without
+    sorting or grouping the transitions at each step. Tables are used to compute the states that are exited and
+    entered, and to stabilize the statechart, instead of querying the statechart at each step.
+
+    The code contained in the statechart is executed by the evaluator, which compiles guards and actions into
+    functions by default (see the *compile_functions* parameter of *PythonEvaluator*), so the execution of a
+    compiled interpreter is the same than the one of an *Interpreter* for the same statechart. If the evaluator
+    is a *PythonEvaluator*, compiled code is shared by the instances for a same statechart.
+
+    A compiled interpreter can be created without statechart, in which case a statechart built from its tables
+    is shared by the instances of its class. If a statechart is provided (e.g. by *revive*), it must have the same
+    fingerprint (see *statechart_fingerprint*) than the compiled one, but can define its transitions in
+    another order. As the tables are computed once, the structure of the statechart (its states and the source
+    and target of its transitions) should not be changed. Code and contracts can be changed.
+
+    :param statechart: an optional statechart, equal to the compiled one
+    :param evaluator_klass: An optional callable (e.g. a class) that takes an interpreter and an optional initial
+        context as input and returns an *Evaluator* instance that will be used to initialize the interpreter.
+        By default, a *PythonEvaluator* that compiles code into functions will be used.
+    :param initial_context: an optional initial context that will be provided to the evaluator.
+        By default, an empty context is provided
+    :param clock: A BaseClock instance that will be used to set this interpreter internal time.
+        By default, a SimulatedClock is used.
+    :param ignore_contract: set to True to ignore contract checking during the execution.
+    :param contract_policy: an optional *ContractPolicy* instance that determines whether contracts are checked.
+    :param contract_checker: an optional *AsyncContractChecker* instance to check contracts in a background thread.
+    :param trusted: set to True to trust the statechart to be deterministic and free of conflicting transitions.
+    :param metrics: an optional *InterpreterMetrics* instance in which performance counters are maintained.
+    :raise ValueError: if given statechart is not equal to the compiled one.
+    """
+
+    #: Statechart name, description and preamble
+    STATECHART = ('', None, None)  # type: Tuple[str, Optional[str], Optional[str]]
+    #: For each state (parents first): its class name, parent, constructor parameters and contract
+    STATES = ()  # type: Tuple[Tuple[str, Optional[str], Dict[str, Any], Tuple[List[str], List[str], List[str]]], ...]
+    #: For each transition: its constructor parameters and contract
+    TRANSITIONS = ()  # type: Tuple[Tuple[Dict[str, Any], Tuple[List[str], List[str], List[str]]], ...]
+
+    #: Root state
+    ROOT = None  # type: Optional[str]
+    #: Depth of each state
+    DEPTH = {}  # type: Dict[str, int]
+    #: Parent of each state
+    PARENT = {}  # type: Dict[str, Optional[str]]
+    #: Groups of transitions (indexes in TRANSITIONS) sharing a same source state and priority
+    GROUPS = ()  # type: Tuple[Tuple[int, ...], ...]
+    #: For each event name (or None for eventless transitions), the name of its dispatch method
+    DISPATCH = {}  # type: Dict[Optional[str], str]
+    #: For each external transition, the states that can be exited and the states that are entered
+    STEPS = {}  # type: Dict[int, Tuple[Tuple[str, ...], Tuple[str, ...]]]
+    #: For each state, what to do when it is a leaf of the configuration (see *_create_stabilization_step*)
+    STABILIZATION = {}  # type: Dict[str, Tuple[str, Any]]
+
+    def __init__(self, statechart: Statechart=None, *,
+                 evaluator_klass: Callable[..., Evaluator]=partial(PythonEvaluator, compile_functions=True),
+                 initial_context: Mapping[str, Any]=None,
+                 clock: Clock=None,
+                 ignore_contract: bool=False,
+                 contract_policy: ContractPolicy=None,
+                 contract_checker: AsyncContractChecker=None,
+                 trusted: bool=False,
+                 metrics: InterpreterMetrics=None) -> None:
+        compiled = type(self)._link(statechart)
+
+        super().__init__(compiled['statechart'], evaluator_klass=evaluator_klass,
+                         initial_context=initial_context, clock=clock, ignore_contract=ignore_contract,
+                         contract_policy=contract_policy, contract_checker=contract_checker, trusted=trusted,
+                         metrics=metrics)
+
+        self._dispatch = compiled['dispatch']
+        self._groups = compiled['groups']
+        self._steps = compiled['steps']
+
+        # Code is compiled once for all the instances that share a same statechart
+        if isinstance(self._evaluator, PythonEvaluator):
+            for name, cache in compiled['caches'].items():
+                setattr(self._evaluator, name, cache)
+
+    @classmethod
+    def build_statechart(cls) -> Statechart:
+        """
+        Return a new statechart instance, built from the STATECHART, STATES and TRANSITIONS attributes.
+
+        :return: a *Statechart* instance
+        """
+        klasses = {klass.__name__: klass for klass in (BasicState, CompoundState, OrthogonalState,
+                                                       ShallowHistoryState, DeepHistoryState, FinalState)}
+
+        name, description, preamble = cls.STATECHART
+        statechart = Statechart(name, description=description, preamble=preamble)
+
+        for klass_name, parent, parameters, contract in cls.STATES:
+            state = klasses[klass_name](**parameters)
+            state.preconditions, state.postconditions, state.invariants = map(list, contract)
+            statechart.add_state(state, parent)
+
+        for parameters, contract in cls.TRANSITIONS:
+            transition = Transition(**parameters)
+            transition.preconditions, transition.postconditions, transition.invariants = map(list, contract)
+            statechart.add_transition(transition)
+
+        return statechart
+
+    @classmethod
+    def _link(cls, statechart: Optional[Statechart]) -> Dict[str, Any]:
+        """
+        Return the statechart (given one, or the statechart of this class if None), its transitions that
+        are referred to by the tables, and the dispatch methods. The result is shared by all the instances
+        of this class for the same statechart.
+
+        :param statechart: a statechart equal to the compiled one, or None
+        :return: a dict
+        :raise ValueError: if given statechart is not equal to the compiled one.
+        """
+        links = cls.__dict__.get('_links', None)
+        if links is None:
+            built = cls.build_statechart()
+            links = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+            links[built] = cls._link_transitions(built, built.transitions)
+            cls._links = links
+            cls._compiled = (built, statechart_fingerprint(built))
+
+        built, fingerprint = cls._compiled
+        statechart = built if statechart is None else statechart
+        compiled = links.get(statechart, None)
+        if compiled is None:
+            if statechart_fingerprint(statechart) != fingerprint:
+                raise ValueError('Statechart {} is not the one compiled in {}'.format(statechart, cls.__name__))
+
+            # Transitions may be defined in another order
+            candidates = {}  # type: Dict[Any, List[Transition]]
+            for transition in statechart.transitions:
+                candidates.setdefault(_transition_key(transition), []).append(transition)
+            transitions = [candidates[_transition_key(transition)].pop(0) for transition in built.transitions]
+            compiled = links[statechart] = cls._link_transitions(statechart, transitions)
+        return compiled
+
+    @classmethod
+    def _link_transitions(cls, statechart: Statechart, transitions: List[Transition]) -> Dict[str, Any]:
+        """
+        Replace transition indexes by given transitions (in the order of TRANSITIONS) in the tables.
+        """
+        return {
+            'statechart': statechart,
+            'dispatch': {event: getattr(cls, name) for event, name in cls.DISPATCH.items()},
+            'groups': tuple(tuple(transitions[i] for i in group) for group in cls.GROUPS),
+            'steps': {id(transitions[i]): value for i, value in cls.STEPS.items()},
+            'caches': {name: {} for name in _CODE_CACHES},
+        }
+
+    @property
+    def configuration(self) -> List[str]:
+        """
+        List of active states names, ordered by depth. Ties are broken according to the lexicographic order
+        on the state name.
+        """
+        return sorted(self._configuration, key=lambda s: (self.DEPTH[s], s))
+
+    def _select_transitions(self, event: Optional[Event], states: Iterable[str], *,
+                            eventless_first=True, inner_first=True) -> List[Transition]:
+        if not (eventless_first and inner_first):
+            return super()._select_transitions(event, states, eventless_first=eventless_first,
+                                               inner_first=inner_first)
+
+        dispatch = self._dispatch
+        selected_transitions = []  # type: List[Transition]
+        if None in dispatch:
+            selected_transitions = dispatch[None](self, None, states)
+        if len(selected_transitions) == 0 and event is not None and event.name in dispatch:
+            selected_transitions = dispatch[event.name](self, event, states)
+        return selected_transitions
+
+    def _fire(self, transitions: Tuple[Transition, ...], event: Optional[Event],
+              selected_transitions: List[Transition]) -> bool:
+        """
+        Evaluate the guards of given transitions, that share a same source state and priority, and add the
+        enabled ones to *selected_transitions*. This method is called by the generated dispatch methods.
+
+        :param transitions: transitions to consider
+        :param event: event to expose to the guards, possibly None
+        :param selected_transitions: list of selected transitions
+        :return: True if at least one transition is enabled
+        """
+        enabled = self._evaluator.evaluate_guards(transitions, event, first=self._trusted)
+        if self._metrics is not None:
+            self._metrics.record_guards(transitions, enabled, self._trusted)
+        for index in enabled:
+            selected_transitions.append(transitions[index])
+        return len(enabled) > 0
+
+    def _create_steps(self, event: Optional[Event], transitions: Iterable[Transition]) -> List[MicroStep]:
+        returned_steps = []
+        for transition in transitions:
+            if transition.target is None:
+                returned_steps.append(MicroStep(event=event, transition=transition))
+            else:
+                exited_states, entered_states = self._steps[id(transition)]
+                returned_steps.append(MicroStep(
+                    event=event, transition=transition, entered_states=list(entered_states),
+                    exited_states=[state for state in exited_states if state in self._configuration]
+                ))
+        return returned_steps
+
+    def _create_stabilization_step(self, names: Iterable[str]) -> Optional[MicroStep]:
+        names = list(names)
+        non_leaves = set()  # type: Set[str]
+        for name in names:
+            parent = self.PARENT[name]
+            while parent is not None and parent not in non_leaves:
+                non_leaves.add(parent)
+                parent = self.PARENT[parent]
+
+        leaves = sorted((name for name in names if name not in non_leaves), key=lambda s: (-self.DEPTH[s], s))
+
+        for leaf in leaves:
+            kind, value = self.STABILIZATION.get(leaf, (None, None))
+            if kind == 'final':
+                return MicroStep(exited_states=[leaf, self.ROOT])
+            elif kind == 'history':
+                states_to_enter = self._memory.get(leaf, [value])
+                states_to_enter.sort(key=lambda x: (self.DEPTH[x], x))
+                return MicroStep(entered_states=states_to_enter, exited_states=[leaf])
+            elif kind == 'orthogonal':
+                return MicroStep(entered_states=list(value))
+            elif kind == 'compound':
+                return MicroStep(entered_states=[value])
+
+        return None
+
+
+def _class_name(name: str) -> str:
+    words = re.findall(r'[a-zA-Z0-9]+', name)
+    class_name = ''.join(word[0].upper() + word[1:] for word in words) + 'Interpreter'
+    if not class_name.isidentifier() or keyword.iskeyword(class_name):
+        class_name = 'Compiled' + class_name
+    return class_name
+
+
+def _contract(obj) -> Tuple[List[str], List[str], List[str]]:
+    return (list(getattr(obj, 'preconditions', [])), list(getattr(obj, 'postconditions', [])),
+            list(getattr(obj, 'invariants', [])))
+
+
+def _transition_key(transition: Transition) -> Tuple:
+    return (transition.source, transition.target, transition.event, transition.guard, transition.action,
+            transition.priority, tuple(map(tuple, _contract(transition))))
+
+
+def _dispatch_method(statechart: Statechart, name: str, event: Optional[str],
+                     sources: List[Tuple[str, List[Tuple[int, ...]]]], groups: List[Tuple[int, ...]]) -> List[str]:
+    """
+    Return the lines of a method that selects the transitions triggered by given event (or the eventless
+    transitions if None), in the order of *Interpreter._select_transitions*.
+
+    :param statechart: compiled statechart
+    :param name: name of the method
+    :param event: name of the event, or None
+    :param sources: source states ordered by decreasing depth, with their transitions (indexes in the
+        statechart) grouped by decreasing priority
+    :param groups: groups of transitions referred to by the method, to which these groups are appended
+    :return: lines of the method
+    """
+    names = [source for source, _ in sources]
+
+    # Source states that are ignored if a transition of one of their descendants (checked before) is selected
+    ignorable = set()  # type: Set[str]
+    for i, source in enumerate(names):
+        if not set(names[:i]).isdisjoint(statechart.descendants_for(source)):
+            ignorable.add(source)
+
+    lines = [
+        'def {}(self, event, states):'.format(name),
+        '    # {}'.format('Eventless transitions' if event is None else 'Transitions for event {!r}'.format(event)),
+        '    groups, fire = self._groups, self._fire',
+        '    selected = []',
+    ]
+    if len(ignorable) > 0:
+        lines.append('    ignored = set()')
+
+    for i, (source, priority_groups) in enumerate(sources):
+        fired = []
+        for group in priority_groups:
+            fired.append('fire(groups[{}], event, selected)'.format(len(groups)))
+            groups.append(group)
+
+        condition = '{!r} in states'.format(source)
+        if source in ignorable:
+            condition += ' and {!r} not in ignored'.format(source)
+        lines.append('    if {}:'.format(condition))
+
+        ancestors = [name for name in statechart.ancestors_for(source) if name in ignorable and name in names[i + 1:]]
+        if len(ancestors) > 0:
+            lines.append('        if {}:'.format(' or '.join(fired)))
+            lines.append('            ignored.update({!r})'.format(tuple(ancestors)))
+        else:
+            lines.append('        {}'.format(' or '.join(fired)))
+
+    lines.append('    return selected')
+    return lines
+
+
+def compile_statechart(statechart: Statechart, *, class_name: str=None) -> str:
+    """
+    Generate the source code of a Python module that contains a subclass of *CompiledInterpreter*
+    for given statechart.
+
+    The generated module only depends on Sismic, and can be imported as any other Python module.
+    Its class can be instantiated without any statechart.
+
+    :param statechart: statechart to compile
+    :param class_name: name of the generated class. By default, it is derived from the name of the statechart.
+    :return: source code of a Python module
+    """
+    statechart.validate()
+    class_name = _class_name(statechart.name) if class_name is None else class_name
+    root = statechart.root
+
+    # States, parents first and in the order of their insertion
+    states = []  # type: List[str]
+    to_visit = [root]
+    while to_visit:
+        name = to_visit.pop(0)
+        states.append(name)
+        to_visit.extend(statechart.children_for(name))
+
+    state_data = []
+    depth = {}
+    parent = {}
+    stabilization = {}  # type: Dict[str, Tuple[str, Any]]
+    for name in states:
+        state = statechart.state_for(name)
+        parameters = {'name': name}
+        for attribute in ('initial', 'on_entry', 'on_exit', 'memory'):
+            if getattr(state, attribute, None) is not None:
+                parameters[attribute] = getattr(state, attribute)
+        state_data.append((type(state).__name__, statechart.parent_for(name), parameters, _contract(state)))
+
+        depth[name] = statechart.depth_for(name)
+        parent[name] = statechart.parent_for(name)
+
+        # Mimic Interpreter._create_stabilization_step
+        if isinstance(state, FinalState) and parent[name] == root:
+            stabilization[name] = ('final', None)
+        elif isinstance(state, (ShallowHistoryState, DeepHistoryState)):
+            stabilization[name] = ('history', state.memory)
+        elif isinstance(state, OrthogonalState) and statechart.children_for(name):
+            stabilization[name] = ('orthogonal', tuple(sorted(statechart.children_for(name))))
+        elif isinstance(state, CompoundState) and state.initial:
+            stabilization[name] = ('compound', state.initial)
+
+    # Transitions
+    transitions = statechart.transitions
+    transition_data = []
+    steps = {}
+    for i, transition in enumerate(transitions):
+        parameters = {'source': transition.source}
+        for attribute in ('target', 'event', 'guard', 'action'):
+            if getattr(transition, attribute) is not None:
+                parameters[attribute] = getattr(transition, attribute)
+        if transition.priority != Transition.DEFAULT_PRIORITY:
+            parameters['priority'] = transition.priority
+        transition_data.append((parameters, _contract(transition)))
+
+        # Mimic Interpreter._create_steps
+        if transition.target is not None:
+            lca = statechart.least_common_ancestor(transition.source, transition.target)
+            last_before_lca = transition.source
+            for state_name in statechart.ancestors_for(transition.source):
+                if state_name == lca:
+                    break
+                last_before_lca = state_name
+            exited_states = statechart.descendants_for(last_before_lca)[::-1] + [last_before_lca]
+
+            entered_states = [transition.target]
+            for state_name in statechart.ancestors_for(transition.target):
+                if state_name == lca:
+                    break
+                entered_states.insert(0, state_name)
+
+            steps[i] = (tuple(exited_states), tuple(entered_states))
+
+    # Mimic Interpreter._select_transitions, with one dispatch method for each event
+    groups = []  # type: List[Tuple[int, ...]]
+    dispatch = {}  # type: Dict[Optional[str], str]
+    methods = []  # type: List[List[str]]
+    indexes = {id(transition): i for i, transition in enumerate(transitions)}
+    for event in [None] + statechart.events_for():
+        candidates = sorted(
+            (t for t in transitions if t.event == event),
+            key=lambda t: (-depth[t.source], t.source, -t.priority, indexes[id(t)])
+        )
+        if len(candidates) == 0:
+            continue
+        sources = [
+            (source, [
+                tuple(indexes[id(t)] for t in group)
+                for _, group in groupby(group, key=lambda t: t.priority)
+            ])
+            for source, group in groupby(candidates, key=lambda t: t.source)
+        ]
+        dispatch[event] = '_dispatch_{}'.format(len(methods))
+        methods.append(_dispatch_method(statechart, dispatch[event], event, sources, groups))
+
+    tables = [
+        ('STATECHART', (statechart.name, statechart.description, statechart.preamble)),
+        ('STATES', tuple(state_data)),
+        ('TRANSITIONS', tuple(transition_data)),
+        ('ROOT', root),
+        ('DEPTH', depth),
+        ('PARENT', parent),
+        ('GROUPS', tuple(groups)),
+        ('DISPATCH', dispatch),
+        ('STEPS', steps),
+        ('STABILIZATION', stabilization),
+    ]
+
+    lines = [
+        '"""',
+        'Interpreter for statechart {!r}.'.format(statechart.name),
+        '',
+        'This module was generated by sismic.compiler (Sismic {}), do not edit.'.format(__version__),
+        '"""',
+        'from sismic.compiler import CompiledInterpreter',
+        '',
+        "__all__ = ['{}']".format(class_name),
+        '',
+        '',
+        'class {}(CompiledInterpreter):'.format(class_name),
+    ]
+    for attribute, value in tables:
+        value = pprint.pformat(value, indent=1, width=120).replace('\n', '\n    ')
+        lines.append('    {} = {}'.format(attribute, value))
+    for method in methods:
+        lines.append('')
+        lines.extend('    ' + line for line in method)
+
+    return '\n'.join(lines) + '\n'
+
+
+def load_compiled_statechart(source: str, *, module_name: str='compiled_statechart') -> type:
+    """
+    Execute the source code of a module generated by *compile_statechart*, and return its
+    *CompiledInterpreter* subclass.
+
+    :param source: source code of a module generated by *compile_statechart*
+    :param module_name: name of the module to create
+    :return: a subclass of *CompiledInterpreter*
+    """
+    module = types.ModuleType(module_name)
+    exec(compile(source, '<{}>'.format(module_name), 'exec'), module.__dict__)
+    return getattr(module, module.__all__[0])
+
+
+def cli(args=None) -> int:
+    parser = argparse.ArgumentParser(prog='sismic-compile',
+                                     description='Command-line utility to compile a YAML statechart into a Python module.')
+
+    parser.add_argument('statechart', metavar='statechart', type=str,
+                        help='A YAML file describing a statechart')
+    parser.add_argument('--class-name', metavar='name', type=str, default=None,
+                        help='Name of the generated class')
+    parser.add_argument('-o', '--output', metavar='output', type=str, default=None,
+                        help='Python file to write, instead of printing the generated module')
+
+    args = parser.parse_args(args)
+
+    from .io import import_from_yaml
+    source = compile_statechart(import_from_yaml(filepath=args.statechart), class_name=args.class_name)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(source)
+    else:
+        print(source)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
@@ -0,0 +1,131 @@
+import random
+
+from typing import Dict, List, Tuple
+
+from .model import (BasicState, CompoundState, DeepHistoryState, Event, OrthogonalState,
+                    ShallowHistoryState, Statechart, Transition)
+
+__all__ = ['generate_statechart', 'generate_events']
+
+
+def generate_statechart(*, depth: int=1, width: int=3, regions: int=1, transitions: int=10, events: int=5,
+                        guards: float=0.0, actions: float=0.0, history: float=0.0, seed: int=0,
+                        name: str=None) -> Statechart:
+    """
+    Generate a synthetic statechart of given shape, for instance to study how the execution
+    scales with the size of a statechart.
+
+    The root state is an orthogonal state named "root" that has *regions* compound states as children,
+    named "r0", "r1", etc. Each region contains *depth* levels of nested states: each level has *width*
+    children, the first of them being the compound state containing the next level (except for the last
+    level), and being the initial state of its level. States are named after their region, their level
+    and their position (e.g. "r0_2_1"). With probability *history*, a compound state has a shallow or a deep
+    history state (e.g. "r0_2_h") whose initial memory is the initial state of its parent.
+
+    Then, *transitions* transitions are added. Each of them is put in a randomly chosen region, from a state
+    of this region to a state or a history state of this region (including itself), and is triggered by
+    one of *events* events named "e0", "e1", etc. With probability *guards*, a transition has a guard that
+    depends on variable *x* (initialized to 0 in the preamble), and with probability *actions*, it has an
+    action that increments *x*. Transitions sharing a same source state and a same event are given distinct
+    priorities, so that the execution of the generated statechart is always deterministic.
+
+    The generation is deterministic for given parameters.
+
+    :param depth: number of nested levels in each region (at least 1)
+    :param width: number of states at each level (at least 1)
+    :param regions: number of orthogonal regions (at least 1)
+    :param transitions: number of transitions
+    :param events: number of distinct events (at least 1)
+    :param guards: probability for a transition to have a guard
+    :param actions: probability for a transition to have an action
+    :param history: probability for a compound state to have a history state
+    :param seed: seed of the random generator
+    :param name: name of the statechart (generated from the parameters by default)
+    :return: a *Statechart* instance
+    """
+    if min(depth, width, regions, events) < 1:
+        raise ValueError('depth, width, regions and events must be positive integers')
+    if transitions < 0:
+        raise ValueError('transitions must be a non-negative integer, not {}'.format(transitions))
+    for parameter, value in (('guards', guards), ('actions', actions), ('history', history)):
+        if not 0 <= value <= 1:
+            raise ValueError('{} must be between 0 and 1, not {}'.format(parameter, value))
+
+    rng = random.Random(seed)
+    if name is None:
+        name = 'depth={} width={} regions={} transitions={} events={}'.format(
+            depth, width, regions, transitions, events)
+
+    statechart = Statechart(name, preamble='x = 0')
+    statechart.add_state(OrthogonalState('root'), None)
+
+    # Possible sources and targets of transitions, for each region
+    sources = []  # type: List[List[str]]
+    targets = []  # type: List[List[str]]
+    for region in range(regions):
+        region_name = 'r{}'.format(region)
+        region_sources = [region_name]
+        region_targets = []  # type: List[str]
+
+        parent = region_name
+        statechart.add_state(CompoundState(parent, initial='{}_1_0'.format(region_name)), 'root')
+        for level in range(1, depth + 1):
+            if rng.random() < history:
+                history_name = '{}_{}_h'.format(region_name, level)
+                klass = DeepHistoryState if rng.random() < 0.5 else ShallowHistoryState
+                statechart.add_state(klass(history_name, memory='{}_{}_0'.format(region_name, level)), parent)
+                region_targets.append(history_name)
+
+            next_parent = None
+            for position in range(width):
+                state_name = '{}_{}_{}'.format(region_name, level, position)
+                if position == 0 and level < depth:
+                    initial = '{}_{}_0'.format(region_name, level + 1)
+                    statechart.add_state(CompoundState(state_name, initial=initial), parent)
+                    next_parent = state_name
+                else:
+                    statechart.add_state(BasicState(state_name), parent)
+                region_sources.append(state_name)
+                region_targets.append(state_name)
+            parent = next_parent
+
+        sources.append(region_sources)
+        targets.append(region_targets)
+
+    # Number of transitions for each source state and event, to assign distinct priorities
+    priorities = {}  # type: Dict[Tuple[str, str], int]
+    for _ in range(transitions):
+        region = rng.randrange(regions)
+        source = rng.choice(sources[region])
+        target = rng.choice(targets[region])
+        event = 'e{}'.format(rng.randrange(events))
+        guard = 'x % {} != {}'.format(rng.randint(2, 5), rng.randint(0, 1)) if rng.random() < guards else None
+        action = 'x += 1' if rng.random() < actions else None
+
+        priority = priorities.get((source, event), 0)
+        priorities[source, event] = priority - 1
+        statechart.add_transition(
+            Transition(source, target, event=event, guard=guard, action=action, priority=priority))
+
+    statechart.validate()
+    return statechart
+
+
+def generate_events(statechart: Statechart, count: int, *, seed: int=0) -> List[Event]:
+    """
+    Generate a workload of events for given statechart, by uniformly choosing *count* events among
+    the ones that appear in its transitions.
+
+    The generation is deterministic for given parameters.
+
+    :param statechart: a *Statechart* instance
+    :param count: number of events to generate
+    :param seed: seed of the random generator
+    :return: a list of *Event* instances
+    """
+    names = statechart.events_for()
+    if len(names) == 0:
+        raise ValueError('Statechart {} has no event'.format(statechart))
+
+    rng = random.Random(seed)
+    return [Event(rng.choice(names)) for _ in range(count)]
@@ -2,14 +2,16 @@ import threading
 import time
 import warnings
 
-from collections import Counter
+from collections import Counter, deque
 from functools import wraps
-from typing import Any, Callable, List, Mapping
+from typing import Any, Callable, List, Mapping, Optional, TextIO, Union
 
+from .exceptions import ContractError, PropertyStatechartError, SismicError
 from .interpreter import Interpreter
 from .model import MacroStep
+from .utilities import unwrap_methods, wrap_method
 
-__all__ = ['log_trace', 'run_in_background', 'coverage_from_trace']
+__all__ = ['log_trace', 'BoundedTrace', 'run_in_background', 'coverage_from_trace']
 
 
 def log_trace(interpreter: Interpreter) -> List[MacroStep]:
@@ -34,6 +36,122 @@ def log_trace(interpreter: Interpreter) -> List[MacroStep]:
     return trace
 
 
+class BoundedTrace:
+    """
+    A trace that keeps the last *capacity* macro steps of an interpreter, the oldest ones being
+    discarded. Unlike *log_trace*, its memory is bounded, so that it can be kept attached to an
+    interpreter during its whole execution, and be inspected or dumped when something goes wrong.
+
+    The trace is attached to an interpreter by wrapping its *execute_once* method. When a *ContractError*
+    or a *PropertyStatechartError* is raised by *execute_once*, the error is stored in *error* and, if
+    *dump_to* is provided, the trace is dumped (see *dump*) before the error is propagated.
+
+    :param interpreter: an *Interpreter* instance
+    :param capacity: maximal number of macro steps that are kept
+    :param dump_to: a path or a text file to which the trace is dumped when an error is raised
+    """
+
+    def __init__(self, interpreter: Interpreter, capacity: int=1000, *, dump_to: Union[str, TextIO]=None) -> None:
+        if capacity < 1:
+            raise ValueError('capacity must be a positive integer, not {}'.format(capacity))
+
+        self.dump_to = dump_to
+        self.error = None  # type: Optional[SismicError]
+        self.recorded = 0
+
+        self._steps = deque(maxlen=capacity)  # type: deque
+        self._interpreter = interpreter  # type: Optional[Interpreter]
+
+        func = interpreter.execute_once
+        append = self._steps.append
+
+        @wraps(func)
+        def new_func():
+            try:
+                step = func()
+            except (ContractError, PropertyStatechartError) as e:
+                self.error = e
+                if self.dump_to is not None:
+                    self.dump(self.dump_to)
+                raise
+            if step:
+                append(step)
+                self.recorded += 1
+            return step
+
+        self._handle = wrap_method(interpreter, 'execute_once', new_func)
+
+    @property
+    def capacity(self) -> int:
+        """
+        Maximal number of macro steps that are kept.
+        """
+        return self._steps.maxlen
+
+    @property
+    def steps(self) -> List[MacroStep]:
+        """
+        The macro steps that are kept, from the oldest to the most recent one.
+        """
+        return list(self._steps)
+
+    @property
+    def discarded(self) -> int:
+        """
+        Number of macro steps that were discarded.
+        """
+        return self.recorded - len(self._steps)
+
+    def detach(self) -> None:
+        """
+        Stop recording the macro steps of the interpreter. The trace can still be inspected and dumped.
+
+        :raise ValueError: if *execute_once* was wrapped again after this trace was attached
+        """
+        if self._interpreter is not None:
+            unwrap_methods(self._handle)
+            self._interpreter = None
+
+    def clear(self) -> None:
+        """
+        Discard the macro steps that are kept, and the error if any.
+        """
+        self._steps.clear()
+        self.error = None
+
+    def dump(self, file: Union[str, TextIO]=None) -> str:
+        """
+        Return a textual representation of the trace: the number of discarded macro steps, the macro
+        steps that are kept (one per line), and the error if any.
+
+        :param file: an optional path or text file to which the representation is written
+            (the file is appended to if a path is provided)
+        :return: the representation
+        """
+        lines = ['{} macro steps recorded, {} discarded'.format(self.recorded, self.discarded)]
+        lines.extend(str(step) for step in self._steps)
+        if self.error is not None:
+            lines.append(str(self.error))
+        output = '\n'.join(lines) + '\n'
+
+        if isinstance(file, str):
+            with open(file, 'a') as f:
+                f.write(output)
+        elif file is not None:
+            file.write(output)
+            file.flush()
+        return output
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    def __iter__(self):
+        return iter(self._steps)
+
+    def __repr__(self):
+        return '{}(capacity={!r}, {} macro steps)'.format(self.__class__.__name__, self.capacity, len(self))
+
+
 def coverage_from_trace(trace: List[MacroStep]) -> Mapping[str, Counter]:
     """
     Given a list of macro steps considered as the trace of a statechart execution, return *Counter* objects
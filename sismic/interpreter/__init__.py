@@ -1,4 +1,19 @@
 from .default import Interpreter
+from .durability import WriteAheadLog
+from .checker import AsyncContractChecker
+from .coverage import CoverageCollector
+from .hibernation import InterpreterRegistry, hibernate, revive, statechart_fingerprint
+from .memory import CompactInterpreter, memory_footprint
+from .metrics import Histogram, InterpreterMetrics
+from .policy import ContractPolicy
+from .recording import EventRecorder, ReplayReport, replay
+from .sessions import DirectoryStore, MemoryStore, SessionManager, SessionStore, SqliteStore
+from .tracelog import BinaryTraceReader, BinaryTraceWriter, MacroStepView
+from .tracing import ChromeTracer
 from ..model.events import Event, InternalEvent, MetaEvent
 
-__all__ = ['Interpreter', 'Event', 'InternalEvent', 'MetaEvent']
+__all__ = ['Interpreter', 'AsyncContractChecker', 'ChromeTracer', 'CompactInterpreter', 'ContractPolicy', 'Histogram',
+           'InterpreterMetrics', 'InterpreterRegistry', 'hibernate', 'memory_footprint', 'revive',
+           'statechart_fingerprint', 'DirectoryStore', 'MemoryStore', 'SessionManager', 'SessionStore', 'SqliteStore',
+           'WriteAheadLog', 'EventRecorder', 'ReplayReport', 'replay',
+           'BinaryTraceReader', 'BinaryTraceWriter', 'MacroStepView', 'CoverageCollector', 'Event', 'InternalEvent', 'MetaEvent']
@@ -0,0 +1,214 @@
+import copy
+import queue
+import threading
+
+from collections import Counter
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple, Union
+
+from ..code import PythonEvaluator
+from ..code.python import _CODE_CACHES
+from ..exceptions import InvariantError, PostconditionError, PreconditionError
+from ..model import Event, MacroStep, MicroStep, StateMixin, Statechart, Transition
+
+__all__ = ['AsyncContractChecker']
+
+
+class _InterpreterSnapshot:
+    """
+    A frozen view of an interpreter, exposing what an evaluator needs to check contracts.
+    """
+
+    __slots__ = ['_statechart', '_configuration', 'time', '_entry_time', '_idle_time',
+                 '_sent_events', '_sent_event_names']
+
+    def __init__(self, interpreter) -> None:
+        self._statechart = interpreter.statechart  # type: Statechart
+        self._configuration = frozenset(interpreter._configuration)  # type: FrozenSet[str]
+        self.time = interpreter.time  # type: float
+        self._entry_time = dict(interpreter._entry_time)  # type: Dict[str, float]
+        self._idle_time = dict(interpreter._idle_time)  # type: Dict[str, float]
+        self._sent_events = list(interpreter._sent_events)  # type: List[Event]
+        self._sent_event_names = Counter(interpreter._sent_event_names)  # type: Dict[str, int]
+
+    @property
+    def configuration(self) -> List[str]:
+        return sorted(self._configuration, key=lambda s: (self._statechart.depth_for(s), s))
+
+
+class AsyncContractChecker:
+    """
+    A contract checker that evaluates the contracts of an interpreter in a background thread.
+
+    When an interpreter is created with such a checker (using its *contract_checker* parameter),
+    the conditions of its contracts are not evaluated during the execution. Instead, a snapshot of
+    the context, of the active configuration and of the time is taken when a contract has to be checked,
+    and its conditions are evaluated on this snapshot in a worker thread. As a consequence, the execution
+    is never interrupted by a *ContractError*.
+
+    A snapshot is shared by the contracts that are checked while the interpreter does not change, e.g. by
+    the invariants of all the active states at the end of a macro step. This relies on the version of the
+    context of a *PythonEvaluator*: with another evaluator, a snapshot is taken for each contract.
+    The snapshot of the context is a shallow copy of each variable: a value nested in a variable (e.g.
+    a list in a list) is not copied, and could be changed by the execution before it is checked.
+
+    Violations (instances of *ContractError*, or any other exception raised while checking a
+    contract) are either passed to *callback* (in the worker thread), or put in the *errors* queue
+    if no callback is provided. Use *wait* to block until all the submitted contracts are checked,
+    and *stop* to stop the worker thread.
+
+    Conditions are evaluated by a fresh evaluator for each snapshot, obtained by calling *evaluator_klass*
+    with the snapshot (acting as an interpreter) and its context. The evaluator is expected to behave
+    like a *PythonEvaluator*, in particular regarding *__old__*. The code compiled by the evaluators
+    of a checker is shared by them if they are *PythonEvaluator* instances.
+
+    :param callback: an optional callable that accepts an exception, called for each violation.
+    :param evaluator_klass: a callable that returns the evaluator used to check contracts.
+    """
+
+    def __init__(self, callback: Callable[[Exception], Any]=None, *,
+                 evaluator_klass: Callable[..., PythonEvaluator]=PythonEvaluator) -> None:
+        self.callback = callback
+        self.errors = queue.Queue()  # type: queue.Queue
+        self._evaluator_klass = evaluator_klass
+
+        self.checked = 0
+        self._jobs = queue.Queue()  # type: queue.Queue
+
+        # Last step, version of the context, snapshot and context (used by the stepping thread)
+        self._snapshot = None  # type: Optional[Tuple]
+        # Last snapshot and its evaluator, and caches of compiled code (used by the worker thread)
+        self._evaluator = None  # type: Optional[Tuple]
+        self._code_caches = {name: {} for name in _CODE_CACHES}  # type: Dict[str, Dict]
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, interpreter, obj: Union[Transition, StateMixin], cond_type: str,
+               step: Optional[Union[MacroStep, MicroStep]]=None) -> None:
+        """
+        Take a snapshot of given interpreter, and submit the conditions of given object
+        to the worker thread.
+
+        :param interpreter: the interpreter whose contract has to be checked
+        :param obj: object with preconditions, postconditions or invariants
+        :param cond_type: either "preconditions", "postconditions" or "invariants"
+        :param step: step in which the check occurs.
+        """
+        event = getattr(step, 'event', None)
+        memory = getattr(interpreter._evaluator, '_memory', {})
+
+        if cond_type == 'preconditions':
+            # Let the evaluator record __old__ for the next postconditions and invariants. The returned
+            # conditions are not consumed, and hence not evaluated in this thread.
+            interpreter._evaluator.evaluate_preconditions(obj, event)
+
+        if len(getattr(obj, cond_type, [])) == 0:
+            return
+
+        snapshot, context = self._take_snapshot(interpreter, step)
+        self._jobs.put((snapshot, context, memory.get(id(obj), None), obj, cond_type, step))
+
+    def _take_snapshot(self, interpreter, step: Optional[Union[MacroStep, MicroStep]]) -> Tuple:
+        """
+        Return a snapshot of given interpreter and a shallow copy of its context. The previous ones
+        are returned if they were taken for the same interpreter and step, and if the version of the
+        context, the time and the active configuration did not change since then.
+
+        :param interpreter: the interpreter whose contract has to be checked
+        :param step: step in which the check occurs.
+        :return: a snapshot and a context
+        """
+        version = getattr(interpreter.context, 'version', None)
+        if self._snapshot is not None and version is not None:
+            last_interpreter, last_step, last_version, snapshot, context = self._snapshot
+            if (last_interpreter is interpreter and last_step is step and last_version == version and
+                    snapshot.time == interpreter.time and snapshot._configuration == interpreter._configuration):
+                return snapshot, context
+
+        snapshot = _InterpreterSnapshot(interpreter)
+        context = {name: copy.copy(value) for name, value in interpreter.context.items()}
+        self._snapshot = (interpreter, step, version, snapshot, context)
+        return snapshot, context
+
+    def wait(self) -> None:
+        """
+        Block until all the submitted contracts are checked.
+        """
+        self._jobs.join()
+
+    def stop(self) -> None:
+        """
+        Check the remaining contracts, and stop the worker thread.
+        """
+        if self._thread.is_alive():
+            self._jobs.put(None)
+            self._thread.join()
+
+    @property
+    def running(self) -> bool:
+        """
+        Holds if the worker thread is running.
+        """
+        return self._thread.is_alive()
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            try:
+                if job is None:
+                    return
+                for error in self._check(*job):
+                    self._report(error)
+            except Exception as e:  # Raised by the callback
+                self.errors.put(e)
+            finally:
+                self._jobs.task_done()
+
+    def _check(self, snapshot: _InterpreterSnapshot, context: Mapping[str, Any], old: Any,
+               obj: Union[Transition, StateMixin], cond_type: str,
+               step: Optional[Union[MacroStep, MicroStep]]) -> List[Exception]:
+        """
+        Check the conditions of given object on given snapshot, and return the violations.
+        """
+        exception_klass = {'preconditions': PreconditionError,
+                           'postconditions': PostconditionError,
+                           'invariants': InvariantError}[cond_type]
+        try:
+            evaluator = self._evaluator_for(snapshot, context)
+            if old is not None:
+                evaluator._memory[id(obj)] = old
+            else:
+                evaluator._memory.pop(id(obj), None)
+
+            unsatisfied_conditions = getattr(evaluator, 'evaluate_' + cond_type)(obj, getattr(step, 'event', None))
+            return [
+                exception_klass(configuration=snapshot.configuration, step=step, obj=obj,
+                                assertion=condition, context=evaluator.context)
+                for condition in unsatisfied_conditions
+            ]
+        except Exception as e:
+            return [e]
+        finally:
+            self.checked += 1
+
+    def _evaluator_for(self, snapshot: _InterpreterSnapshot, context: Mapping[str, Any]) -> PythonEvaluator:
+        """
+        Return an evaluator for given snapshot and context, that is reused for the jobs that share them.
+        """
+        if self._evaluator is not None and self._evaluator[0] is snapshot:
+            return self._evaluator[1]
+
+        evaluator = self._evaluator_klass(snapshot, initial_context=context)
+        if isinstance(evaluator, PythonEvaluator):
+            for name, cache in self._code_caches.items():
+                setattr(evaluator, name, cache)
+        self._evaluator = (snapshot, evaluator)
+        return evaluator
+
+    def _report(self, error: Exception) -> None:
+        if self.callback is None:
+            self.errors.put(error)
+        else:
+            self.callback(error)
+
+    def __repr__(self):
+        return '{}(callback={!r})'.format(self.__class__.__name__, self.callback)
@@ -0,0 +1,296 @@
+from collections import Counter
+from functools import wraps
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Union
+
+from .default import Interpreter
+from .hibernation import statechart_fingerprint
+from ..model import Event, MetaEvent, Statechart, Transition
+from ..utilities import unwrap_methods, wrap_method
+
+__all__ = ['CoverageCollector']
+
+
+def _identities(statechart: Statechart) -> List[str]:
+    """
+    Return an identity for each transition of given statechart that does not depend on the order of its
+    transitions: its string representation (its source, priority, event, guard and target), followed by
+    its rank among the transitions that have the same representation, if it is not the first one.
+    """
+    ranks = Counter()  # type: Counter
+    identities = []
+    for transition in statechart.transitions:
+        text = str(transition)
+        identities.append(text if ranks[text] == 0 else '{} #{}'.format(text, ranks[text]))
+        ranks[text] += 1
+    return identities
+
+
+class CoverageCollector:
+    """
+    A collector of the coverage of a statechart, whose counters are updated incrementally while
+    the interpreters it is attached to are executed. Unlike *sismic.helpers.coverage_from_trace*,
+    it does not require to keep the trace of the execution.
+
+    The number of times each state is entered and exited, and the number of times each transition is
+    processed, are counted from the meta-events raised by the interpreters (see *Interpreter.attach*).
+    Transitions are counted by their position in the statechart. As meta-events only expose the source,
+    the target and the event of a processed transition, a transition that shares them with other ones
+    is identified by the guards that held during the current macro step, by wrapping the *evaluate_guards*
+    method of the evaluator of the interpreters. A processed transition that cannot be identified this way
+    is not credited to any transition, but counted in *ambiguous_transitions*.
+
+    If *guards* is True, the number of times the guard of each transition holds and does not hold is
+    counted as well. Guards that are not evaluated because an interpreter is *trusted* are not counted.
+
+    Collectors for a same statechart can be merged with *merge* (or with ``+``), and their counters can be
+    exported with *as_dict* (e.g. in JSON) and imported with *from_dict*, to merge the coverage collected
+    by many interpreters in several processes. In these representations, transitions are identified by their
+    source, target, event, guard and priority (and by their rank among the transitions that share all of them),
+    so that they can be imported in a copy of the statechart whose transitions are in a different order.
+    Use *report* to get the states and transitions that were not covered.
+
+    :param statechart: the statechart whose coverage is collected
+    :param guards: whether the guards that hold and do not hold are counted
+    """
+
+    def __init__(self, statechart: Statechart, *, guards: bool=True) -> None:
+        self.statechart = statechart
+        self.guards = guards
+
+        self.entered_states = Counter()  # type: Counter
+        self.exited_states = Counter()  # type: Counter
+        # Counters of transitions are indexed by the position of transitions in the statechart
+        self.processed_transitions = Counter()  # type: Counter
+        self.guards_true = Counter()  # type: Counter
+        self.guards_false = Counter()  # type: Counter
+        # Number of processed transitions that could not be identified among the ones they share their
+        # source, target and event with
+        self.ambiguous_transitions = 0
+
+        self._indexes = {id(transition): index for index, transition in enumerate(statechart.transitions)}
+        self._identities = _identities(statechart)
+        self._candidates = {}  # type: Dict[Any, List[int]]
+        for index, transition in enumerate(statechart.transitions):
+            self._candidates.setdefault((transition.source, transition.target, transition.event), []).append(index)
+
+        # For each attached interpreter, its listener and the handle on its wrapped evaluator, if any
+        self._attached = {}  # type: Dict[int, Any]
+
+    def attach(self, interpreter: Interpreter) -> None:
+        """
+        Attach this collector to given interpreter.
+
+        :param interpreter: an *Interpreter* instance for the statechart of this collector
+        :raise ValueError: if this collector is already attached to given interpreter, or if the
+            interpreter is not for the statechart of this collector.
+        """
+        if id(interpreter) in self._attached:
+            raise ValueError('Collector is already attached to {!r}'.format(interpreter))
+        if interpreter.statechart is not self.statechart:
+            raise ValueError('Interpreter {!r} is not for statechart {!r}'.format(interpreter, self.statechart))
+
+        # Transitions whose guard held during the current macro step of this interpreter
+        enabled = set()  # type: set
+
+        def listener(event: MetaEvent) -> None:
+            name = event.name
+            if name == 'state entered':
+                self.entered_states[event.state] += 1
+            elif name == 'state exited':
+                self.exited_states[event.state] += 1
+            elif name == 'transition processed':
+                index = self._identify(event, enabled)
+                if index is None:
+                    self.ambiguous_transitions += 1
+                else:
+                    self.processed_transitions[index] += 1
+            elif name == 'step started':
+                enabled.clear()
+
+        interpreter.attach(listener)
+
+        evaluator = interpreter._evaluator
+        handle = wrap_method(evaluator, 'evaluate_guards',
+                             self._wrap_evaluate_guards(evaluator.evaluate_guards, enabled))
+        self._attached[id(interpreter)] = (listener, handle)
+
+    def _identify(self, event: MetaEvent, enabled: set) -> Optional[int]:
+        """
+        Return the index of the transition that was processed, according to given meta-event, or None
+        if it cannot be identified among the transitions that share its source, target and event.
+        """
+        candidates = self._candidates[event.source, event.target, getattr(event.event, 'name', None)]
+        if len(candidates) == 1:
+            return candidates[0]
+        candidates = [index for index in candidates if index in enabled]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def _wrap_evaluate_guards(self, func: Callable, enabled: set) -> Callable:
+        indexes = self._indexes
+
+        @wraps(func)
+        def wrapper(transitions: Sequence[Transition], event: Optional[Event]=None, *, first: bool=False) -> List[int]:
+            result = func(transitions, event, first=first)
+            evaluated = transitions[:result[0] + 1] if first and len(result) > 0 else transitions
+            for position, transition in enumerate(evaluated):
+                index = indexes[id(transition)]
+                if position in result:
+                    enabled.add(index)
+                    if self.guards and transition.guard is not None:
+                        self.guards_true[index] += 1
+                elif self.guards and transition.guard is not None:
+                    self.guards_false[index] += 1
+            return result
+
+        return wrapper
+
+    def detach(self, interpreter: Interpreter) -> None:
+        """
+        Detach this collector from given interpreter.
+
+        :param interpreter: an *Interpreter* instance
+        :raise ValueError: if *evaluate_guards* was wrapped again after this collector was attached
+        """
+        listener, handle = self._attached[id(interpreter)]
+        unwrap_methods(handle)
+        interpreter.detach(listener)
+        del self._attached[id(interpreter)]
+
+    def merge(self, other: Union['CoverageCollector', Mapping[str, Any]]) -> 'CoverageCollector':
+        """
+        Add the counters of given collector (or of its dict representation, see *as_dict*) to the
+        counters of this collector.
+
+        :param other: a *CoverageCollector* instance or a dict representation
+        :return: this collector
+        :raise ValueError: if given collector is not for the same statechart
+        """
+        if not isinstance(other, CoverageCollector):
+            other = CoverageCollector.from_dict(self.statechart, other)
+        elif other.statechart is not self.statechart:
+            # Transitions may be in a different order in the other statechart
+            try:
+                other = CoverageCollector.from_dict(self.statechart, other.as_dict())
+            except ValueError as e:
+                raise ValueError('Cannot merge the coverage of {} and {}'.format(
+                    other.statechart, self.statechart)) from e
+
+        self.entered_states.update(other.entered_states)
+        self.exited_states.update(other.exited_states)
+        self.processed_transitions.update(other.processed_transitions)
+        self.guards_true.update(other.guards_true)
+        self.guards_false.update(other.guards_false)
+        self.ambiguous_transitions += other.ambiguous_transitions
+        return self
+
+    def __add__(self, other: 'CoverageCollector') -> 'CoverageCollector':
+        return CoverageCollector(self.statechart, guards=self.guards).merge(self).merge(other)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Return a dict representation of the counters, that can be serialized (e.g. in JSON) and merged
+        into a collector in another process. Transitions are identified by their string representation
+        (followed by their rank among the transitions that have the same one, if they are not the first one).
+        """
+        identities = self._identities
+        return {
+            'fingerprint': statechart_fingerprint(self.statechart),
+            'entered states': dict(self.entered_states),
+            'exited states': dict(self.exited_states),
+            'processed transitions': {identities[k]: v for k, v in self.processed_transitions.items()},
+            'guards true': {identities[k]: v for k, v in self.guards_true.items()},
+            'guards false': {identities[k]: v for k, v in self.guards_false.items()},
+            'ambiguous transitions': self.ambiguous_transitions,
+        }
+
+    @classmethod
+    def from_dict(cls, statechart: Statechart, data: Mapping[str, Any]) -> 'CoverageCollector':
+        """
+        Create a collector for given statechart from a dict representation of its counters (see *as_dict*).
+
+        :param statechart: the statechart whose coverage was collected
+        :param data: a dict representation
+        :return: a *CoverageCollector* instance
+        :raise ValueError: if the representation was not collected for given statechart
+        """
+        if data['fingerprint'] != statechart_fingerprint(statechart):
+            raise ValueError('Coverage was not collected for {}'.format(statechart))
+
+        collector = cls(statechart)
+        indexes = {identity: index for index, identity in enumerate(collector._identities)}
+        collector.entered_states.update(data['entered states'])
+        collector.exited_states.update(data['exited states'])
+        collector.ambiguous_transitions = data.get('ambiguous transitions', 0)
+        for attribute, key in (('processed_transitions', 'processed transitions'),
+                               ('guards_true', 'guards true'), ('guards_false', 'guards false')):
+            try:
+                getattr(collector, attribute).update({indexes[k]: v for k, v in data[key].items()})
+            except KeyError as e:
+                raise ValueError('Transition {} does not exist in {}'.format(e.args[0], statechart)) from e
+        return collector
+
+    def coverage(self) -> Mapping[str, Counter]:
+        """
+        Return the counters in the format of *sismic.helpers.coverage_from_trace*.
+
+        :return: A dict whose keys are "entered states", "exited states" and "processed transitions" and
+            whose values are Counter objects.
+        """
+        transitions = self.statechart.transitions
+        return {
+            'entered states': Counter(self.entered_states),
+            'exited states': Counter(self.exited_states),
+            'processed transitions': Counter(
+                {transitions[index]: count for index, count in self.processed_transitions.items()}),
+        }
+
+    def uncovered_states(self) -> List[str]:
+        """
+        Return the names of the states that were never entered.
+        """
+        return [name for name in self.statechart.states if self.entered_states[name] == 0]
+
+    def uncovered_transitions(self) -> List[Transition]:
+        """
+        Return the transitions that were never processed.
+        """
+        return [t for i, t in enumerate(self.statechart.transitions) if self.processed_transitions[i] == 0]
+
+    def uncovered_guards(self) -> List[Transition]:
+        """
+        Return the transitions with a guard that never held or that never did not hold.
+        """
+        return [
+            t for i, t in enumerate(self.statechart.transitions)
+            if t.guard is not None and (self.guards_true[i] == 0 or self.guards_false[i] == 0)
+        ]
+
+    def report(self) -> str:
+        """
+        Return a textual report of the states, transitions and guards that were not covered.
+        """
+        statechart = self.statechart
+        states, transitions = self.uncovered_states(), self.uncovered_transitions()
+        lines = [
+            'States: {}/{} entered'.format(len(statechart.states) - len(states), len(statechart.states)),
+            'Transitions: {}/{} processed'.format(
+                len(statechart.transitions) - len(transitions), len(statechart.transitions)),
+        ]
+        lines.extend(' - never entered: {}'.format(name) for name in states)
+        lines.extend(' - never processed: {}'.format(transition) for transition in transitions)
+        if self.ambiguous_transitions > 0:
+            lines.append(' - {} processed transitions could not be identified'.format(self.ambiguous_transitions))
+
+        if self.guards:
+            guarded = [(i, t) for i, t in enumerate(statechart.transitions) if t.guard is not None]
+            lines.append('Guards: {}/{} held and did not hold'.format(
+                len(guarded) - len(self.uncovered_guards()), len(guarded)))
+            for index, transition in guarded:
+                if self.guards_true[index] == 0:
+                    lines.append(' - never held: {}'.format(transition))
+                if self.guards_false[index] == 0:
+                    lines.append(' - never did not hold: {}'.format(transition))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return '{}({!r}, {} interpreters)'.format(self.__class__.__name__, self.statechart, len(self._attached))
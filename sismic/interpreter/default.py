@@ -1,11 +1,15 @@
 import bisect
 import warnings
 
+from collections import Counter
 from itertools import combinations
 from typing import (Any, Callable, Dict, Iterable, List, Mapping, Optional,
                     Set, Tuple, Union, cast)
 
 from .listener import InternalEventListener, PropertyStatechartListener
+from .checker import AsyncContractChecker
+from .metrics import InterpreterMetrics
+from .policy import ContractPolicy
 from ..utilities import sorted_groupby
 from ..clock import Clock, SimulatedClock, SynchronizedClock
 from ..code import Evaluator, PythonEvaluator
@@ -46,15 +50,33 @@ class Interpreter:
     :param clock: A BaseClock instance that will be used to set this interpreter internal time.
         By default, a SimulatedClock is used.
     :param ignore_contract: set to True to ignore contract checking during the execution.
+    :param contract_policy: an optional *ContractPolicy* instance that determines whether contracts are
+        checked. By default, contracts are checked on every step (unless *ignore_contract* is set).
+    :param contract_checker: an optional *AsyncContractChecker* instance. If provided, contracts are checked
+        on snapshots in a background thread, and violations are reported by the checker instead of being raised.
+    :param trusted: set to True to trust the statechart to be deterministic and free of conflicting
+        transitions. The guards of transitions sharing a same source state and a same priority are
+        evaluated until one holds, and triggered transitions are not checked for non-determinism
+        or conflicts (no *NonDeterminismError* or *ConflictingTransitionsError* is raised). The execution of
+        a statechart that is not deterministic or that has conflicting transitions is then undefined.
+    :param metrics: an optional *InterpreterMetrics* instance in which performance counters are maintained.
     """
 
     def __init__(self, statechart: Statechart, *,
                  evaluator_klass: Callable[..., Evaluator]=PythonEvaluator,
                  initial_context: Mapping[str, Any]=None,
                  clock: Clock=None,
-                 ignore_contract: bool=False) -> None:
+                 ignore_contract: bool=False,
+                 contract_policy: ContractPolicy=None,
+                 contract_checker: AsyncContractChecker=None,
+                 trusted: bool=False,
+                 metrics: InterpreterMetrics=None) -> None:
         # Internal variables
         self._ignore_contract = ignore_contract
+        self._contract_policy = contract_policy
+        self._contract_checker = contract_checker
+        self._trusted = trusted
+        self._metrics = metrics
         self._statechart = statechart
 
         self._initialized = False
@@ -73,8 +95,9 @@ class Interpreter:
         self._entry_time = dict()  # type: Dict[str, float]
         self._idle_time = dict()  # type: Dict[str, float]
 
-        # Events sent during current macro step
+        # Events sent during current macro step, and multiset of their names
         self._sent_events = []  # type: List[Event]
+        self._sent_event_names = Counter()  # type: Dict[str, int]
 
         # Event queues
         self._internal_queue = []  # type: List[Tuple[float, InternalEvent]]
@@ -274,51 +297,81 @@ class Interpreter:
 
         :return: a macro step or *None* if nothing happened
         """
-        # Store time to have a consistent time value during this step
-        self._time = self.clock.time
+        metrics = self._metrics
+        if metrics is not None:
+            start = metrics.timer()
+            metrics.record_queues(len(self._internal_queue), len(self._external_queue))
 
-        # Reset the list of events that were sent
-        self._sent_events.clear()
+        try:
+            # Store time to have a consistent time value during this step
+            self._time = self.clock.time
 
-        # Notify listeners
-        self._raise_event(MetaEvent('step started', time=self.time))
-        
-        # Compute steps
-        computed_steps = self._compute_steps()
+            # Reset the list of events that were sent
+            self._sent_events.clear()
+            self._sent_event_names.clear()
 
-        if len(computed_steps) > 0:
+            if self._contract_policy is not None:
+                self._contract_policy.start_step()
 
-            # Consume event if it triggered a transition
-            if computed_steps[0].event is not None:
-                event = self._select_event(consume=True)
-                self._raise_event(MetaEvent('event consumed', event=event))
-            else:
-                event = None
+            # Notify listeners
+            self._raise_event(MetaEvent('step started', time=self.time))
 
-            # Execute the steps
-            if hasattr(self._evaluator, 'on_step_starts'):
-                warnings.warn('Evaluator.on_step_starts is deprecated since 1.4.0.', DeprecationWarning)
-                self._evaluator.on_step_starts(event)
+            # Compute steps
+            computed_steps = self._compute_steps()
 
-            executed_steps = []
-            for step in computed_steps:
-                executed_steps.append(self._apply_step(step))
-                executed_steps.extend(self._stabilize())
+            if len(computed_steps) > 0:
 
-            macro_step = MacroStep(time=self.time, steps=executed_steps)  # type: Optional[MacroStep]
-        else:  # No step
-            macro_step = None
+                # Consume event if it triggered a transition
+                if computed_steps[0].event is not None:
+                    event = self._select_event(consume=True)
+                    self._raise_event(MetaEvent('event consumed', event=event))
+                else:
+                    event = None
 
-        # Check state invariants
-        configuration = self.configuration  # Use self.configuration to benefit from the sorting by depth
-        for name in configuration:
-            state = self._statechart.state_for(name)
-            self._evaluate_contract_conditions(state, 'invariants', macro_step)
+                # Execute the steps
+                if hasattr(self._evaluator, 'on_step_starts'):
+                    warnings.warn('Evaluator.on_step_starts is deprecated since 1.4.0.', DeprecationWarning)
+                    self._evaluator.on_step_starts(event)
 
-        self._raise_event(MetaEvent('step ended'))
+                executed_steps = []
+                for step in computed_steps:
+                    executed_steps.append(self._apply_step(step))
+                    executed_steps.extend(self._stabilize())
+
+                macro_step = MacroStep(time=self.time, steps=executed_steps)  # type: Optional[MacroStep]
+
+                if metrics is not None:
+                    metrics.record_step(
+                        len(executed_steps), len(executed_steps) - len(computed_steps), event is not None,
+                        sum(1 for step in computed_steps if step.transition is not None),
+                    )
+            else:  # No step
+                macro_step = None
+
+            # Check state invariants
+            configuration = self.configuration  # Use self.configuration to benefit from the sorting by depth
+            for name in configuration:
+                state = self._statechart.state_for(name)
+                self._evaluate_contract_conditions(state, 'invariants', macro_step)
+
+            self._raise_event(MetaEvent('step ended'))
+        except Exception:
+            if metrics is not None:
+                metrics.errors += 1
+            raise
+        finally:
+            if metrics is not None:
+                metrics.latency.observe(metrics.timer() - start)
 
         return macro_step
 
+    @property
+    def metrics(self) -> Optional[InterpreterMetrics]:
+        """
+        The *InterpreterMetrics* instance in which performance counters are maintained, if any.
+        """
+        return self._metrics
+
     def _queue_event(self, event: Event):
         """
         Convenient helper to queue events wrt. to internal/external and their (optional) delay.
@@ -431,11 +484,13 @@ class Interpreter:
                     # Group and sort transitions based on their priority
                     priority_order = lambda t: t.priority
                     for _, transitions in sorted_groupby(transitions, key=priority_order, reverse=True):
-                        for transition in transitions:
-                            if transition.guard is None or self._evaluator.evaluate_guard(transition, exposed_event):
-                                # Add transition to the list of selected ones
-                                selected_transitions.append(transition)
-                                has_found_transitions = True
+                        enabled = self._evaluator.evaluate_guards(transitions, exposed_event, first=self._trusted)
+                        if self._metrics is not None:
+                            self._metrics.record_guards(transitions, enabled, self._trusted)
+                        for index in enabled:
+                            # Add transition to the list of selected ones
+                            selected_transitions.append(transitions[index])
+                            has_found_transitions = True
 
                         # Ignore ancestors/descendants w.r.t. inner-first/source state
                         if has_found_transitions:
@@ -455,43 +510,45 @@ class Interpreter:
         :param transitions: a list of *Transition* instances
         :return: an ordered list of *Transition* instances
         :raise ExecutionError: In case of non-determinism (*NonDeterminismError*) or conflicting
-            transitions (*ConflictingTransitionsError*).
+            transitions (*ConflictingTransitionsError*), unless the interpreter is trusted.
         """
         if len(transitions) > 1:
             # If more than one transition, we check (1) they are from separate regions and (2) they do not conflict
             # Two transitions conflict if one of them leaves the parallel state
-            for t1, t2 in combinations(transitions, 2):
-                # Check (1)
-                lca = cast(str, self._statechart.least_common_ancestor(t1.source, t2.source))
-                lca_state = self._statechart.state_for(lca)
-
-                # Their LCA must be an orthogonal state!
-                if not isinstance(lca_state, OrthogonalState):
-                    raise NonDeterminismError(
-                        'Non-determinist choice between transitions {t1} and {t2}'
-                        '\nConfiguration is {c}\nEvent is {e}\nTransitions are:{t}\n'
-                        .format(c=self.configuration, e=t1.event, t=transitions, t1=t1, t2=t2)
-                    )
-
-                # Check (2)
-                # This check must be done wrt. to LCA, as the combination of from_states could
-                # come from nested parallel regions!
-                for transition in [t1, t2]:
-                    last_before_lca = transition.source
-                    for state in self._statechart.ancestors_for(transition.source):
-                        if state == lca:
-                            break
-                        last_before_lca = state
-                    # Target must be a descendant (or self) of this state
-                    if (transition.target and
-                            (transition.target not in
-                             [last_before_lca] + self._statechart.descendants_for(last_before_lca))):
-                        raise ConflictingTransitionsError(
-                            'Conflicting transitions: {t1} and {t2}'
+            # These checks are skipped if the statechart is trusted
+            if not self._trusted:
+                for t1, t2 in combinations(transitions, 2):
+                    # Check (1)
+                    lca = cast(str, self._statechart.least_common_ancestor(t1.source, t2.source))
+                    lca_state = self._statechart.state_for(lca)
+
+                    # Their LCA must be an orthogonal state!
+                    if not isinstance(lca_state, OrthogonalState):
+                        raise NonDeterminismError(
+                            'Non-determinist choice between transitions {t1} and {t2}'
                             '\nConfiguration is {c}\nEvent is {e}\nTransitions are:{t}\n'
                             .format(c=self.configuration, e=t1.event, t=transitions, t1=t1, t2=t2)
                         )
 
+                    # Check (2)
+                    # This check must be done wrt. to LCA, as the combination of from_states could
+                    # come from nested parallel regions!
+                    for transition in [t1, t2]:
+                        last_before_lca = transition.source
+                        for state in self._statechart.ancestors_for(transition.source):
+                            if state == lca:
+                                break
+                            last_before_lca = state
+                        # Target must be a descendant (or self) of this state
+                        if (transition.target and
+                                (transition.target not in
+                                 [last_before_lca] + self._statechart.descendants_for(last_before_lca))):
+                            raise ConflictingTransitionsError(
+                                'Conflicting transitions: {t1} and {t2}'
+                                '\nConfiguration is {c}\nEvent is {e}\nTransitions are:{t}\n'
+                                .format(c=self.configuration, e=t1.event, t=transitions, t1=t1, t2=t2)
+                            )
+
             # Define an arbitrary order based on the depth and the name of source states.
             transitions = sorted(transitions, key=lambda t: (-self._statechart.depth_for(t.source), t.source))
 
@@ -702,6 +759,7 @@ class Interpreter:
         for event in cast(Union[InternalEvent, MetaEvent], sent_events):
             self._raise_event(event)
             self._sent_events.append(event)
+            self._sent_event_names[event.name] += 1
 
         return MicroStep(event=step.event, transition=step.transition,
                          entered_states=step.entered_states, exited_states=step.exited_states,
@@ -735,6 +793,39 @@ class Interpreter:
         if self._ignore_contract:
             return
 
+        policy = self._contract_policy
+        if policy is not None:
+            if not policy.should_check():
+                policy.record_skipped(cond_type, len(getattr(obj, cond_type, [])))
+                if cond_type == 'preconditions':
+                    # The evaluator is still notified, e.g. to take a snapshot for __old__, but
+                    # the returned conditions are not consumed and thus not evaluated.
+                    self._evaluator.evaluate_preconditions(obj, getattr(step, 'event', None))
+                return
+
+            start = policy.timer()
+            try:
+                self._check_contract_conditions(obj, cond_type, step)
+            finally:
+                policy.record_checked(cond_type, len(getattr(obj, cond_type, [])), policy.timer() - start)
+        else:
+            self._check_contract_conditions(obj, cond_type, step)
+
+    def _check_contract_conditions(self, obj: Union[Transition, StateMixin],
+                                   cond_type: str,
+                                   step: Optional[Union[MacroStep, MicroStep]]=None) -> None:
+        """
+        Check the conditions for given object.
+
+        :param obj: object with preconditions, postconditions or invariants
+        :param cond_type: either "preconditions", "postconditions" or "invariants"
+        :param step: step in which the check occurs.
+        :raises ContractError: if a condition fails, unless contracts are checked asynchronously.
+        """
+        if self._contract_checker is not None:
+            self._contract_checker.submit(self, obj, cond_type, step)
+            return
+
         exception_klass = cast(Callable[..., Exception], {'preconditions': PreconditionError,
                                                           'postconditions': PostconditionError,
                                                           'invariants': InvariantError}[cond_type])
@@ -0,0 +1,286 @@
+import os
+import pickle
+import struct
+import zlib
+
+from typing import Any, Callable, List, Optional, Tuple
+
+from .default import Interpreter
+from .hibernation import hibernate, revive, statechart_fingerprint
+from .recording import _replay_event, _replay_step, _wrap_recorded_methods
+from ..clock import SimulatedClock
+from ..model import Event, MacroStep, Statechart
+from ..utilities import fsync_directory, unwrap_methods
+
+__all__ = ['WriteAheadLog']
+
+
+# Kinds of records
+QUEUE, STEP = 0, 1
+
+# A record is prefixed by the length and the CRC-32 of its payload
+_HEADER = struct.Struct('<II')
+# A checkpoint is prefixed by the number of the first record that is not part of it
+_CHECKPOINT = struct.Struct('<Q')
+
+
+class WriteAheadLog:
+    """
+    A write-ahead log that makes the state of an interpreter durable, so that it can be recovered
+    after a crash without replaying its whole history.
+
+    The events that are queued in the interpreter (except the internal events sent by its statechart)
+    are appended to an append-only log in given directory, with the time of the interpreter at which they
+    are queued, before they are queued. The time of the clock is appended as well each time a macro step
+    is executed. Every *checkpoint_every* records, a checkpoint (see *hibernate*) is written after a macro
+    step, a new log segment is started, and the segments covered by the checkpoint are removed.
+
+    The interpreter is obtained (and recovered if needed) with *recover*: the latest checkpoint is revived,
+    and the records of the log that follow it are replayed on a *SimulatedClock*. The log is then attached to
+    the interpreter, by wrapping its *execute_once* and *_queue_event* methods. The execution of the statechart
+    must be deterministic for given events and clock times.
+
+    Records are written to the operating system every *sync_every* records, and are then fsynced unless
+    *fsync* is False. A larger value of *sync_every* increases the throughput, at the cost of losing the
+    last records in case of a crash. A truncated or corrupted record at the end of the log (e.g. because
+    of a crash while it was written) is discarded during recovery.
+
+    Records and checkpoints are pickled: parameters of events and values of the context must be picklable,
+    and logs should only be recovered from trusted sources.
+
+    :param path: path to the directory of the log, that is created if needed
+    :param sync_every: number of records after which they are written and fsynced
+    :param fsync: whether records and checkpoints are fsynced, or only written to the operating system
+    :param checkpoint_every: number of records after which a checkpoint is written (never if None)
+    """
+
+    CHECKPOINT = 'checkpoint'
+    SUFFIX = '.log'
+
+    def __init__(self, path: str, *, sync_every: int=1, fsync: bool=True, checkpoint_every: Optional[int]=10000) -> None:
+        if sync_every < 1:
+            raise ValueError('sync_every must be a positive integer, not {}'.format(sync_every))
+        if checkpoint_every is not None and checkpoint_every < 1:
+            raise ValueError('checkpoint_every must be a positive integer or None, not {}'.format(checkpoint_every))
+
+        self.path = path
+        self.sync_every = sync_every
+        self.fsync = fsync
+        self.checkpoint_every = checkpoint_every
+        os.makedirs(path, exist_ok=True)
+
+        self._interpreter = None  # type: Optional[Interpreter]
+        self._handles = []  # type: List[Any]
+        self._fingerprint = None  # type: Optional[str]
+        self._file = None  # type: Any
+        self._sequence = 0  # Number of the next record
+        self._checkpointed = 0  # Number of the first record that is not part of the latest checkpoint
+        self._unsynced = 0
+
+        self.records = 0
+        self.syncs = 0
+        self.checkpoints = 0
+        self.replayed = 0
+
+    @property
+    def interpreter(self) -> Optional[Interpreter]:
+        """
+        The interpreter this log is attached to, if any.
+        """
+        return self._interpreter
+
+    def _segment(self, start: int) -> str:
+        return os.path.join(self.path, '{:020d}{}'.format(start, self.SUFFIX))
+
+    def _segments(self) -> List[int]:
+        """
+        Return the number of the first record of each segment, in increasing order.
+        """
+        return sorted(int(name[:-len(self.SUFFIX)]) for name in os.listdir(self.path) if name.endswith(self.SUFFIX))
+
+    def _read_checkpoint(self) -> Tuple[int, Optional[bytes]]:
+        try:
+            with open(os.path.join(self.path, self.CHECKPOINT), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0, None
+        return _CHECKPOINT.unpack_from(data)[0], data[_CHECKPOINT.size:]
+
+    @staticmethod
+    def _read_records(data: bytes) -> Tuple[List[Tuple], int]:
+        """
+        Decode the records in given content of a segment.
+
+        :return: the records, and the length of the content that contains valid records
+        """
+        records = []
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            length, crc = _HEADER.unpack_from(data, offset)
+            start, end = offset + _HEADER.size, offset + _HEADER.size + length
+            payload = data[start:end]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            records.append(pickle.loads(payload))
+            offset = end
+        return records, offset
+
+    def recover(self, statechart: Statechart, *, interpreter_klass: Callable[..., Interpreter]=Interpreter,
+                **kwargs) -> Interpreter:
+        """
+        Return an interpreter for given statechart, in the state that is recorded in this log, and attach
+        this log to it. If the log is empty, a new interpreter is created.
+
+        The interpreter is revived from the latest checkpoint (see *revive*), and the records that follow it
+        are replayed: events are queued at the time they were queued, and macro steps are executed at the time
+        they were executed, using a *SimulatedClock*. The clock that is provided (if any) is then set as the
+        clock of the interpreter.
+
+        :param statechart: statechart of the interpreter
+        :param interpreter_klass: a callable (e.g. *Interpreter*) that returns an interpreter
+        :param kwargs: additional named parameters for *interpreter_klass*
+        :return: an interpreter
+        :raise ValueError: if this log is already attached to an interpreter, if its statechart does not
+            match given one, or if a segment that is not the last one is corrupted.
+        """
+        if self._interpreter is not None:
+            raise ValueError('Log is already attached to {!r}'.format(self._interpreter))
+
+        clock = kwargs.pop('clock', None)
+        fingerprint = statechart_fingerprint(statechart)
+        self._checkpointed, blob = self._read_checkpoint()
+        if blob is None:
+            interpreter = interpreter_klass(statechart, clock=SimulatedClock(), **kwargs)
+        else:
+            interpreter = revive(blob, statechart, fingerprint=fingerprint, interpreter_klass=interpreter_klass,
+                                 **kwargs)
+
+        # Replay the records that follow the checkpoint
+        sequence = self._checkpointed
+        segments = self._segments()
+        end = None  # Number of the record that follows the last segment
+        for i, start in enumerate(segments):
+            with open(self._segment(start), 'rb') as f:
+                data = f.read()
+            records, length = self._read_records(data)
+            end = start + len(records)
+
+            if length < len(data):
+                if i < len(segments) - 1:
+                    raise ValueError('Segment {} of log {} is corrupted'.format(start, self.path))
+                # Discard the truncated or corrupted record
+                with open(self._segment(start), 'r+b') as f:
+                    f.truncate(length)
+
+            for number, record in enumerate(records, start):
+                if number < sequence:
+                    continue
+                if record[0] == QUEUE:
+                    _replay_event(interpreter, record[2], record[1])
+                else:
+                    _replay_step(interpreter, record[1])
+                sequence += 1
+                self.replayed += 1
+
+        if clock is not None:
+            interpreter.clock = clock
+
+        self._interpreter = interpreter
+        self._fingerprint = fingerprint
+        self._sequence = sequence
+        # Append to the last segment, unless it does not end where the checkpoint ends
+        self._file = open(self._segment(segments[-1] if end == sequence else sequence), 'ab')
+
+        self._handles = _wrap_recorded_methods(interpreter, self._record_event, self._record_step)
+
+        # A first checkpoint records the fingerprint of the statechart
+        if blob is None or (self.checkpoint_every is not None and sequence - self._checkpointed >= self.checkpoint_every):
+            self.checkpoint()
+        return interpreter
+
+    def _record_event(self, event: Event, queued_at: float) -> None:
+        self._append((QUEUE, queued_at, event))
+
+    def _record_step(self, step: MacroStep) -> None:
+        self._append((STEP, step.time))
+        if self.checkpoint_every is not None and self._sequence - self._checkpointed >= self.checkpoint_every:
+            self.checkpoint()
+
+    def _append(self, record: Tuple) -> None:
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(_HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._file.write(payload)
+        self._sequence += 1
+        self.records += 1
+
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        """
+        Write the pending records to the operating system, and fsync them unless *fsync* is False.
+        """
+        if self._file is None or self._unsynced == 0:
+            return
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self.syncs += 1
+
+    def checkpoint(self) -> None:
+        """
+        Write a checkpoint of the interpreter, start a new log segment, and remove the segments that
+        are covered by the checkpoint. This should be called between two macro steps.
+        """
+        if self._interpreter is None:
+            raise ValueError('Log is not attached to an interpreter')
+
+        # Start a new segment, so that older ones can be removed once the checkpoint is written
+        self.sync()
+        self._file.close()
+        self._file = open(self._segment(self._sequence), 'ab')
+
+        filepath = os.path.join(self.path, self.CHECKPOINT)
+        with open(filepath + '.tmp', 'wb') as f:
+            f.write(_CHECKPOINT.pack(self._sequence))
+            f.write(hibernate(self._interpreter, fingerprint=self._fingerprint))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(filepath + '.tmp', filepath)
+        if self.fsync:
+            fsync_directory(self.path)
+        self._checkpointed = self._sequence
+        self.checkpoints += 1
+
+        for start in self._segments():
+            if start < self._sequence:
+                os.remove(self._segment(start))
+
+    def close(self) -> None:
+        """
+        Write and fsync the pending records, and detach this log from its interpreter.
+        The interpreter can still be used, but its execution is no longer logged.
+
+        :raise ValueError: if a method of the interpreter was wrapped again after this log was attached
+        """
+        if self._interpreter is None:
+            return
+        unwrap_methods(*self._handles)
+        self.sync()
+        self._file.close()
+        self._file = None
+        self._handles = []
+        self._interpreter = None
+
+    def __enter__(self) -> 'WriteAheadLog':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __repr__(self):
+        return '{}({!r}, sync_every={!r}, fsync={!r}, checkpoint_every={!r})'.format(
+            self.__class__.__name__, self.path, self.sync_every, self.fsync, self.checkpoint_every)
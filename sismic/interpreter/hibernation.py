@@ -0,0 +1,376 @@
+import hashlib
+import json
+import pickle
+import types
+import zlib
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional, Tuple, Union
+
+from .default import Interpreter
+from ..clock import SimulatedClock
+from ..code.python import FrozenContext
+from ..io.datadict import export_to_dict
+from ..model import Event, Statechart
+
+__all__ = ['statechart_fingerprint', 'hibernate', 'revive', 'InterpreterRegistry']
+
+
+#: Version of the format of hibernated interpreters, stored in their first byte
+FORMAT_VERSION = 2
+
+# Values of the context that are not stored, as they are usually defined by the preamble and not picklable
+_CODE_TYPES = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, type)
+
+
+def _canonical(data: Any) -> Any:
+    """
+    Return a canonical version of given dict representation, in which lists of mappings (e.g. states,
+    transitions and contracts, whose order does not matter) are sorted.
+    """
+    if isinstance(data, dict):
+        return {key: _canonical(value) for key, value in data.items()}
+    elif isinstance(data, list):
+        items = [_canonical(item) for item in data]
+        if all(isinstance(item, dict) for item in items):
+            items.sort(key=lambda item: json.dumps(item, sort_keys=True))
+        return items
+    return data
+
+
+def statechart_fingerprint(statechart: Statechart) -> str:
+    """
+    Return a fingerprint of given statechart, ie. a SHA-256 digest of its canonical dict representation.
+    Two statecharts have the same fingerprint if they have the same states, transitions and code,
+    regardless of the order in which they were defined.
+
+    :param statechart: a *Statechart* instance
+    :return: an hexadecimal string
+    """
+    data = json.dumps(_canonical(export_to_dict(statechart, ordered=False)), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _split_context(context: Mapping[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Split given context into the variables to store, and the names of the variables that are bound to a
+    module, a function or a class, and that are not stored.
+    """
+    variables = {}  # type: Dict[str, Any]
+    omitted = []  # type: List[str]
+    for name, value in context.items():
+        if isinstance(value, _CODE_TYPES):
+            omitted.append(name)
+        else:
+            variables[name] = value
+    return variables, omitted
+
+
+def hibernate(interpreter: Interpreter, *, fingerprint: str=None) -> bytes:
+    """
+    Return a compact representation of the state of given interpreter, from which it can be revived
+    with *revive*. This representation contains its active configuration, the memory of its history
+    states, the entry and idle times of its active states, its internal time and the time of its clock,
+    its queued (and delayed) events, and the context of its evaluator. The statechart is not included,
+    but referenced by its fingerprint.
+
+    Listeners (including bound interpreters and property statecharts), the clock, and the parameters
+    of the interpreter (e.g. *metrics*) are not part of this representation, and must be provided
+    again when the interpreter is revived. Hibernation is meant to happen between two macro steps.
+
+    The representation is a compressed pickle: values of the context and parameters of events must
+    be picklable, and representations should only be revived from trusted sources. Variables bound
+    to a module, a function or a class (e.g. defined by an *import* or a *def* in the preamble) are not
+    stored, as *revive* executes the preamble again: they must be defined by the preamble, or by the
+    *initial_context* provided to *revive*.
+
+    :param interpreter: an *Interpreter* instance
+    :param fingerprint: fingerprint of its statechart (computed if not provided)
+    :return: a bytes object
+    """
+    statechart = interpreter.statechart
+    configuration = interpreter._configuration
+    variables, omitted = _split_context(interpreter.context)
+
+    # Frozen contexts of active states, for __old__ in their invariants
+    frozen = {}  # type: Dict[str, Dict[str, Any]]
+    memory = getattr(interpreter._evaluator, '_memory', {})
+    for name in configuration:
+        old = memory.get(id(statechart.state_for(name)), None)
+        if old is not None:
+            frozen[name] = _split_context(old)[0]
+
+    state = (
+        statechart_fingerprint(statechart) if fingerprint is None else fingerprint,
+        interpreter._initialized,
+        interpreter._time,
+        interpreter.clock.time,
+        sorted(configuration),
+        dict(interpreter._memory),
+        {name: interpreter._entry_time[name] for name in configuration},
+        {name: interpreter._idle_time[name] for name in configuration},
+        list(interpreter._internal_queue),
+        list(interpreter._external_queue),
+        variables,
+        omitted,
+        frozen,
+    )
+    return bytes([FORMAT_VERSION]) + zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def revive(blob: bytes, statechart: Statechart, *, fingerprint: str=None,
+           interpreter_klass: Callable[..., Interpreter]=Interpreter, **kwargs) -> Interpreter:
+    """
+    Revive an interpreter from its representation (see *hibernate*).
+
+    The interpreter is created using *interpreter_klass*, given statechart and the additional named
+    parameters. The preamble of the statechart is executed, as for any new interpreter, before the
+    context of the evaluator is restored (this requires an evaluator whose context is mutable, as
+    *PythonEvaluator*): the variables defined by the preamble that were not stored (modules, functions
+    and classes) are kept, and the other ones are replaced by the stored ones. If no clock is provided,
+    a *SimulatedClock* is created and set to the time of the clock of the hibernated interpreter.
+
+    :param blob: representation of a hibernated interpreter
+    :param statechart: its statechart
+    :param fingerprint: fingerprint of the statechart (computed if not provided)
+    :param interpreter_klass: a callable (e.g. *Interpreter* or *CompactInterpreter*) that returns an interpreter
+    :param kwargs: additional named parameters for *interpreter_klass*
+    :return: an interpreter
+    :raise ValueError: if the format of the representation is not supported, or if the statechart
+        does not have the fingerprint of the hibernated one.
+    """
+    if len(blob) == 0 or blob[0] != FORMAT_VERSION:
+        raise ValueError('Unsupported format of hibernated interpreter')
+
+    (
+        expected_fingerprint, initialized, time, clock_time, configuration, memory, entry_time, idle_time,
+        internal_queue, external_queue, context, omitted, frozen,
+    ) = pickle.loads(zlib.decompress(blob[1:]))
+
+    fingerprint = statechart_fingerprint(statechart) if fingerprint is None else fingerprint
+    if fingerprint != expected_fingerprint:
+        raise ValueError('Statechart {} does not match the statechart of the hibernated interpreter'.format(statechart))
+
+    if kwargs.get('clock', None) is None:
+        clock = SimulatedClock()
+        clock.time = clock_time
+        kwargs['clock'] = clock
+
+    interpreter = interpreter_klass(statechart, **kwargs)
+    interpreter._initialized = initialized
+    interpreter._time = time
+    interpreter._configuration = set(configuration)
+    interpreter._memory = memory
+    interpreter._entry_time = entry_time
+    interpreter._idle_time = idle_time
+    interpreter._internal_queue = internal_queue
+    interpreter._external_queue = external_queue
+
+    evaluator = interpreter._evaluator
+    omitted = set(omitted)
+    for name in list(evaluator.context):
+        if name not in context and name not in omitted:
+            del evaluator.context[name]
+    evaluator.context.update(context)
+    for name, variables in frozen.items():
+        evaluator._memory[id(statechart.state_for(name))] = FrozenContext(variables)
+
+    return interpreter
+
+
+class InterpreterRegistry:
+    """
+    A registry of interpreters for a same statechart, identified by keys.
+
+    The interpreters that were not accessed for more than *idle_timeout* seconds are hibernated
+    (see *hibernate*), and transparently revived when they are accessed again, with *get* or
+    *queue*. If *capacity* is set, the least recently accessed interpreters are hibernated as well
+    as soon as more than *capacity* interpreters are resident. Idle interpreters are hibernated each
+    time an interpreter is created or accessed, or explicitly with *hibernate_idle*.
+
+    As the interpreters can be revived at any time, references to them should not be kept:
+    use *get* or *queue* each time an interpreter is needed.
+
+    :param statechart: statechart of the interpreters
+    :param idle_timeout: number of seconds after which an interpreter that was not accessed is hibernated
+        (never if None)
+    :param capacity: maximal number of resident interpreters (unbounded if None)
+    :param timer: a callable that returns the current time in seconds (default to *time.monotonic*)
+    :param interpreter_klass: a callable (e.g. *Interpreter* or *CompactInterpreter*) that returns an interpreter
+    :param kwargs: additional named parameters for *interpreter_klass*
+    """
+
+    def __init__(self, statechart: Statechart, *, idle_timeout: Optional[float]=None, capacity: Optional[int]=None,
+                 timer: Callable[[], float]=monotonic, interpreter_klass: Callable[..., Interpreter]=Interpreter,
+                 **kwargs) -> None:
+        if capacity is not None and capacity < 1:
+            raise ValueError('capacity must be a positive integer or None, not {}'.format(capacity))
+
+        self.statechart = statechart
+        self.idle_timeout = idle_timeout
+        self.capacity = capacity
+        self.timer = timer
+        self.fingerprint = statechart_fingerprint(statechart)
+
+        self._interpreter_klass = interpreter_klass
+        self._kwargs = kwargs
+
+        # Resident interpreters with the time they were last accessed, least recently accessed first
+        self._resident = OrderedDict()  # type: OrderedDict
+        self._hibernated = {}  # type: Dict[Hashable, bytes]
+
+        self.hibernations = 0
+        self.revivals = 0
+
+    def _revive(self, key: Hashable) -> Interpreter:
+        """
+        Revive the hibernated interpreter for given key.
+
+        :param key: key of the interpreter
+        :return: the revived interpreter
+        :raise KeyError: if there is no hibernated interpreter for given key
+        """
+        blob = self._hibernated.pop(key)
+        interpreter = revive(blob, self.statechart, fingerprint=self.fingerprint,
+                             interpreter_klass=self._interpreter_klass, **self._kwargs)
+        self.revivals += 1
+        return interpreter
+
+    def _save(self, key: Hashable, blob: bytes) -> None:
+        """
+        Keep given hibernated interpreter for given key.
+
+        :param key: key of the interpreter
+        :param blob: a hibernated interpreter
+        """
+        self._hibernated[key] = blob
+
+    def _access(self, key: Hashable, interpreter: Interpreter) -> None:
+        """
+        Mark given interpreter as the most recently accessed one, and hibernate the interpreters that
+        are idle or that exceed the capacity.
+        """
+        self._resident[key] = (interpreter, self.timer())
+        self.hibernate_idle()
+        if self.capacity is not None:
+            while len(self._resident) > self.capacity:
+                self.hibernate(next(iter(self._resident)))
+
+    def create(self, key: Hashable) -> Interpreter:
+        """
+        Create an interpreter for given key.
+
+        :param key: key of the interpreter
+        :return: the new interpreter
+        :raise KeyError: if there is already an interpreter for given key
+        """
+        if key in self:
+            raise KeyError('There is already an interpreter for {!r}'.format(key))
+
+        interpreter = self._interpreter_klass(self.statechart, **self._kwargs)
+        self._access(key, interpreter)
+        return interpreter
+
+    def get(self, key: Hashable) -> Interpreter:
+        """
+        Return the interpreter for given key, reviving it if needed.
+
+        :param key: key of the interpreter
+        :return: the interpreter
+        :raise KeyError: if there is no interpreter for given key
+        """
+        entry = self._resident.pop(key, None)
+        interpreter = self._revive(key) if entry is None else entry[0]
+        self._access(key, interpreter)
+        return interpreter
+
+    def queue(self, key: Hashable, event_or_name: Union[str, Event], *event_or_names: Union[str, Event],
+              **parameters) -> Interpreter:
+        """
+        Queue given events to the interpreter for given key, reviving it if needed.
+        See *Interpreter.queue*.
+
+        :param key: key of the interpreter
+        :param event_or_name: name of the event or Event instance
+        :param event_or_names: additional events
+        :param parameters: event parameters.
+        :return: the interpreter, so that it can be executed
+        :raise KeyError: if there is no interpreter for given key
+        """
+        return self.get(key).queue(event_or_name, *event_or_names, **parameters)
+
+    def remove(self, key: Hashable) -> None:
+        """
+        Remove the interpreter for given key.
+
+        :param key: key of the interpreter
+        :raise KeyError: if there is no interpreter for given key
+        """
+        if self._resident.pop(key, None) is None:
+            del self._hibernated[key]
+
+    def hibernate(self, key: Hashable) -> None:
+        """
+        Hibernate the interpreter for given key, if it is not yet hibernated.
+
+        :param key: key of the interpreter
+        :raise KeyError: if there is no interpreter for given key
+        """
+        entry = self._resident.pop(key, None)
+        if entry is None:
+            if key not in self:
+                raise KeyError(key)
+        else:
+            self._save(key, hibernate(entry[0], fingerprint=self.fingerprint))
+            self.hibernations += 1
+
+    def hibernate_idle(self) -> List[Hashable]:
+        """
+        Hibernate the interpreters that were not accessed for more than *idle_timeout* seconds.
+
+        :return: the keys of the hibernated interpreters
+        """
+        if self.idle_timeout is None:
+            return []
+
+        deadline = self.timer() - self.idle_timeout
+        keys = []
+        for key, (_, accessed) in self._resident.items():
+            if accessed >= deadline:
+                break
+            keys.append(key)
+
+        for key in keys:
+            self.hibernate(key)
+        return keys
+
+    def is_hibernated(self, key: Hashable) -> bool:
+        """
+        Return True if the interpreter for given key is hibernated.
+
+        :param key: key of the interpreter
+        :return: True if hibernated, False if resident
+        :raise KeyError: if there is no interpreter for given key
+        """
+        if key in self._resident:
+            return False
+        elif key in self:
+            return True
+        raise KeyError(key)
+
+    def keys(self) -> List[Hashable]:
+        """
+        Return the keys of the interpreters, resident and hibernated.
+        """
+        return list(self._resident.keys()) + list(self._hibernated.keys())
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._resident or key in self._hibernated
+
+    def __len__(self) -> int:
+        return len(self._resident) + len(self._hibernated)
+
+    def __repr__(self):
+        return '{}({!r}, {} resident, {} hibernated)'.format(
+            self.__class__.__name__, self.statechart, len(self._resident), len(self._hibernated))
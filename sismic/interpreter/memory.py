@@ -0,0 +1,157 @@
+import gc
+import sys
+
+from types import FunctionType, ModuleType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from .checker import AsyncContractChecker
+from .default import Interpreter
+from .metrics import InterpreterMetrics
+from .policy import ContractPolicy
+from ..clock import Clock
+from ..code import CompactPythonEvaluator, Evaluator
+from ..model import Statechart
+from ..utilities import LazyContainer
+
+__all__ = ['memory_footprint', 'CompactInterpreter']
+
+
+def _referents(obj: Any) -> List[Any]:
+    """
+    Return the objects directly referred to by given object. The code and the globals of functions,
+    that are shared by their instances, are not returned.
+    """
+    if isinstance(obj, FunctionType):
+        return [obj.__closure__, obj.__defaults__, obj.__kwdefaults__, obj.__dict__]
+    return gc.get_referents(obj)
+
+
+def _slots(obj: Any) -> List[Tuple[str, Any]]:
+    """
+    Return the name and the value of the attributes of given object that are stored in slots.
+    The slots of lazy containers are named after their attribute, and are not allocated.
+    """
+    lazy = {
+        value.slot: name for klass in type(obj).__mro__ for name, value in vars(klass).items()
+        if isinstance(value, LazyContainer)
+    }
+    attributes = []
+    for klass in type(obj).__mro__:
+        for name in getattr(klass, '__slots__', ()):
+            if name not in ('__dict__', '__weakref__') and hasattr(obj, name):
+                attributes.append((lazy.get(name, name), getattr(obj, name)))
+    return attributes
+
+
+def _instance_dict(obj: Any) -> Optional[Dict[str, Any]]:
+    """
+    Return the *__dict__* of given object, or None if it has none (i.e. its attributes are only stored in
+    slots) or if it is empty (e.g. a subclass with slots of a class without slots, whose *__dict__* is only
+    created when it is accessed).
+    """
+    if '__dict__' not in dir(type(obj)):
+        return None
+    instance_dict = obj.__dict__
+    return instance_dict if len(instance_dict) > 0 else None
+
+
+def _sizeof(roots: Iterable[Any], visited: Set[int]) -> int:
+    """
+    Return the cumulated size of given objects and of the objects that are reachable from them,
+    except the ones in *visited*. The identity of the objects that are considered are added to *visited*.
+    Classes and modules are not considered, nor the objects reachable from them.
+    """
+    size = 0
+    stack = list(roots)
+    while len(stack) > 0:
+        obj = stack.pop()
+        if id(obj) in visited or isinstance(obj, (type, ModuleType)):
+            continue
+        visited.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(_referents(obj))
+    return size
+
+
+def memory_footprint(interpreter: Interpreter, *, exclude: Iterable[Any]=()) -> Dict[str, int]:
+    """
+    Return the number of bytes that are attributable to given interpreter, ie. the size of the objects
+    that are reachable from it, and that are not shared with other interpreters.
+
+    The following objects are considered as being shared: the statechart, the objects referred to by
+    the class attributes of the interpreter and of its evaluator (e.g. shared caches), the objects in
+    *exclude* (e.g. an interpreter whose clock is used through a *SynchronizedClock*), and the objects
+    that are reachable from them. Classes, modules, and the code and globals of functions are not
+    considered either.
+
+    Sizes are computed using *sys.getsizeof*. Objects that are reachable from several attributes
+    are only accounted for once.
+
+    :param interpreter: an *Interpreter* instance
+    :param exclude: objects that are shared
+    :return: a dict that maps "interpreter" and "evaluator" to the size of these objects, each
+        attribute of the interpreter and of its evaluator (the latter being prefixed with "evaluator.")
+        to the size of the objects that are reachable from it, and "total" to the sum of these values.
+    """
+    evaluator = interpreter._evaluator
+    shared = [interpreter._statechart] + list(exclude)
+    for obj in (interpreter, evaluator):
+        for klass in type(obj).__mro__:
+            shared.extend(vars(klass).values())
+
+    visited = set()  # type: Set[int]
+    _sizeof(shared, visited)
+
+    footprint = {}  # type: Dict[str, int]
+    attributes = []  # type: List[Tuple[str, Any]]
+    for prefix, obj in (('interpreter', interpreter), ('evaluator', evaluator)):
+        instance_dict = _instance_dict(obj)
+        objects = [obj] if instance_dict is None else [obj, instance_dict]
+        footprint[prefix] = sum(sys.getsizeof(o) for o in objects)
+        visited.update(id(o) for o in objects)
+
+        for name, value in list((instance_dict or {}).items()) + _slots(obj):
+            attributes.append((name if obj is interpreter else 'evaluator.' + name, value))
+
+    for name, value in attributes:
+        footprint[name] = _sizeof([value], visited)
+
+    footprint['total'] = sum(footprint.values())
+    return footprint
+
+
+class CompactInterpreter(Interpreter):
+    """
+    An *Interpreter* with a smaller memory footprint, for applications that keep many interpreters
+    in memory (e.g. one per session, most of them being idle).
+
+    Its attributes are stored in slots, the memory of history states is only allocated when it is first
+    accessed, and it uses a *CompactPythonEvaluator* by default. The execution is otherwise the same than
+    the one of *Interpreter*, at the cost of a slightly slower access to lazily allocated containers.
+    Use *memory_footprint* to compare the footprint of interpreters.
+
+    It accepts the same parameters as *Interpreter*.
+    """
+
+    __slots__ = (
+        '_ignore_contract', '_contract_policy', '_contract_checker', '_trusted', '_metrics', '_statechart',
+        '_initialized', 'clock', '_time', '_lazy_memory', '_configuration', '_entry_time', '_idle_time',
+        '_sent_events', '_sent_event_names', '_internal_queue', '_external_queue', '_listeners', '_evaluator',
+    )
+
+    _memory = LazyContainer('_lazy_memory', dict)
+
+    def __init__(self, statechart: Statechart, *,
+                 evaluator_klass: Callable[..., Evaluator]=CompactPythonEvaluator,
+                 initial_context: Mapping[str, Any]=None,
+                 clock: Clock=None,
+                 ignore_contract: bool=False,
+                 contract_policy: ContractPolicy=None,
+                 contract_checker: AsyncContractChecker=None,
+                 trusted: bool=False,
+                 metrics: InterpreterMetrics=None) -> None:
+        super().__init__(
+            statechart, evaluator_klass=evaluator_klass, initial_context=initial_context, clock=clock,
+            ignore_contract=ignore_contract, contract_policy=contract_policy, contract_checker=contract_checker,
+            trusted=trusted, metrics=metrics,
+        )
@@ -0,0 +1,201 @@
+import bisect
+
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Sequence
+
+from ..model import Transition
+
+__all__ = ['Histogram', 'InterpreterMetrics']
+
+
+#: Default upper bounds (in seconds) of the buckets of a latency histogram.
+DEFAULT_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 1e-1)
+
+
+class Histogram:
+    """
+    A histogram of observed values, with fixed buckets.
+
+    The *i*-th value of *counts* is the number of observed values that are lower than or equal to the
+    *i*-th upper bound of *buckets* (and greater than the previous one). The last value of *counts*
+    is the number of observed values that are greater than the last upper bound.
+
+    :param buckets: increasing upper bounds of the buckets.
+    """
+
+    def __init__(self, buckets: Sequence[float]=DEFAULT_BUCKETS) -> None:
+        if list(buckets) != sorted(set(buckets)):
+            raise ValueError('Buckets must be strictly increasing: {}'.format(buckets))
+
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # type: List[int]
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Record given value.
+
+        :param value: observed value
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Return an upper bound of given quantile of the observed values, ie. the upper bound of
+        the bucket in which it falls (or the greatest observed value for the last bucket).
+
+        :param q: quantile, between 0 and 1
+        :return: an upper bound of the quantile, or 0 if no value was observed
+        """
+        if not 0 <= q <= 1:
+            raise ValueError('q must be between 0 and 1, not {}'.format(q))
+
+        rank = q * self.count
+        cumulated = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulated += count
+            if count > 0 and cumulated >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def reset(self) -> None:
+        """
+        Discard all the observed values.
+        """
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Return a dict representation of this histogram, that can be serialized (e.g. to JSON).
+
+        :return: a dict
+        """
+        return {
+            'buckets': list(self.buckets), 'counts': list(self.counts),
+            'count': self.count, 'sum': self.sum, 'max': self.max,
+        }
+
+    def __repr__(self):
+        return '{}(count={!r}, sum={!r}, max={!r})'.format(self.__class__.__name__, self.count, self.sum, self.max)
+
+
+class InterpreterMetrics:
+    """
+    Performance counters of an interpreter, provided to an *Interpreter* using its *metrics* parameter.
+    If no such instance is provided, the interpreter does not maintain any counter.
+
+    The following counters are maintained:
+
+     - *macro_steps*: number of macro steps that were executed.
+     - *micro_steps*: number of micro steps that were executed, including stabilization steps.
+     - *stabilization_steps*: number of micro steps that were executed to stabilize the statechart.
+     - *events_consumed*: number of events that were consumed.
+     - *events_discarded*: number of events that were consumed without triggering a transition.
+     - *transitions_considered*: number of transitions whose guard was considered, ie. transitions whose source
+       state is active and whose event (if any) is the current one. Transitions in a lower priority class, or
+       whose source state is an ancestor of a state that has an enabled transition, are not considered.
+     - *transitions_fired*: number of transitions that were processed.
+     - *guards_evaluated*: number of guards that were evaluated (transitions without guard are not counted).
+     - *internal_queue_depth* and *external_queue_depth*: number of events in the internal and external queues
+       (including delayed events) at the beginning of the last call to *execute_once*.
+     - *max_internal_queue_depth* and *max_external_queue_depth*: their respective maximal values.
+     - *errors*: number of calls to *execute_once* that raised an exception (e.g. a contract error).
+
+    The latency of calls to *execute_once* (in seconds, according to *timer*), including the ones that raised
+    an exception, are recorded in the *latency* histogram. Use *as_dict* to periodically export these metrics, and *reset* to reset them.
+
+    A same instance can be shared by several interpreters, in which case their counters are aggregated.
+
+    :param buckets: increasing upper bounds (in seconds) of the buckets of the latency histogram.
+    :param timer: a callable that returns the current time in seconds (default to *time.perf_counter*).
+    """
+
+    COUNTERS = (
+        'macro_steps', 'micro_steps', 'stabilization_steps', 'events_consumed', 'events_discarded',
+        'transitions_considered', 'transitions_fired', 'guards_evaluated',
+        'internal_queue_depth', 'external_queue_depth', 'max_internal_queue_depth', 'max_external_queue_depth',
+        'errors',
+    )
+
+    def __init__(self, *, buckets: Sequence[float]=DEFAULT_BUCKETS, timer: Callable[[], float]=perf_counter) -> None:
+        self.timer = timer
+        self.latency = Histogram(buckets)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Reset all the counters and the latency histogram.
+        """
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.latency.reset()
+
+    def record_queues(self, internal: int, external: int) -> None:
+        """
+        Record the depth of the event queues.
+
+        :param internal: number of events in the internal queue
+        :param external: number of events in the external queue
+        """
+        self.internal_queue_depth = internal
+        self.external_queue_depth = external
+        if internal > self.max_internal_queue_depth:
+            self.max_internal_queue_depth = internal
+        if external > self.max_external_queue_depth:
+            self.max_external_queue_depth = external
+
+    def record_guards(self, transitions: Sequence[Transition], enabled: Sequence[int], first: bool) -> None:
+        """
+        Record that the guards of given transitions were evaluated.
+
+        :param transitions: the considered transitions
+        :param enabled: the indices of the enabled transitions
+        :param first: True if the evaluation stopped at the first enabled transition
+        """
+        self.transitions_considered += len(transitions)
+        if first and len(enabled) > 0:
+            transitions = transitions[:enabled[0] + 1]
+        self.guards_evaluated += sum(1 for transition in transitions if transition.guard is not None)
+
+    def record_step(self, micro_steps: int, stabilization_steps: int, event_consumed: bool,
+                    transitions_fired: int) -> None:
+        """
+        Record that a macro step was executed.
+
+        :param micro_steps: number of executed micro steps
+        :param stabilization_steps: number of stabilization steps among them
+        :param event_consumed: True if an event was consumed
+        :param transitions_fired: number of transitions that were processed
+        """
+        self.macro_steps += 1
+        self.micro_steps += micro_steps
+        self.stabilization_steps += stabilization_steps
+        self.transitions_fired += transitions_fired
+        if event_consumed:
+            self.events_consumed += 1
+            if transitions_fired == 0:
+                self.events_discarded += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Return a dict representation of these metrics, that can be serialized (e.g. to JSON).
+
+        :return: a dict that maps the name of each counter to its value, and "latency" to
+            the dict representation of the latency histogram.
+        """
+        metrics = {name: getattr(self, name) for name in self.COUNTERS}  # type: Dict[str, Any]
+        metrics['latency'] = self.latency.as_dict()
+        return metrics
+
+    def __repr__(self):
+        return '{}(macro_steps={!r}, micro_steps={!r}, events_consumed={!r})'.format(
+            self.__class__.__name__, self.macro_steps, self.micro_steps, self.events_consumed)
@@ -0,0 +1,107 @@
+import random
+
+from collections import Counter
+from time import perf_counter
+from typing import Dict, Optional
+
+__all__ = ['ContractPolicy']
+
+
+class ContractPolicy:
+    """
+    A policy that determines whether the contracts are checked by an interpreter, to bound the cost
+    of contract checking (e.g. in production).
+
+    The decision is made for each macro step in which a contract is about to be checked: either all
+    the conditions of that step are checked, or none of them (except the ones that are not checked
+    because of *time_budget*). By default, contracts are checked on every step.
+
+    The number of conditions that were checked and skipped are available in *checked* and *skipped*,
+    two counters whose keys are "preconditions", "postconditions" and "invariants". The number of
+    macro steps in which contracts were checked and skipped are available in *checked_steps* and
+    *skipped_steps*.
+
+    :param every: check contracts on one macro step every *every* macro steps.
+    :param probability: probability to check contracts on a macro step.
+    :param time_budget: maximal time (in seconds, according to *time.perf_counter*) spent on
+        checking contracts during a macro step. Once it is exceeded, the remaining conditions
+        of the step are skipped.
+    :param rng: an optional *random.Random* instance to use with *probability*.
+    """
+
+    def __init__(self, *, every: int=1, probability: float=1.0, time_budget: Optional[float]=None,
+                 rng: random.Random=None) -> None:
+        if every < 1:
+            raise ValueError('every must be a positive integer, not {}'.format(every))
+        if not 0 <= probability <= 1:
+            raise ValueError('probability must be between 0 and 1, not {}'.format(probability))
+
+        self.every = every
+        self.probability = probability
+        self.time_budget = time_budget
+        self._random = random.Random() if rng is None else rng
+
+        self.checked = Counter()  # type: Dict[str, int]
+        self.skipped = Counter()  # type: Dict[str, int]
+        self.checked_steps = 0
+        self.skipped_steps = 0
+
+        self._steps = 0
+        self._decision = None  # type: Optional[bool]
+        self._elapsed = 0.0
+
+    def start_step(self) -> None:
+        """
+        Notify the policy that a new macro step starts.
+        """
+        self._decision = None
+        self._elapsed = 0.0
+
+    def should_check(self) -> bool:
+        """
+        Return True if the next conditions of the current macro step should be checked.
+
+        :return: True if they should be checked.
+        """
+        if self._decision is None:
+            self._steps += 1
+            self._decision = (
+                (self._steps - 1) % self.every == 0
+                and (self.probability >= 1 or self._random.random() < self.probability)
+            )
+            if self._decision:
+                self.checked_steps += 1
+            else:
+                self.skipped_steps += 1
+
+        return self._decision and (self.time_budget is None or self._elapsed < self.time_budget)
+
+    def timer(self) -> float:
+        """
+        Return the current time to measure the duration of contract checking.
+        """
+        return perf_counter()
+
+    def record_checked(self, kind: str, count: int, duration: float) -> None:
+        """
+        Record that conditions were checked.
+
+        :param kind: either "preconditions", "postconditions" or "invariants"
+        :param count: number of conditions
+        :param duration: time spent to check them
+        """
+        self.checked[kind] += count
+        self._elapsed += duration
+
+    def record_skipped(self, kind: str, count: int) -> None:
+        """
+        Record that conditions were skipped.
+
+        :param kind: either "preconditions", "postconditions" or "invariants"
+        :param count: number of conditions
+        """
+        self.skipped[kind] += count
+
+    def __repr__(self):
+        return '{}(every={!r}, probability={!r}, time_budget={!r})'.format(
+            self.__class__.__name__, self.every, self.probability, self.time_budget)
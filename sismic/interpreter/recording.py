@@ -0,0 +1,335 @@
+import argparse
+import base64
+import json
+import sys
+import time
+import zlib
+
+from functools import wraps
+from typing import Any, Callable, Iterable, List, Optional, TextIO, Union
+
+from .default import Interpreter
+from .hibernation import hibernate, revive, statechart_fingerprint
+from ..model import Event, InternalEvent, MacroStep, Statechart
+from ..utilities import unwrap_methods, wrap_method
+
+__all__ = ['EventRecorder', 'ReplayReport', 'replay']
+
+
+#: Version of the format of recordings, stored in their first line
+FORMAT_VERSION = 1
+
+
+def _digest(step: MacroStep) -> int:
+    return zlib.crc32(str(step).encode('utf-8'))
+
+
+def _wrap_recorded_methods(interpreter: Interpreter, on_event: Callable[[Event, float], None],
+                           on_step: Callable[[MacroStep], None]) -> List[Any]:
+    """
+    Wrap the methods of given interpreter that change its state, so that its execution can be recorded
+    and replayed with *_replay_event* and *_replay_step*: *on_event* is called with each event that is
+    queued (except the internal events sent by the statechart) and the time of the interpreter, before
+    it is queued, and *on_step* is called with each macro step that is executed.
+
+    :param interpreter: an *Interpreter* instance
+    :param on_event: a callable that accepts an event and a time
+    :param on_step: a callable that accepts a macro step
+    :return: handles on the wrapped methods (see *unwrap_methods*)
+    """
+    queue_event = interpreter._queue_event
+    execute_once = interpreter.execute_once
+
+    @wraps(queue_event)
+    def queue_event_wrapper(event: Event) -> None:
+        if not isinstance(event, InternalEvent):
+            on_event(event, interpreter.time)
+        queue_event(event)
+
+    @wraps(execute_once)
+    def execute_once_wrapper() -> Optional[MacroStep]:
+        step = execute_once()
+        if step is not None:
+            on_step(step)
+        return step
+
+    return [
+        wrap_method(interpreter, '_queue_event', queue_event_wrapper),
+        wrap_method(interpreter, 'execute_once', execute_once_wrapper),
+    ]
+
+
+def _replay_event(interpreter: Interpreter, event: Event, queued_at: float) -> None:
+    """
+    Queue given recorded event, at the time of the interpreter at which it was queued.
+    """
+    interpreter._time = queued_at
+    interpreter._queue_event(event)
+
+
+def _replay_step(interpreter: Interpreter, executed_at: float) -> Optional[MacroStep]:
+    """
+    Execute a recorded macro step, after setting the (simulated) clock of the interpreter to the
+    time at which it was executed, unless the clock is already ahead.
+    """
+    clock = interpreter.clock
+    if clock.time < executed_at:
+        clock.time = executed_at
+    return interpreter.execute_once()
+
+
+class EventRecorder:
+    """
+    A recorder of the events queued in an interpreter and of the clock readings of its macro steps,
+    so that its execution can be replayed offline with *replay*.
+
+    The recording is streamed to a text file, one JSON object per line. The first line contains the
+    fingerprint of the statechart and the state of the interpreter when the recorder is attached to it
+    (see *hibernate*), so that an interpreter can be recorded at any time. Each following line is either
+    an event that is queued (except the internal events sent by the statechart), with the time of the
+    interpreter at which it is queued, or a macro step, with the time of the clock at which it is
+    executed and a digest of the step (a CRC-32 of its string representation) that *replay* uses to check
+    that it reproduces the same trace. Calls to *execute_once* that do not execute a macro step are
+    not recorded, as they do not change the state of the interpreter.
+
+    The recorder is attached to an interpreter by wrapping its *execute_once* and *_queue_event* methods.
+    Parameters of events must be preserved by JSON (e.g. no tuple, and no key that is not a string),
+    otherwise a *ValueError* is raised when the event is queued, before it is queued.
+
+    :param file: a path or a text file opened for writing
+    :param flush: whether the file is flushed after each line
+    """
+
+    def __init__(self, file: Union[str, TextIO], *, flush: bool=False) -> None:
+        self._owned = isinstance(file, str)
+        self._file = open(file, 'w') if isinstance(file, str) else file  # type: TextIO
+        self.flush = flush
+
+        self._interpreter = None  # type: Optional[Interpreter]
+        self._handles = []  # type: List[Any]
+
+        self.events = 0
+        self.steps = 0
+
+    def _write(self, record: Any) -> None:
+        self._write_line(json.dumps(record, separators=(',', ':')))
+
+    def _write_line(self, line: str) -> None:
+        self._file.write(line)
+        self._file.write('\n')
+        if self.flush:
+            self._file.flush()
+
+    def _record_event(self, event: Event, queued_at: float) -> None:
+        try:
+            line = json.dumps({'event': event.name, 'parameters': event.data, 'time': queued_at},
+                              separators=(',', ':'))
+        except (TypeError, ValueError) as e:
+            raise ValueError('Parameters of {} cannot be recorded in JSON'.format(event)) from e
+        # JSON silently converts tuples to lists and keys to strings, which would change the replay
+        if len(event.data) > 0 and json.loads(line)['parameters'] != event.data:
+            raise ValueError('Parameters of {} are not preserved by JSON (e.g. tuples, or keys that are not '
+                             'strings)'.format(event))
+        self._write_line(line)
+        self.events += 1
+
+    def _record_step(self, step: MacroStep) -> None:
+        self._write({'step': step.time, 'digest': _digest(step)})
+        self.steps += 1
+
+    def attach(self, interpreter: Interpreter) -> None:
+        """
+        Attach this recorder to given interpreter, and record its current state.
+
+        :param interpreter: an *Interpreter* instance
+        :raise ValueError: if this recorder is already attached to an interpreter
+        """
+        if self._interpreter is not None:
+            raise ValueError('Recorder is already attached to {!r}'.format(self._interpreter))
+
+        fingerprint = statechart_fingerprint(interpreter.statechart)
+        self._write({
+            'version': FORMAT_VERSION,
+            'statechart': interpreter.statechart.name,
+            'fingerprint': fingerprint,
+            'state': base64.b64encode(hibernate(interpreter, fingerprint=fingerprint)).decode('ascii'),
+        })
+
+        self._handles = _wrap_recorded_methods(interpreter, self._record_event, self._record_step)
+        self._interpreter = interpreter
+
+    def detach(self) -> None:
+        """
+        Detach this recorder from its interpreter, if any.
+
+        :raise ValueError: if a method of the interpreter was wrapped again after this recorder was attached
+        """
+        if self._interpreter is not None:
+            unwrap_methods(*self._handles)
+            self._handles = []
+            self._interpreter = None
+        self._file.flush()
+
+    def close(self) -> None:
+        """
+        Detach this recorder, and close its file if it was opened by the recorder.
+        """
+        self.detach()
+        if self._owned:
+            self._file.close()
+
+    def __enter__(self) -> 'EventRecorder':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, getattr(self._file, 'name', self._file))
+
+
+class ReplayReport:
+    """
+    The result of *replay*.
+
+    :param interpreter: the interpreter on which the recording was replayed
+    :param events: number of replayed events
+    :param steps: number of replayed macro steps
+    :param divergences: line numbers (starting at 1) of the macro steps that were not reproduced
+    :param duration: number of seconds the replay took
+    """
+
+    def __init__(self, interpreter: Interpreter, events: int, steps: int, divergences: List[int],
+                 duration: float) -> None:
+        self.interpreter = interpreter
+        self.events = events
+        self.steps = steps
+        self.divergences = divergences
+        self.duration = duration
+
+    @property
+    def steps_per_second(self) -> float:
+        """
+        Number of macro steps replayed per second.
+        """
+        return self.steps / self.duration if self.duration > 0 else float('inf')
+
+    @property
+    def events_per_second(self) -> float:
+        """
+        Number of events replayed per second.
+        """
+        return self.events / self.duration if self.duration > 0 else float('inf')
+
+    def as_dict(self) -> dict:
+        return {
+            'events': self.events,
+            'steps': self.steps,
+            'divergences': self.divergences,
+            'duration': self.duration,
+            'steps per second': self.steps_per_second,
+            'events per second': self.events_per_second,
+        }
+
+    def __repr__(self):
+        return '{}(events={}, steps={}, divergences={}, duration={:.6f})'.format(
+            self.__class__.__name__, self.events, self.steps, len(self.divergences), self.duration)
+
+
+def replay(source: Union[str, Iterable[str]], statechart: Statechart, *,
+           interpreter_klass: Callable[..., Interpreter]=Interpreter, check: bool=True, **kwargs) -> ReplayReport:
+    """
+    Replay a recording (see *EventRecorder*) on a new interpreter for given statechart, as fast as possible.
+
+    The interpreter is revived from the state recorded in the first line of the recording, with a
+    *SimulatedClock*. Events are queued at the time they were queued, and macro steps are executed after
+    setting the clock to the time they were executed, without waiting. The recording is read line by line.
+
+    If *check* is True, each replayed macro step is compared to the recorded one (using their digest), and
+    the line numbers of the macro steps that are not reproduced (e.g. because the statechart changed, or
+    because its execution depends on something else than events and time) are reported.
+
+    :param source: a path, or an iterable of lines (e.g. a text file)
+    :param statechart: statechart of the recorded interpreter
+    :param interpreter_klass: a callable (e.g. *Interpreter*) that returns an interpreter
+    :param check: whether the replayed macro steps are compared to the recorded ones
+    :param kwargs: additional named parameters for *interpreter_klass* (except *clock*)
+    :return: a *ReplayReport* instance
+    :raise ValueError: if the recording is empty or its format is not supported, or if the statechart
+        does not match the recorded one.
+    """
+    if isinstance(source, str):
+        with open(source) as f:
+            return replay(f, statechart, interpreter_klass=interpreter_klass, check=check, **kwargs)
+
+    lines = iter(source)
+    header = json.loads(next(lines, 'null'))
+    if not isinstance(header, dict) or header.get('version', None) != FORMAT_VERSION:
+        raise ValueError('Unsupported format of recording')
+
+    fingerprint = statechart_fingerprint(statechart)
+    if header['fingerprint'] != fingerprint:
+        raise ValueError('Statechart {} does not match the recorded statechart {}'.format(
+            statechart, header['statechart']))
+
+    kwargs.pop('clock', None)
+    interpreter = revive(base64.b64decode(header['state']), statechart, fingerprint=fingerprint,
+                         interpreter_klass=interpreter_klass, **kwargs)
+    events = steps = 0
+    divergences = []  # type: List[int]
+    start = time.perf_counter()
+    for number, line in enumerate(lines, 2):
+        record = json.loads(line)
+        if 'event' in record:
+            _replay_event(interpreter, Event(record['event'], **record['parameters']), record['time'])
+            events += 1
+        else:
+            step = _replay_step(interpreter, record['step'])
+            steps += 1
+            if check and (step is None or _digest(step) != record['digest']):
+                divergences.append(number)
+    duration = time.perf_counter() - start
+
+    return ReplayReport(interpreter, events, steps, divergences, duration)
+
+
+def cli(args=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='sismic-replay',
+        description='Command-line utility to replay a recording (see EventRecorder) on a YAML statechart, '
+                    'as fast as possible, and to report the throughput of the replay and the macro steps '
+                    'that were not reproduced.'
+    )
+
+    parser.add_argument('statechart', metavar='statechart', type=str,
+                        help='A YAML file describing a statechart')
+    parser.add_argument('recording', metavar='recording', type=str,
+                        help='A file containing a recording')
+    parser.add_argument('--repeat', metavar='n', type=int, default=1,
+                        help='Number of times the recording is replayed, the best throughput being reported')
+    parser.add_argument('--no-check', action='store_true', default=False,
+                        help='Do not compare the replayed macro steps to the recorded ones')
+    parser.add_argument('--json', action='store_true', default=False,
+                        help='Report as JSON')
+
+    args = parser.parse_args(args)
+
+    from ..io import import_from_yaml
+
+    statechart = import_from_yaml(filepath=args.statechart)
+    reports = [replay(args.recording, statechart, check=not args.no_check) for _ in range(max(args.repeat, 1))]
+    report = min(reports, key=lambda r: r.duration)
+
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+    else:
+        print('{} events and {} macro steps replayed in {:.3f} s ({:.0f} steps per second)'.format(
+            report.events, report.steps, report.duration, report.steps_per_second))
+        if len(report.divergences) > 0:
+            print('{} macro steps were not reproduced, at lines {}'.format(
+                len(report.divergences), ', '.join(map(str, report.divergences[:10]))))
+    return 1 if len(report.divergences) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
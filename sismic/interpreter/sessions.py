@@ -0,0 +1,351 @@
+import abc
+import base64
+import os
+import re
+import sqlite3
+
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+from .default import Interpreter
+from .hibernation import InterpreterRegistry, hibernate, revive
+from ..model import Event, MacroStep, Statechart
+from ..utilities import fsync_directory
+
+__all__ = ['SessionStore', 'MemoryStore', 'DirectoryStore', 'SqliteStore', 'SessionManager']
+
+
+class SessionStore(metaclass=abc.ABCMeta):
+    """
+    Abstract base class for the stores in which a *SessionManager* saves the hibernated interpreters
+    (see *hibernate*) of the sessions that are not resident, identified by their key (a string).
+    """
+
+    @abc.abstractmethod
+    def load(self, key: str) -> Optional[bytes]:
+        """
+        Return the hibernated interpreter for given key, or None if there is none.
+
+        :param key: key of the session
+        :return: a bytes object, or None
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def save(self, key: str, blob: bytes) -> None:
+        """
+        Save the hibernated interpreter for given key, replacing the previous one if any.
+
+        :param key: key of the session
+        :param blob: a hibernated interpreter
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        """
+        Delete the hibernated interpreter for given key, if any.
+
+        :param key: key of the session
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def keys(self) -> List[str]:
+        """
+        Return the keys of the sessions in this store.
+        """
+        raise NotImplementedError()
+
+    def __contains__(self, key: str) -> bool:
+        return self.load(key) is not None
+
+    def close(self) -> None:
+        """
+        Release the resources used by this store.
+        """
+
+
+class MemoryStore(SessionStore):
+    """
+    A store that keeps hibernated interpreters in a dict.
+    """
+
+    def __init__(self) -> None:
+        self._blobs = {}  # type: Dict[str, bytes]
+
+    def load(self, key: str) -> Optional[bytes]:
+        return self._blobs.get(key, None)
+
+    def save(self, key: str, blob: bytes) -> None:
+        self._blobs[key] = blob
+
+    def delete(self, key: str) -> None:
+        self._blobs.pop(key, None)
+
+    def keys(self) -> List[str]:
+        return list(self._blobs.keys())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._blobs
+
+
+class DirectoryStore(SessionStore):
+    """
+    A store that saves each hibernated interpreter in a file of given directory, named after
+    the (URL-safe base64 encoded) key of its session. Files are replaced atomically, and are
+    fsynced (as well as the directory) unless *fsync* is False.
+
+    As file names are limited to 255 bytes on most file systems, the UTF-8 encoding of keys
+    must not exceed *MAX_KEY_LENGTH* bytes.
+
+    :param path: path to the directory, that is created if needed
+    :param fsync: whether saved files are fsynced, or only written to the operating system
+    """
+
+    SUFFIX = '.session'
+    #: Maximal length of the UTF-8 encoding of a key, so that the name of its temporary file fits in 255 bytes
+    MAX_KEY_LENGTH = 180
+
+    def __init__(self, path: str, *, fsync: bool=True) -> None:
+        self.path = path
+        self.fsync = fsync
+        os.makedirs(path, exist_ok=True)
+
+    def _filepath(self, key: str) -> str:
+        encoded = key.encode('utf-8')
+        if len(encoded) > self.MAX_KEY_LENGTH:
+            raise ValueError('Key {!r}... is too long: its UTF-8 encoding exceeds {} bytes'.format(
+                key[:20], self.MAX_KEY_LENGTH))
+        name = base64.urlsafe_b64encode(encoded).decode('ascii')
+        return os.path.join(self.path, name + self.SUFFIX)
+
+    def load(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._filepath(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, blob: bytes) -> None:
+        filepath = self._filepath(key)
+        with open(filepath + '.tmp', 'wb') as f:
+            f.write(blob)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(filepath + '.tmp', filepath)
+        if self.fsync:
+            fsync_directory(self.path)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._filepath(key))
+        except FileNotFoundError:
+            return
+        if self.fsync:
+            fsync_directory(self.path)
+
+    def keys(self) -> List[str]:
+        return [
+            base64.urlsafe_b64decode(name[:-len(self.SUFFIX)].encode('ascii')).decode('utf-8')
+            for name in os.listdir(self.path) if name.endswith(self.SUFFIX)
+        ]
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._filepath(key))
+
+    def __repr__(self):
+        return '{}({!r}, fsync={!r})'.format(self.__class__.__name__, self.path, self.fsync)
+
+
+class SqliteStore(SessionStore):
+    """
+    A store that saves hibernated interpreters in a table of a SQLite database.
+
+    :param path: path to the database, that is created if needed (or ":memory:")
+    :param table: name of the table, that is created if needed
+    :raise ValueError: if the name of the table is not a valid identifier
+    """
+
+    def __init__(self, path: str, *, table: str='sessions') -> None:
+        if re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', table) is None:
+            raise ValueError('Invalid table name {!r}'.format(table))
+        self.path = path
+        self.table = table
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS "{}" (key TEXT PRIMARY KEY, blob BLOB NOT NULL)'.format(table))
+
+    def load(self, key: str) -> Optional[bytes]:
+        row = self._connection.execute(
+            'SELECT blob FROM "{}" WHERE key = ?'.format(self.table), (key,)).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def save(self, key: str, blob: bytes) -> None:
+        with self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO "{}" (key, blob) VALUES (?, ?)'.format(self.table), (key, blob))
+
+    def delete(self, key: str) -> None:
+        with self._connection:
+            self._connection.execute('DELETE FROM "{}" WHERE key = ?'.format(self.table), (key,))
+
+    def keys(self) -> List[str]:
+        return [row[0] for row in self._connection.execute('SELECT key FROM "{}"'.format(self.table))]
+
+    def __contains__(self, key: str) -> bool:
+        return self._connection.execute(
+            'SELECT 1 FROM "{}" WHERE key = ?'.format(self.table), (key,)).fetchone() is not None
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __repr__(self):
+        return '{}({!r}, table={!r})'.format(self.__class__.__name__, self.path, self.table)
+
+
+class SessionManager(InterpreterRegistry):
+    """
+    A manager of sessions, each session being an interpreter of a same statechart identified
+    by a key (a string).
+
+    At most *capacity* interpreters are kept in memory. When this capacity is exceeded, the
+    least recently used interpreter is evicted: it is hibernated (see *hibernate*) and saved in
+    given store. It is revived from the store when its session is accessed again. A session that
+    does not exist is created when it is first accessed.
+
+    This is an *InterpreterRegistry* whose hibernated interpreters are saved in a store. Interpreters
+    that are resident are not saved in the store until they are evicted, or until *flush* (or *close*)
+    is called. As the interpreters can be evicted at any time, references to them should not be kept:
+    use *get*, *queue* or *deliver* each time an interpreter is needed.
+
+    When an interpreter is revived, its hibernated state is kept in the store, and is only replaced
+    when the interpreter is evicted again, or when *flush* is called. If the process crashes, the
+    macro steps executed since the last eviction or flush are therefore lost: call *flush* periodically,
+    or use a *WriteAheadLog* for each session, if they must be durable.
+
+    :param statechart: statechart of the interpreters
+    :param store: a *SessionStore* instance
+    :param capacity: maximal number of interpreters kept in memory
+    :param interpreter_klass: a callable (e.g. *Interpreter* or *CompactInterpreter*) that returns an interpreter
+    :param kwargs: additional named parameters for *interpreter_klass*
+    """
+
+    def __init__(self, statechart: Statechart, store: SessionStore, *, capacity: int=1000,
+                 interpreter_klass: Callable[..., Interpreter]=Interpreter, **kwargs) -> None:
+        if capacity is None or capacity < 1:
+            raise ValueError('capacity must be a positive integer, not {}'.format(capacity))
+        super().__init__(statechart, capacity=capacity, interpreter_klass=interpreter_klass, **kwargs)
+
+        self.store = store
+        self.creations = 0
+
+    def _revive(self, key: str) -> Interpreter:
+        # A session is created when it is first accessed
+        blob = self.store.load(key)
+        if blob is None:
+            self.creations += 1
+            return self._interpreter_klass(self.statechart, **self._kwargs)
+
+        self.revivals += 1
+        return revive(blob, self.statechart, fingerprint=self.fingerprint,
+                      interpreter_klass=self._interpreter_klass, **self._kwargs)
+
+    def _save(self, key: str, blob: bytes) -> None:
+        self.store.save(key, blob)
+
+    def create(self, key: str) -> Interpreter:
+        interpreter = super().create(key)
+        self.creations += 1
+        return interpreter
+
+    def get(self, key: str) -> Interpreter:
+        """
+        Return the interpreter of given session, loading it from the store or creating it if needed.
+
+        :param key: key of the session
+        :return: an interpreter
+        """
+        return super().get(key)
+
+    def deliver(self, key: str, events: Iterable[Union[str, Event]], *, max_steps: int=-1) -> List[MacroStep]:
+        """
+        Queue given events to the interpreter of given session, and execute it.
+
+        :param key: key of the session
+        :param events: names of events or Event instances
+        :param max_steps: an upper bound on the number of steps (see *Interpreter.execute*)
+        :return: the executed macro steps
+        """
+        interpreter = self.get(key)
+        for event in events:
+            interpreter.queue(event)
+        return interpreter.execute(max_steps=max_steps)
+
+    def deliver_all(self, items: Iterable[Tuple[str, Union[str, Event]]], *,
+                    max_steps: int=-1) -> Mapping[str, List[MacroStep]]:
+        """
+        Deliver events to their sessions. Events are grouped by session (preserving their order), so
+        that each session is loaded and executed once, whatever the number of events it receives.
+
+        :param items: pairs of a session key and an event name or Event instance
+        :param max_steps: an upper bound on the number of steps of each session (see *Interpreter.execute*)
+        :return: a dict that maps each session key to its executed macro steps
+        """
+        batches = OrderedDict()  # type: OrderedDict
+        for key, event in items:
+            batches.setdefault(key, []).append(event)
+
+        return OrderedDict((key, self.deliver(key, events, max_steps=max_steps)) for key, events in batches.items())
+
+    def remove(self, key: str) -> None:
+        """
+        Remove given session, from memory and from the store.
+
+        :param key: key of the session
+        """
+        self._resident.pop(key, None)
+        self.store.delete(key)
+
+    def flush(self) -> None:
+        """
+        Save the resident interpreters in the store, without evicting them.
+        """
+        for key, (interpreter, _) in self._resident.items():
+            self.store.save(key, hibernate(interpreter, fingerprint=self.fingerprint))
+
+    def close(self) -> None:
+        """
+        Save the resident interpreters in the store, evict them, and close the store.
+        """
+        self.flush()
+        self._resident.clear()
+        self.store.close()
+
+    def is_resident(self, key: str) -> bool:
+        """
+        Return True if the interpreter of given session is in memory.
+
+        :param key: key of the session
+        """
+        return key in self._resident
+
+    def keys(self) -> List[str]:
+        """
+        Return the keys of the sessions, resident or in the store.
+        """
+        keys = list(self._resident.keys())
+        keys.extend(key for key in self.store.keys() if key not in self._resident)
+        return keys
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._resident or key in self.store
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __repr__(self):
+        return '{}({!r}, {!r}, capacity={!r}, {} resident)'.format(
+            self.__class__.__name__, self.statechart, self.store, self.capacity, len(self._resident))
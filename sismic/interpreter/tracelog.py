@@ -0,0 +1,383 @@
+import mmap
+import pickle
+import struct
+import zlib
+
+from array import array
+from functools import wraps
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
+
+from .default import Interpreter
+from .hibernation import statechart_fingerprint
+from ..model import Event, InternalEvent, MacroStep, MetaEvent, MicroStep, Statechart, Transition
+from ..utilities import unwrap_methods, wrap_method
+
+__all__ = ['BinaryTraceWriter', 'BinaryTraceReader', 'MacroStepView']
+
+
+MAGIC = b'SISMTRC2'
+
+# Kinds of records
+NAME, TRANSITION, STEP = b'N', b'T', b'S'
+
+# Reference to no name or to no transition
+NONE = 0xFFFFFFFF
+
+_FINGERPRINT = struct.Struct('<64s')
+_NAME = struct.Struct('<H')  # length of the name, followed by its UTF-8 encoding
+_TRANSITION = struct.Struct('<IIIIII')  # index in the statechart, source, target, event, priority, code digest
+_STEP = struct.Struct('<IdH')  # length of the record, time, number of micro steps, followed by the event
+_EVENT = struct.Struct('<IIB')  # name, length of the pickled parameters, and kind of event
+_MICRO_STEP = struct.Struct('<BIHHH')  # flags, transition, number of entered, exited and sent events
+
+# Flags of micro steps
+_HAS_EVENT = 1
+
+# Kinds of events, identified by their position
+_EVENT_KINDS = (Event, InternalEvent, MetaEvent)
+
+
+def _code_digest(transition: Transition) -> int:
+    """
+    Return a CRC-32 of the guard and of the action of given transition, to distinguish transitions
+    that have the same source, target, event and priority.
+    """
+    return zlib.crc32('{!r}\x00{!r}'.format(transition.guard, transition.action).encode('utf-8'))
+
+
+class BinaryTraceWriter:
+    """
+    A recorder of the macro steps of an interpreter in a compact, append-only, binary file, that can
+    be read with *BinaryTraceReader*. Unlike *sismic.helpers.log_trace*, recorded macro steps are not
+    kept in memory.
+
+    Names of states and events are interned: each of them is written once, and is then referred to by
+    an integer. Transitions are written once as well, with their position in the statechart and a digest
+    of their guard and action, and are then referred to by an integer. Each macro step is written as its time, its event, and the transition, the
+    entered and exited states and the sent events of each of its micro steps. The kind of each event
+    (*Event*, *InternalEvent* or *MetaEvent*) is recorded, and its parameters are pickled, unless
+    *parameters* is False.
+
+    The writer is attached to an interpreter by wrapping its *execute_once* method.
+
+    :param file: a path or a binary file opened for writing
+    :param parameters: whether the parameters of events are recorded
+    """
+
+    def __init__(self, file: Union[str, BinaryIO], *, parameters: bool=True) -> None:
+        self._owned = isinstance(file, str)
+        self._file = open(file, 'wb') if isinstance(file, str) else file  # type: BinaryIO
+        self.parameters = parameters
+
+        self._interpreter = None  # type: Optional[Interpreter]
+        self._handle = None  # type: Any
+        self._fingerprint = None  # type: Optional[str]
+        self._names = {}  # type: Dict[str, int]
+        self._transitions = {}  # type: Dict[int, int]
+
+        self.steps = 0
+        self.bytes = 0
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self.bytes += len(data)
+
+    def _name(self, name: Optional[str]) -> int:
+        if name is None:
+            return NONE
+        number = self._names.get(name, None)
+        if number is None:
+            number = self._names[name] = len(self._names)
+            encoded = name.encode('utf-8')
+            self._write(NAME + _NAME.pack(len(encoded)) + encoded)
+        return number
+
+    def _transition(self, transition: Optional[Transition]) -> int:
+        if transition is None:
+            return NONE
+        number = self._transitions.get(id(transition), None)
+        if number is None:
+            index = next((i for i, t in enumerate(self._interpreter.statechart.transitions) if t is transition), NONE)
+            data = _TRANSITION.pack(
+                index, self._name(transition.source), self._name(transition.target), self._name(transition.event),
+                transition.priority & 0xFFFFFFFF, _code_digest(transition),
+            )
+            number = self._transitions[id(transition)] = len(self._transitions)
+            self._write(TRANSITION + data)
+        return number
+
+    def _event(self, event: Optional[Event]) -> bytes:
+        if event is None:
+            return _EVENT.pack(NONE, 0, 0)
+        data = pickle.dumps(event.data, protocol=pickle.HIGHEST_PROTOCOL) if self.parameters and event.data else b''
+        kind = next((i for i, klass in enumerate(_EVENT_KINDS) if type(event) is klass), 0)
+        return _EVENT.pack(self._name(event.name), len(data), kind) + data
+
+    def write(self, step: MacroStep) -> None:
+        """
+        Write given macro step.
+
+        :param step: a *MacroStep* instance
+        """
+        # Definitions of names and transitions are written before the step that refers to them
+        parts = [self._event(step.event)]
+        for micro_step in step.steps:
+            parts.append(_MICRO_STEP.pack(
+                _HAS_EVENT if micro_step.event is not None else 0, self._transition(micro_step.transition),
+                len(micro_step.entered_states), len(micro_step.exited_states), len(micro_step.sent_events),
+            ))
+            names = [self._name(name) for name in micro_step.entered_states + micro_step.exited_states]
+            parts.append(struct.pack('<{}I'.format(len(names)), *names))
+            parts.extend(self._event(event) for event in micro_step.sent_events)
+
+        body = b''.join(parts)
+        self._write(STEP + _STEP.pack(_STEP.size + len(body), step.time, len(step.steps)) + body)
+        self.steps += 1
+
+    def attach(self, interpreter: Interpreter) -> None:
+        """
+        Attach this writer to given interpreter, so that its macro steps are written.
+
+        :param interpreter: an *Interpreter* instance
+        :raise ValueError: if this writer is already attached to an interpreter, or if it was attached
+            to an interpreter for another statechart.
+        """
+        if self._interpreter is not None:
+            raise ValueError('Writer is already attached to {!r}'.format(self._interpreter))
+
+        fingerprint = statechart_fingerprint(interpreter.statechart)
+        if self.bytes == 0:
+            self._write(MAGIC + _FINGERPRINT.pack(fingerprint.encode('ascii')))
+        elif fingerprint != self._fingerprint:
+            raise ValueError('Writer was attached to an interpreter for another statechart')
+        self._fingerprint = fingerprint
+
+        func = interpreter.execute_once
+
+        @wraps(func)
+        def wrapper():
+            step = func()
+            if step is not None:
+                self.write(step)
+            return step
+
+        self._handle = wrap_method(interpreter, 'execute_once', wrapper)
+        self._interpreter = interpreter
+
+    def detach(self) -> None:
+        """
+        Detach this writer from its interpreter, if any.
+
+        :raise ValueError: if *execute_once* was wrapped again after this writer was attached
+        """
+        if self._interpreter is not None:
+            unwrap_methods(self._handle)
+            self._handle = None
+            self._interpreter = None
+        self._file.flush()
+
+    def close(self) -> None:
+        """
+        Detach this writer, and close its file if it was opened by the writer.
+        """
+        self.detach()
+        if self._owned:
+            self._file.close()
+
+    def __enter__(self) -> 'BinaryTraceWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, getattr(self._file, 'name', self._file))
+
+
+class MacroStepView(MacroStep):
+    """
+    A *MacroStep* whose micro steps are decoded from a *BinaryTraceReader* when they are first accessed.
+    """
+
+    def __init__(self, reader: 'BinaryTraceReader', offset: int) -> None:
+        self._reader = reader
+        self._offset = offset
+        self._time = _STEP.unpack_from(reader._buffer, offset)[1]
+        self._decoded = None  # type: Optional[List[MicroStep]]
+
+    @property
+    def _steps(self) -> List[MicroStep]:  # type: ignore
+        if self._decoded is None:
+            self._decoded = self._reader._decode(self._offset)
+        return self._decoded
+
+
+class BinaryTraceReader:
+    """
+    A reader of the macro steps written by a *BinaryTraceWriter*. The file is memory-mapped, and its
+    macro steps are exposed as a sequence of *MacroStepView* instances, whose micro steps are only decoded
+    when they are accessed. Only the offsets of the macro steps, the names and the transitions are kept in
+    memory, so that large traces can be analyzed (e.g. with *sismic.helpers.coverage_from_trace*) without
+    loading them.
+
+    If a statechart is provided, transitions are the ones of this statechart, identified by their position
+    and checked against their recorded source, target, event, priority, guard and action (if they do not
+    match, e.g. because the transitions of the statechart were reordered, the first transition that matches
+    them is used).
+    Otherwise, transitions are created from their source, target, event and priority (guards, actions and
+    contracts are not recorded).
+    A truncated macro step at the end of the file (e.g. if it is still written) is ignored.
+
+    :param path: path to a binary trace
+    :param statechart: the statechart of the recorded interpreter, if available
+    :raise ValueError: if the file is not a binary trace or is corrupted, or if the statechart does not match
+        the recorded one
+    """
+
+    def __init__(self, path: str, *, statechart: Statechart=None) -> None:
+        self.path = path
+        self._fileobj = open(path, 'rb')
+        try:
+            self._buffer = mmap.mmap(self._fileobj.fileno(), 0, access=mmap.ACCESS_READ)  # type: Any
+        except ValueError:  # Empty file
+            self._buffer = b''
+
+        if self._buffer[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError('{} is not a binary trace'.format(path))
+        self.fingerprint = _FINGERPRINT.unpack_from(self._buffer, len(MAGIC))[0].decode('ascii')
+        if statechart is not None and statechart_fingerprint(statechart) != self.fingerprint:
+            self.close()
+            raise ValueError('Statechart {} does not match the recorded statechart'.format(statechart))
+
+        self._names = []  # type: List[str]
+        self._transitions = []  # type: List[Transition]
+        self._offsets = array('Q')
+        try:
+            self._scan(statechart)
+        except ValueError:
+            self.close()
+            raise
+
+    def _scan(self, statechart: Optional[Statechart]) -> None:
+        buffer = self._buffer
+        size = len(buffer)
+        offset = len(MAGIC) + _FINGERPRINT.size
+        while offset < size:
+            kind = buffer[offset:offset + 1]
+            offset += 1
+            if kind == NAME:
+                if offset + _NAME.size > size:
+                    break
+                length = _NAME.unpack_from(buffer, offset)[0]
+                if offset + _NAME.size + length > size:
+                    break
+                self._names.append(bytes(buffer[offset + _NAME.size:offset + _NAME.size + length]).decode('utf-8'))
+                offset += _NAME.size + length
+            elif kind == TRANSITION:
+                if offset + _TRANSITION.size > size:
+                    break
+                index, source, target, event, priority, digest = _TRANSITION.unpack_from(buffer, offset)
+                transition = Transition(
+                    self._names[source], self._name(target), event=self._name(event),
+                    priority=priority - (1 << 32) if priority & 0x80000000 else priority,
+                )
+                if statechart is not None and index != NONE:
+                    transition = self._resolve(statechart, index, transition, digest)
+                self._transitions.append(transition)
+                offset += _TRANSITION.size
+            elif kind == STEP:
+                if offset + _STEP.size > size or offset + _STEP.unpack_from(buffer, offset)[0] > size:
+                    break
+                self._offsets.append(offset)
+                offset += _STEP.unpack_from(buffer, offset)[0]
+            else:
+                raise ValueError('Unexpected record at offset {} of {}'.format(offset - 1, self.path))
+
+    @staticmethod
+    def _resolve(statechart: Statechart, index: int, recorded: Transition, digest: int) -> Transition:
+        """
+        Return the transition of given statechart at given index, or the first one that matches the
+        source, target, event, priority and code digest of the recorded transition if the former does not.
+        """
+        def matches(transition: Transition) -> bool:
+            return (transition.source, transition.target, transition.event, transition.priority) == (
+                recorded.source, recorded.target, recorded.event, recorded.priority
+            ) and _code_digest(transition) == digest
+
+        transitions = statechart.transitions
+        if index < len(transitions) and matches(transitions[index]):
+            return transitions[index]
+        for transition in transitions:
+            if matches(transition):
+                return transition
+        raise ValueError('Recorded transition {} does not exist in {}'.format(recorded, statechart))
+
+    def _name(self, number: int) -> Optional[str]:
+        return None if number == NONE else self._names[number]
+
+    def _event(self, offset: int) -> Any:
+        """
+        Decode the event at given offset, and return it with the offset that follows it.
+        """
+        name, length, kind = _EVENT.unpack_from(self._buffer, offset)
+        offset += _EVENT.size
+        if name == NONE:
+            return None, offset
+        data = pickle.loads(self._buffer[offset:offset + length]) if length > 0 else {}
+        return _EVENT_KINDS[kind](self._names[name], **data), offset + length
+
+    def _decode(self, offset: int) -> List[MicroStep]:
+        """
+        Decode the micro steps of the macro step at given offset.
+        """
+        buffer = self._buffer
+        count = _STEP.unpack_from(buffer, offset)[2]
+        event, offset = self._event(offset + _STEP.size)
+
+        steps = []
+        for _ in range(count):
+            flags, transition, entered, exited, sent = _MICRO_STEP.unpack_from(buffer, offset)
+            offset += _MICRO_STEP.size
+            names = [self._names[n] for n in struct.unpack_from('<{}I'.format(entered + exited), buffer, offset)]
+            offset += 4 * (entered + exited)
+            sent_events = []
+            for _ in range(sent):
+                sent_event, offset = self._event(offset)
+                sent_events.append(sent_event)
+
+            steps.append(MicroStep(
+                event=event if flags & _HAS_EVENT else None,
+                transition=None if transition == NONE else self._transitions[transition],
+                entered_states=names[:entered], exited_states=names[entered:], sent_events=sent_events,
+            ))
+        return steps
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [MacroStepView(self, offset) for offset in self._offsets[index]]
+        return MacroStepView(self, self._offsets[index])
+
+    def __iter__(self) -> Iterator[MacroStepView]:
+        for offset in self._offsets:
+            yield MacroStepView(self, offset)
+
+    def close(self) -> None:
+        """
+        Close the memory-mapped file. Views that were not decoded can no longer be used.
+        """
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._fileobj.close()
+
+    def __enter__(self) -> 'BinaryTraceReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __repr__(self):
+        return '{}({!r}, {} macro steps)'.format(self.__class__.__name__, self.path, len(self))
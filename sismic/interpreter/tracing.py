@@ -0,0 +1,254 @@
+import json
+import os
+import random
+import threading
+import time
+
+from functools import wraps
+from typing import Any, Callable, Dict, List, Tuple
+
+from .listener import PropertyStatechartListener
+from ..utilities import unwrap_methods, wrap_method
+
+__all__ = ['ChromeTracer']
+
+
+def _perf_counter_ns() -> int:
+    return int(time.perf_counter() * 1e9)
+
+
+# time.perf_counter_ns is only available since Python 3.7
+perf_counter_ns = getattr(time, 'perf_counter_ns', _perf_counter_ns)  # type: Callable[[], int]
+
+
+class ChromeTracer:
+    """
+    A tracer that records the execution of interpreters as nested spans, and exports them in the
+    Chrome trace-event format (that can be loaded in chrome://tracing or in Perfetto).
+
+    The following spans are recorded for each interpreter the tracer is attached to:
+
+     - a *macro step* span for each call to *execute_once*;
+     - a *micro step* span for each micro step (including stabilization steps);
+     - an *action* span for each on entry, on exit and transition action that is executed;
+     - a *guard* span for each group of guards that are evaluated (see *Evaluator.evaluate_guards*).
+
+    Property statecharts that are bound to an interpreter when the tracer is attached to it are traced as
+    well, their macro steps being nested in the spans of the interpreter that sent them meta-events.
+
+    Spans are measured with *time.perf_counter_ns* (or *time.perf_counter* if not available). To bound the
+    overhead, spans can be recorded for one macro step every *every* macro steps, with given *probability*,
+    and up to *max_events* spans. The decision is made for each macro step of an interpreter the tracer is
+    attached to, and applies to all the spans it contains. The number of macro steps that were sampled and
+    skipped are available in *sampled_steps* and *skipped_steps*, and the number of spans that were not
+    recorded because of *max_events* in *dropped_events*.
+
+    :param every: record the spans of one macro step every *every* macro steps.
+    :param probability: probability to record the spans of a macro step.
+    :param max_events: maximal number of spans to record (unbounded by default).
+    :param rng: an optional *random.Random* instance to use with *probability*.
+    """
+
+    def __init__(self, *, every: int=1, probability: float=1.0, max_events: int=None,
+                 rng: random.Random=None) -> None:
+        if every < 1:
+            raise ValueError('every must be a positive integer, not {}'.format(every))
+        if not 0 <= probability <= 1:
+            raise ValueError('probability must be between 0 and 1, not {}'.format(probability))
+
+        self.every = every
+        self.probability = probability
+        self.max_events = max_events
+        self._random = random.Random() if rng is None else rng
+
+        self.events = []  # type: List[Dict[str, Any]]
+        self.sampled_steps = 0
+        self.skipped_steps = 0
+        self.dropped_events = 0
+
+        self._steps = 0
+        self._local = threading.local()
+        # For each attached interpreter, the handles on its wrapped methods and the attached property interpreters
+        self._attached = {}  # type: Dict[int, Tuple[List[Any], List[Any]]]
+
+    @property
+    def _recording(self) -> bool:
+        return getattr(self._local, 'recording', False)
+
+    def _sample(self) -> bool:
+        """
+        Decide whether the spans of the next macro step are recorded.
+        """
+        self._steps += 1
+        sampled = (
+            (self._steps - 1) % self.every == 0
+            and (self.probability >= 1 or self._random.random() < self.probability)
+        )
+        if sampled:
+            self.sampled_steps += 1
+        else:
+            self.skipped_steps += 1
+        return sampled
+
+    def _record(self, name: str, category: str, start: int, end: int, args: Dict[str, Any]) -> None:
+        """
+        Record a complete span.
+        """
+        if self.max_events is not None and len(self.events) >= self.max_events:
+            self.dropped_events += 1
+            return
+
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'X',
+            'ts': start / 1000, 'dur': (end - start) / 1000,
+            'pid': os.getpid(), 'tid': threading.get_ident(),
+            'args': args,
+        })
+
+    def _span(self, func: Callable, category: str, describe: Callable[..., Any]) -> Callable:
+        """
+        Wrap given function so that a span is recorded for each call, if the current macro step is sampled.
+        *describe* receives the arguments and the returned value of the function, and returns the name
+        and the arguments of the span.
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self._recording:
+                return func(*args, **kwargs)
+
+            start = perf_counter_ns()
+            result = func(*args, **kwargs)
+            end = perf_counter_ns()
+            name, span_args = describe(result, *args, **kwargs)
+            self._record(name, category, start, end, span_args)
+            return result
+
+        return wrapper
+
+    def _macro_step(self, interpreter, func: Callable) -> Callable:
+        statechart = interpreter.statechart.name
+
+        @wraps(func)
+        def wrapper():
+            local = self._local
+            depth = getattr(local, 'depth', 0)
+            if depth == 0:
+                local.recording = self._sample()
+
+            local.depth = depth + 1
+            try:
+                if not local.recording:
+                    return func()
+
+                start = perf_counter_ns()
+                step = func()
+                end = perf_counter_ns()
+            finally:
+                local.depth = depth
+                if depth == 0:
+                    local.recording = False
+
+            if step is None:
+                name = '{}: no step'.format(statechart)
+            else:
+                name = '{}: {}'.format(statechart, step.event.name if step.event else 'eventless')
+            self._record(name, 'macro step', start, end, {
+                'statechart': statechart,
+                'time': interpreter.time,
+                'steps': 0 if step is None else len(step.steps),
+            })
+            return step
+
+        return wrapper
+
+    def attach(self, interpreter) -> None:
+        """
+        Attach this tracer to given interpreter, and to the property statecharts that are bound to it.
+
+        :param interpreter: an *Interpreter* instance
+        """
+        if id(interpreter) in self._attached:
+            raise ValueError('Tracer is already attached to {!r}'.format(interpreter))
+
+        evaluator = interpreter._evaluator
+        wrapped = [
+            (interpreter, 'execute_once', self._macro_step(interpreter, interpreter.execute_once)),
+            (interpreter, '_apply_step', self._span(
+                interpreter._apply_step, 'micro step',
+                lambda step, *_: (
+                    str(step.transition) if step.transition else 'micro step',
+                    {'entered states': step.entered_states, 'exited states': step.exited_states},
+                ))),
+            (evaluator, 'execute_on_entry', self._span(
+                evaluator.execute_on_entry, 'action',
+                lambda _, state: ('on entry {}'.format(state.name), {'code': getattr(state, 'on_entry', None)}))),
+            (evaluator, 'execute_on_exit', self._span(
+                evaluator.execute_on_exit, 'action',
+                lambda _, state: ('on exit {}'.format(state.name), {'code': getattr(state, 'on_exit', None)}))),
+            (evaluator, 'execute_action', self._span(
+                evaluator.execute_action, 'action',
+                lambda _, transition, *args, **kwargs: (str(transition), {'code': transition.action}))),
+            (evaluator, 'evaluate_guards', self._span(
+                evaluator.evaluate_guards, 'guard',
+                lambda enabled, transitions, *args, **kwargs: (
+                    'guards {}'.format(transitions[0].source if len(transitions) > 0 else ''),
+                    {'guards': [t.guard for t in transitions], 'enabled': list(enabled)},
+                ))),
+        ]
+
+        handles = [wrap_method(obj, attribute, wrapper) for obj, attribute, wrapper in wrapped]
+
+        properties = [listener._interpreter for listener in interpreter._listeners
+                      if isinstance(listener, PropertyStatechartListener)]
+        self._attached[id(interpreter)] = (handles, properties)
+
+        for property_interpreter in properties:
+            self.attach(property_interpreter)
+
+    def detach(self, interpreter) -> None:
+        """
+        Detach this tracer from given interpreter, and from the property statecharts it was attached to.
+        The methods that were wrapped are restored, including the wrappers that were installed before
+        this tracer was attached (e.g. by another tracer).
+
+        :param interpreter: an *Interpreter* instance
+        :raise ValueError: if a method of the interpreter was wrapped again after this tracer was attached
+        """
+        handles, properties = self._attached[id(interpreter)]
+        unwrap_methods(*handles)
+        del self._attached[id(interpreter)]
+        for property_interpreter in properties:
+            self.detach(property_interpreter)
+
+    def clear(self) -> None:
+        """
+        Discard the recorded spans, and reset the counters.
+        """
+        self.events = []
+        self.sampled_steps = self.skipped_steps = self.dropped_events = 0
+
+    def export(self, *, filepath: str=None) -> str:
+        """
+        Export the recorded spans in the Chrome trace-event (JSON) format.
+
+        :param filepath: an optional path to the file in which the trace is written
+        :return: the trace, as a string
+        """
+        output = json.dumps({
+            'traceEvents': self.events,
+            'displayTimeUnit': 'ns',
+            'otherData': {
+                'sampled steps': self.sampled_steps,
+                'skipped steps': self.skipped_steps,
+                'dropped events': self.dropped_events,
+            },
+        }, default=str)
+
+        if filepath:
+            with open(filepath, 'w') as f:
+                f.write(output)
+        return output
+
+    def __repr__(self):
+        return '{}(every={!r}, probability={!r}, max_events={!r})'.format(
+            self.__class__.__name__, self.every, self.probability, self.max_events)
@@ -1,5 +1,5 @@
 from copy import deepcopy
-from typing import Callable, Dict, Iterable, List, Optional, Union, cast
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union, cast
 
 from ..exceptions import StatechartError
 
@@ -28,6 +28,11 @@ class Statechart:
         self._children = {}  # type: Dict[Optional[str], List[str]]
         self._transitions = []  # type: List[Transition]
 
+        # Indexes on transitions, to avoid scanning self._transitions for every query
+        self._transitions_by_source = {}  # type: Dict[str, List[Transition]]
+        self._transitions_by_target = {}  # type: Dict[str, List[Transition]]
+        self._transitions_by_event = {}  # type: Dict[Optional[str], List[Transition]]
+
         self._children[None] = []  # Root state
 
     @property
@@ -179,19 +184,73 @@ class Statechart:
         :return: the names of the leaves in *names*
         :raise StatechartError: if a state does not exist
         """
-        leaves = []  # type: List[str]
-        names = set(names)  # Lookups in set are more efficient
+        names = list(dict.fromkeys(names))  # Remove duplicates, but keep order
+        non_leaves = set()  # type: Set[str]
 
         for name in names:
-            for descendant in self.descendants_for(name):  # Raise a StatechartError if it does not exist!
-                if descendant in names:
-                    break
-            else:  # no break occurs
-                leaves.append(name)
-        return leaves
+            self.state_for(name)  # Raise StatechartError if state does not exist
+
+            # Every ancestor of a state in names has a descendant in names
+            parent = self._parent[name]
+            while parent is not None and parent not in non_leaves:
+                non_leaves.add(parent)
+                parent = self._parent[parent]
+
+        return [name for name in names if name not in non_leaves]
 
     # ######### TRANSITIONS ##########
 
+    @staticmethod
+    def _transition_keys(transition: Transition) -> Tuple[str, str, Optional[str]]:
+        """
+        Return the keys under which given transition is indexed, ie. its source,
+        its target (or its source if it is an internal transition) and its event.
+
+        :param transition: a *Transition* instance
+        :return: a 3-uple (source, target, event)
+        """
+        target = transition.source if transition.target is None else transition.target
+        return transition.source, target, transition.event
+
+    def _index_transition(self, transition: Transition, ordered: bool=False) -> None:
+        """
+        Register given transition in the source, target and event indexes.
+
+        :param transition: a *Transition* instance
+        :param ordered: if True, the transition is inserted according to its position in the statechart
+            instead of being appended (e.g. when it is indexed again after its source or target changed).
+        """
+        keys = self._transition_keys(transition)
+        indexes = (self._transitions_by_source, self._transitions_by_target, self._transitions_by_event)
+        if not ordered:
+            for index, key in zip(indexes, keys):
+                index.setdefault(key, []).append(transition)
+            return
+
+        position = next(i for i, t in enumerate(self._transitions) if t is transition)
+        following = {id(t) for t in self._transitions[position + 1:]}
+        for index, key in zip(indexes, keys):
+            transitions = index.setdefault(key, [])
+            i = next((i for i, other in enumerate(transitions) if id(other) in following), len(transitions))
+            transitions.insert(i, transition)
+
+    def _unindex_transition(self, transition: Transition) -> None:
+        """
+        Unregister given transition (compared by identity) from the source, target and event indexes.
+
+        :param transition: a *Transition* instance
+        """
+        keys = self._transition_keys(transition)
+        indexes = (self._transitions_by_source, self._transitions_by_target, self._transitions_by_event)
+        for index, key in zip(indexes, keys):
+            transitions = index[key]
+            for i, other in enumerate(transitions):
+                if other is transition:
+                    del transitions[i]
+                    break
+            if len(transitions) == 0:
+                del index[key]
+
     @property
     def transitions(self):
         """
@@ -221,6 +280,7 @@ class Statechart:
             raise StatechartError('Unknown target state for {}'.format(transition))
 
         self._transitions.append(transition)
+        self._index_transition(transition)
 
     def remove_transition(self, transition: Transition) -> None:
         """
@@ -230,10 +290,13 @@ class Statechart:
         :raise StatechartError: if transition is not registered
         """
         try:
-            self._transitions.remove(transition)
+            # Transitions are compared by value, identify the one that is actually registered
+            registered = self._transitions.pop(self._transitions.index(transition))
         except ValueError:
             raise StatechartError('Transition {} does not exist'.format(transition))
 
+        self._unindex_transition(registered)
+
     def rotate_transition(self, transition: Transition, new_source: str='', new_target: Optional[str]='') -> None:
         """
         Rotate given transition.
@@ -253,21 +316,31 @@ class Statechart:
         if transition not in self._transitions:
             raise StatechartError('Unknown transition {}'.format(transition))
 
-        # Rotate using source
-        if new_source != '':
-            new_source_state = self.state_for(new_source)
-            if not isinstance(new_source_state, TransitionStateMixin):
-                raise StatechartError('{} cannot have transitions'.format(new_source_state))
-            assert isinstance(new_source_state, StateMixin)
-            transition._source = new_source_state.name
-
-        # Rotate using target
-        if new_target != '':
-            if new_target is None:
-                transition._target = None
-            else:
-                new_target_state = self.state_for(new_target)
-                transition._target = new_target_state.name
+        # Only the registered transition is indexed, not an equal one
+        registered = any(t is transition for t in self._transitions)
+        if registered:
+            self._unindex_transition(transition)
+
+        try:
+            # Rotate using source
+            if new_source != '':
+                new_source_state = self.state_for(new_source)
+                if not isinstance(new_source_state, TransitionStateMixin):
+                    raise StatechartError('{} cannot have transitions'.format(new_source_state))
+                assert isinstance(new_source_state, StateMixin)
+                transition._source = new_source_state.name
+
+            # Rotate using target
+            if new_target != '':
+                if new_target is None:
+                    transition._target = None
+                else:
+                    new_target_state = self.state_for(new_target)
+                    transition._target = new_target_state.name
+        finally:
+            # Source may have been changed even if target is invalid
+            if registered:
+                self._index_transition(transition, ordered=True)
 
     def transitions_from(self, source: str) -> List[Transition]:
         """
@@ -279,11 +352,7 @@ class Statechart:
         """
         self.state_for(source)  # Raise StatechartError if state does not exist
 
-        transitions = []
-        for transition in self._transitions:
-            if transition.source == source:
-                transitions.append(transition)
-        return transitions
+        return list(self._transitions_by_source.get(source, []))
 
     def transitions_to(self, target: str) -> List[Transition]:
         """
@@ -296,11 +365,7 @@ class Statechart:
         """
         self.state_for(target)  # Raise StatechartError if state does not exist
 
-        transitions = []
-        for transition in self._transitions:
-            if transition.target == target or (transition.target is None and transition.source == target):
-                transitions.append(transition)
-        return transitions
+        return list(self._transitions_by_target.get(target, []))
 
     def transitions_with(self, event: str) -> List[Transition]:
         """
@@ -309,11 +374,7 @@ class Statechart:
         :param event: name of the event
         :return: a list of *Transition* instances
         """
-        transitions = []
-        for transition in self._transitions:
-            if transition.event == event:
-                transitions.append(transition)
-        return transitions
+        return list(self._transitions_by_event.get(event, []))
 
     # ######### EVENTS ##########
 
@@ -329,7 +390,7 @@ class Statechart:
         :return: A list of event names
         """
         if name_or_names is None:
-            states = list(self._states.keys())
+            return sorted(event for event in self._transitions_by_event.keys() if event)
         elif isinstance(name_or_names, str):
             states = [name_or_names]
         else:
@@ -338,7 +399,8 @@ class Statechart:
         states = cast(List[str], states)
         names = set()
         for state in states:
-            for transition in self.transitions_from(state):
+            self.state_for(state)  # Raise StatechartError if state does not exist
+            for transition in self._transitions_by_source.get(state, []):
                 if transition.event:
                     names.add(transition.event)
         return sorted(names)
@@ -405,9 +467,10 @@ class Statechart:
             self.remove_state(child)
 
         # Remove transitions
-        for transition in list(self.transitions):  # Make a copy!
-            if transition.source == state.name or transition.target == state.name:
-                self.remove_transition(transition)
+        transitions = self._transitions_by_source.get(name, []) + self._transitions_by_target.get(name, [])
+        for transition in {id(t): t for t in transitions}.values():
+            self._transitions.pop(next(i for i, t in enumerate(self._transitions) if t is transition))
+            self._unindex_transition(transition)
 
         # Remove compoundstate's initial and historystate's memory
         for o_state in self._states.values():
@@ -448,6 +511,11 @@ class Statechart:
             if transition.target == old_name:
                 transition._target = new_name
 
+        # Transitions from or to the state keep their relative order, their indexes are moved to the new name
+        for index in (self._transitions_by_source, self._transitions_by_target):
+            if old_name in index:
+                index[new_name] = index.pop(old_name)
+
         for other_state in self._states.values():
             # Change initial (CompoundState)
             if isinstance(other_state, CompoundState):
@@ -1,13 +1,79 @@
 import time
 import threading
 
-from typing import List
+from typing import Any, Callable, Dict, List, Sequence
 
-from ..interpreter import Interpreter
+from ..interpreter import Histogram, Interpreter
+from ..interpreter.metrics import DEFAULT_BUCKETS
 from ..model import MacroStep
 
 
-__all__ = ['AsyncRunner']
+__all__ = ['AsyncRunner', 'RunnerMetrics']
+
+
+class RunnerMetrics:
+    """
+    Performance counters of an *AsyncRunner*, provided using its *metrics* parameter.
+
+    The following counters are maintained:
+
+     - *cycles*: number of calls to *execute*.
+     - *macro_steps*: number of macro steps returned by *execute*.
+     - *overruns*: number of cycles that took more time than the interval of the runner.
+
+    The duration of each cycle (ie. of the calls to *before_execute*, *execute* and *after_execute*,
+    in seconds, according to *timer*) is recorded in the *latency* histogram.
+    Counters of the underlying interpreter can be obtained by providing an *InterpreterMetrics*
+    instance to the interpreter.
+
+    :param buckets: increasing upper bounds (in seconds) of the buckets of the latency histogram.
+    :param timer: a callable that returns the current time in seconds (default to *time.perf_counter*).
+    """
+
+    COUNTERS = ('cycles', 'macro_steps', 'overruns')
+
+    def __init__(self, *, buckets: Sequence[float]=DEFAULT_BUCKETS,
+                 timer: Callable[[], float]=time.perf_counter) -> None:
+        self.timer = timer
+        self.latency = Histogram(buckets)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Reset all the counters and the latency histogram.
+        """
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.latency.reset()
+
+    def record_cycle(self, macro_steps: int, duration: float, interval: float) -> None:
+        """
+        Record that a cycle was executed.
+
+        :param macro_steps: number of macro steps executed during the cycle
+        :param duration: duration of the cycle
+        :param interval: interval of the runner
+        """
+        self.cycles += 1
+        self.macro_steps += macro_steps
+        if duration > interval:
+            self.overruns += 1
+        self.latency.observe(duration)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Return a dict representation of these metrics, that can be serialized (e.g. to JSON).
+
+        :return: a dict that maps the name of each counter to its value, and "latency" to
+            the dict representation of the latency histogram.
+        """
+        metrics = {name: getattr(self, name) for name in self.COUNTERS}  # type: Dict[str, Any]
+        metrics['latency'] = self.latency.as_dict()
+        return metrics
+
+    def __repr__(self):
+        return '{}(cycles={!r}, macro_steps={!r}, overruns={!r})'.format(
+            self.__class__.__name__, self.cycles, self.macro_steps, self.overruns)
 
 
 class AsyncRunner:
@@ -46,16 +112,22 @@ class AsyncRunner:
     set to True, then `execute_once` is repeatedly called until no macro step can be
     processed in the current cycle.
 
+    Performance counters of the runner are maintained in `metrics`, if a `RunnerMetrics` instance
+    is provided.
+
     :param interpreter: interpreter instance to run.
     :param interval: interval between two calls to `execute`
     :param execute_all: Repeatedly call interpreter's `execute_once` method at each step.
+    :param metrics: an optional `RunnerMetrics` instance in which performance counters are maintained.
     """
-    def __init__(self, interpreter: Interpreter, interval: float=0.1, execute_all=False) -> None:
+    def __init__(self, interpreter: Interpreter, interval: float=0.1, execute_all=False, *,
+                 metrics: RunnerMetrics=None) -> None:
         self._unpaused = threading.Event()
         self._stop = threading.Event()
 
         self.interpreter = interpreter
         self.interval = interval
+        self.metrics = metrics
         self._execute_all = execute_all
         self._thread = threading.Thread(target=self._run)
 
@@ -161,10 +233,16 @@ class AsyncRunner:
 
         while not self.interpreter.final and not self._stop.is_set():
             starttime = time.time()
+            if self.metrics is not None:
+                start = self.metrics.timer()
+
             self.before_execute()
             r = self.execute()
             self.after_execute(r)
 
+            if self.metrics is not None:
+                self.metrics.record_cycle(len(r), self.metrics.timer() - start, self.interval)
+
             elapsed = time.time() - starttime
             time.sleep(max(0, self.interval - elapsed))
             self._unpaused.wait()
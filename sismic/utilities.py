@@ -1,3 +1,5 @@
+import os
+
 from collections import defaultdict
 
 
@@ -9,4 +11,84 @@ def sorted_groupby(iterable, key=None, reverse=False):
     for value in iterable:
         groups[key(value)].append(value)
     sort_key = lambda e: e[0]
-    return sorted(groups.items(), key=sort_key, reverse=reverse)
\ No newline at end of file
+    return sorted(groups.items(), key=sort_key, reverse=reverse)
+
+
+class LazyContainer:
+    """
+    A descriptor for an attribute holding a container (e.g. a dict) that is only allocated when
+    the attribute is first read. Assigning an empty container releases the current one.
+    The container is stored in given slot (or attribute), None meaning that it is not allocated.
+
+    :param slot: name of the slot in which the container is stored
+    :param factory: a callable that returns a new empty container
+    """
+
+    def __init__(self, slot: str, factory) -> None:
+        self.slot = slot
+        self.factory = factory
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        container = getattr(obj, self.slot, None)
+        if container is None:
+            container = self.factory()
+            setattr(obj, self.slot, container)
+        return container
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value if len(value) > 0 else None)
+
+
+# Marker of an attribute that was not set on the instance before it was wrapped
+_MISSING = object()
+
+
+def wrap_method(obj, name: str, wrapper):
+    """
+    Replace the method (or any callable attribute) of given object by given wrapper, and return
+    a handle that *unwrap_methods* uses to restore the previous one.
+
+    :param obj: an object whose attributes are not (only) stored in slots
+    :param name: name of the method
+    :param wrapper: the callable that replaces it
+    :return: a handle on the wrapped method
+    """
+    previous = getattr(obj, '__dict__', {}).get(name, _MISSING)
+    setattr(obj, name, wrapper)
+    return obj, name, wrapper, previous
+
+
+def unwrap_methods(*handles) -> None:
+    """
+    Restore the methods that were wrapped by *wrap_method*. As wrappers can be stacked (e.g. by several
+    tracers), each method must not have been wrapped again since, as that wrapper would be lost.
+
+    :param handles: handles returned by *wrap_method*
+    :raise ValueError: if one of the methods was wrapped again (nothing is restored in that case)
+    """
+    for obj, name, wrapper, _ in handles:
+        if getattr(obj, name, None) is not wrapper:
+            raise ValueError('{} of {!r} was wrapped again, its last wrapper must be removed first'.format(name, obj))
+
+    for obj, name, _, previous in reversed(handles):
+        if previous is _MISSING:
+            delattr(obj, name)
+        else:
+            setattr(obj, name, previous)
+
+
+def fsync_directory(path: str) -> None:
+    """
+    Fsync given directory, so that the files that were created, renamed or removed in it are durable.
+    This is a no-op on platforms where directories cannot be opened (e.g. Windows).
+
+    :param path: path to a directory
+    """
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -1,9 +1,21 @@
+import json
+import pickle
 import pytest
 
+from collections import Counter
+
+from functools import partial
+from types import SimpleNamespace
+
 from sismic import code
-from sismic.code.python import FrozenContext
+from sismic.code.analysis import analyze_code
+from sismic.code.functions import NOT_APPLICABLE, GuardError, compile_function, compile_guards
+from sismic.code.profiler import cli as profiler_cli
+from sismic.code.python import FrozenContext, VersionedContext
 from sismic.exceptions import CodeEvaluationError
-from sismic.interpreter import Event, InternalEvent, MetaEvent
+from sismic.interpreter import Event, Interpreter, InternalEvent, MetaEvent
+from sismic.io import import_from_yaml
+from sismic.model import Transition
 
 
 def test_dummy_evaluator(mocker):
@@ -30,9 +42,112 @@ def test_frozen_context():
     assert freeze.a == 1
 
 
+def test_versioned_context():
+    context = VersionedContext(a=1)
+    assert context == {'a': 1}
+    assert context.versions['a'] == context.version
+
+    version = context.touch(['b'])
+    assert context.versions['b'] == version
+
+    context.update(c=3)
+    context.setdefault('d', 4)
+    context.setdefault('a', 2)
+    del context['c']
+    assert context == {'a': 1, 'd': 4}
+    assert context.versions['a'] < version < context.versions['d'] < context.versions['c']
+
+    assert pickle.loads(pickle.dumps(context)).versions == context.versions
+
+
+def test_analyze_code():
+    info = analyze_code('x = y + len(z)')
+    assert info.names == {'y', 'len', 'z'}
+    assert info.stored == {'x'}
+    assert not info.calls
+    assert not info.is_pure()
+    assert analyze_code('y + len(z)').is_pure()
+
+    assert analyze_code('x.append(1)').calls
+    assert not analyze_code('f(x)').is_pure()
+    assert not analyze_code('after(10)').is_pure()
+    assert not analyze_code('time > x').is_pure()
+    assert not analyze_code('event.x > x').is_pure()
+    assert analyze_code('event.x > x').is_pure(exposed=['event'])
+
+
+def test_analyze_old_attributes():
+    assert analyze_code('x > 1').old_attributes == set()
+    assert analyze_code('x > __old__.x + __old__.y.z').old_attributes == {'x', 'y'}
+    assert analyze_code('x > __old__.x and __old__["y"]').old_attributes is None
+    assert analyze_code('len(__old__) > 0').old_attributes is None
+
+
+def test_compile_function():
+    context = {'x': 1, 'y': [1, 2]}
+    assert compile_function('x + len(y) + event', 'eval')(context, {'event': 1}) == 4
+
+    function = compile_function('x = x + 1\ny.append(x)\nz = 0\nsend(x)', 'exec')
+    sent = []
+    assert function(context, {'send': sent.append}) is None
+    assert context == {'x': 2, 'y': [1, 2, 2], 'z': 0}
+    assert sent == [2]
+
+    assert {'x', 'y'}.isdisjoint(compile_function('(x, y) == (x, y)', 'eval').__code__.co_names)
+
+
+def test_compile_function_not_applicable():
+    function = compile_function('x > len(y)', 'eval')
+    assert function({'x': 1, 'y': []}, {})
+    assert function({'x': 1}, {}) is NOT_APPLICABLE
+    assert function({'x': 1, 'y': [], 'len': len}, {}) is NOT_APPLICABLE
+
+    function = compile_function('active("s")', 'eval')
+    assert function({}, {'active': bool})
+    assert function({}, {}) is NOT_APPLICABLE
+    assert function({'active': bool}, {'active': bool}) is NOT_APPLICABLE
+
+
+@pytest.mark.parametrize('source', ['x += 1', 'del x', 'y = 1\ny += x', 'if False:\n    x = 0\nx *= 2'])
+def test_compile_function_undefined_names(mocker, source):
+    function = compile_function(source, 'exec')
+    assert function({}, {}) is NOT_APPLICABLE
+
+    # Both modes raise the same error
+    causes = []
+    for compile_functions in (False, True):
+        evaluator = code.PythonEvaluator(mocker.MagicMock(), compile_functions=compile_functions)
+        with pytest.raises(CodeEvaluationError) as e:
+            evaluator._execute_code(source)
+        causes.append((type(e.value.__cause__), str(e.value.__cause__)))
+    assert causes[0] == causes[1] and causes[0][0] is NameError
+
+
+@pytest.mark.parametrize('code', [
+    '[x for x in y]', 'lambda: x', 'import os', 'def f(): pass', 'global x', 'locals()',
+    'time = 1', 'try:\n    x\nexcept Exception as e:\n    pass', '__sismic_context__',
+])
+def test_compile_function_unsupported(code):
+    assert compile_function(code, 'exec') is None
+
+
+def test_compile_guards():
+    function = compile_guards(['x > 1', None, 'event == x', 'len(y) == 0'])
+    assert function({'x': 2, 'y': []}, {'event': 2}) == [0, 1, 2, 3]
+    assert function({'x': 0, 'y': [1]}, {'event': 2}) == [1]
+    assert function({'x': 0}, {'event': 2}) is NOT_APPLICABLE
+
+    with pytest.raises(GuardError) as e:
+        function({'x': 2, 'y': None}, {'event': 2})
+    assert e.value.index == 3
+    assert isinstance(e.value.__cause__, TypeError)
+
+    assert compile_guards(['x > 0', '[x for x in y]']) is None
+
+
 class TestPythonEvaluator:
-    @pytest.fixture
-    def evaluator(self, mocker):
+    @pytest.fixture(params=[False, True], ids=['eval', 'functions'])
+    def evaluator(self, mocker, request):
         context = {
             'x': 1,
             'y': 2,
@@ -45,7 +160,7 @@ class TestPythonEvaluator:
         interpreter.statechart = mocker.MagicMock()
         interpreter.configuration = []
 
-        return code.PythonEvaluator(interpreter, initial_context=context)
+        return code.PythonEvaluator(interpreter, initial_context=context, compile_functions=request.param)
 
     @pytest.fixture
     def interpreter(self, evaluator):
@@ -74,12 +189,43 @@ class TestPythonEvaluator:
         assert evaluator.context['a'] == 0
         assert evaluator.context['b'] == 0
 
+    def test_setdefault_is_tracked(self, evaluator):
+        version = evaluator.context.version
+        evaluator._execute_code('setdefault("a", 0)')
+        assert evaluator.context.versions['a'] > version
+
+    def test_execution_is_tracked(self, evaluator):
+        version = evaluator.context.version
+        evaluator._execute_code('z = x.real')
+        assert evaluator.context.versions['x'] > version
+        assert evaluator.context.versions['z'] > version
+        assert evaluator.context.versions['y'] <= version
+
     def test_execution(self, evaluator):
         evaluator._execute_code('a = 1')
         assert evaluator.context['a'] == 1
         evaluator._execute_code('x = 2')
         assert evaluator.context['x'] == 2
 
+    def test_shadowing(self, evaluator):
+        evaluator._execute_code('len = lambda x: 0')
+        assert evaluator._evaluate_code('len([1]) == 0')
+        evaluator._execute_code('time = 1')
+        assert evaluator._evaluate_code('time == 1')
+
+    def test_sent_received(self, evaluator, interpreter):
+        interpreter._sent_event_names = Counter(a=2)
+        transition = Transition('s')
+        transition.postconditions = ['sent("a")', 'sent("b")', 'received("e")', 'received("a")']
+        assert list(evaluator.evaluate_postconditions(transition, Event('e'))) == ['sent("b")', 'received("a")']
+
+    def test_evaluate_guards(self, evaluator):
+        transitions = [Transition('s', guard='x == 1'), Transition('s'), Transition('s', guard='x == 2'),
+                       Transition('s', guard='event.name == "e"')]
+        assert evaluator.evaluate_guards(transitions, Event('e')) == [0, 1, 3]
+        with pytest.raises(CodeEvaluationError, match='event.name'):
+            evaluator.evaluate_guards(transitions, None)
+
     def test_invalid_condition(self, evaluator):
         with pytest.raises(CodeEvaluationError):
             evaluator._evaluate_code('x.y')
@@ -113,3 +259,201 @@ class TestPythonEvaluator:
     @pytest.mark.xfail(reason='http://stackoverflow.com/questions/32894942/listcomp-unable-to-access-locals-defined-in-code-called-by-exec-if-nested-in-fun and possibly fixed with https://bugs.python.org/issue3692')
     def test_access_outer_scope(self, evaluator):
         evaluator._execute_code('d = [x for x in range(10) if x != a]', additional_context={'a': 1})
+
+
+class TestGuardCache:
+    @pytest.fixture
+    def evaluator(self, mocker):
+        interpreter = mocker.MagicMock(name='Interpreter')
+        interpreter.time = 0
+        interpreter.configuration = []
+        interpreter._entry_time = {'s': 0}
+        interpreter._idle_time = {'s': 0}
+
+        evaluator = code.PythonEvaluator(interpreter, initial_context={'x': 1, 'y': 2}, cache_guards=True)
+        mocker.spy(evaluator, '_evaluate_code')
+        return evaluator
+
+    def test_guard_is_cached(self, evaluator):
+        transition = Transition('s', guard='x > 0')
+        assert evaluator.evaluate_guard(transition)
+        assert evaluator.evaluate_guard(transition)
+        assert evaluator._evaluate_code.call_count == 1
+
+    def test_assignment_invalidates(self, evaluator):
+        transition = Transition('s', guard='x > 0')
+        assert evaluator.evaluate_guard(transition)
+
+        evaluator._execute_code('y = 3')
+        assert evaluator.evaluate_guard(transition)
+        assert evaluator._evaluate_code.call_count == 1
+
+        evaluator._execute_code('x = 0')
+        assert not evaluator.evaluate_guard(transition)
+        assert evaluator._evaluate_code.call_count == 2
+
+    def test_setdefault_invalidates(self, evaluator):
+        transition = Transition('s', guard='x == 1')
+        assert evaluator.evaluate_guard(transition)
+
+        evaluator._execute_code('setdefault("x", 2)')
+        assert evaluator.evaluate_guard(transition)
+
+        dict.__delitem__(evaluator.context, 'x')  # Untracked removal
+        evaluator._execute_code('setdefault("x", 2)')
+        assert not evaluator.evaluate_guard(transition)
+
+    def test_direct_mutation_invalidates(self, evaluator):
+        transition = Transition('s', guard='x > 0')
+        assert evaluator.evaluate_guard(transition)
+
+        evaluator.context['x'] = 0
+        assert not evaluator.evaluate_guard(transition)
+
+    def test_mutable_values_are_not_cached(self, evaluator):
+        evaluator.context['items'] = []
+        evaluator.context['point'] = SimpleNamespace(x=0)
+        transition = Transition('s', guard='len(items) > 0')
+        assert not evaluator.evaluate_guard(transition)
+
+        evaluator.context['items'].append(1)
+        assert evaluator.evaluate_guard(transition)
+
+        transition = Transition('s', guard='point.x > 0')
+        assert not evaluator.evaluate_guard(transition)
+        evaluator.context['point'].x = 1
+        assert evaluator.evaluate_guard(transition)
+
+        transition = Transition('s', guard='(x, frozenset([y])) == (1, frozenset([2]))')
+        assert evaluator.evaluate_guard(transition)
+        assert evaluator.evaluate_guard(transition)
+        assert evaluator._evaluate_code.call_count == 5
+
+    def test_event_invalidates(self, evaluator):
+        transition = Transition('s', event='e', guard='event.a == x')
+        event = Event('e', a=1)
+        assert evaluator.evaluate_guard(transition, event)
+        assert evaluator.evaluate_guard(transition, event)
+        assert evaluator._evaluate_code.call_count == 1
+
+        assert not evaluator.evaluate_guard(transition, Event('e', a=2))
+        assert evaluator._evaluate_code.call_count == 2
+
+    @pytest.mark.parametrize('guard', ['after(0)', 'idle(0)', 'time >= 0', 'active("s") or True', 'x.bit_length() == 1'])
+    def test_impure_guards_are_not_cached(self, evaluator, guard):
+        transition = Transition('s', guard=guard)
+        assert evaluator.evaluate_guard(transition)
+        assert evaluator.evaluate_guard(transition)
+        assert evaluator._evaluate_code.call_count == 2
+
+    def test_same_execution(self, microwave):
+        cached = Interpreter(microwave.statechart, evaluator_klass=partial(code.PythonEvaluator, cache_guards=True))
+        for interpreter in (microwave, cached):
+            interpreter.queue('door_opened', 'item_placed', 'door_closed', 'timer_inc', 'timer_inc', 'cooking_start')
+            interpreter.queue(*['timer_tick'] * 5)
+
+        assert [str(s) for s in cached.execute()] == [str(s) for s in microwave.execute()]
+        assert cached.context == microwave.context
+
+
+class TestCompiledFunctions:
+    def test_same_execution(self, microwave):
+        compiled = Interpreter(microwave.statechart, evaluator_klass=partial(code.PythonEvaluator, compile_functions=True))
+        for interpreter in (microwave, compiled):
+            interpreter.queue('door_opened', 'item_placed', 'door_closed', 'timer_inc', 'timer_inc', 'cooking_start')
+            interpreter.queue(*['timer_tick'] * 5)
+
+        assert [str(s) for s in compiled.execute()] == [str(s) for s in microwave.execute()]
+        assert compiled.context == microwave.context
+        assert any(function is not None for function in compiled._evaluator._functions.values())
+
+    def test_same_execution_with_time(self, elevator):
+        compiled = Interpreter(elevator.statechart, evaluator_klass=partial(code.PythonEvaluator, compile_functions=True))
+        traces = []
+        for interpreter in (elevator, compiled):
+            interpreter.queue(Event('floorSelected', floor=4))
+            trace = interpreter.execute()
+            interpreter.clock.time += 20
+            trace.extend(interpreter.execute())
+            traces.append([str(s) for s in trace])
+
+        assert traces[0] == traces[1]
+        assert compiled.context == elevator.context
+
+
+class TestProfiler:
+    @pytest.fixture(params=[False, True], ids=['eval', 'functions'])
+    def profiled(self, request):
+        statechart = import_from_yaml(filepath='docs/examples/elevator/elevator_contract.yaml')
+        profiler = code.Profiler()
+        interpreter = Interpreter(statechart, evaluator_klass=partial(
+            code.PythonEvaluator, profiler=profiler, compile_functions=request.param))
+        interpreter.queue(Event('floorSelected', floor=4))
+        interpreter.execute()
+        interpreter.clock.time += 20
+        interpreter.execute()
+        return interpreter, profiler
+
+    def test_report(self, profiled):
+        interpreter, profiler = profiled
+        report = profiler.report()
+        profiles = {(p.owner, p.kind, p.code): p for p in report}
+
+        assert profiles['Elevator', 'preamble', interpreter.statechart.preamble].calls == 1
+        assert profiles['movingUp', 'on_entry', 'current = current + 1'].calls == 4
+        assert profiles['moving', 'invariant', 'not doors_open'].calls > 0
+        assert profiles['moving', 'precondition', 'destination != current'].calls == 2
+        assert profiles['moving', 'postcondition', 'current != __old__.current'].calls == 2
+        assert profiles['doorsClosed -> None [destination > current] -> movingUp', 'guard', 'destination > current'].calls == 2
+        assert profiles['floorSelecting -> floorSelected [None] -> floorSelecting', 'action',
+                        interpreter.statechart.transitions_from('floorSelecting')[0].action].calls == 1
+
+        for profile in report:
+            assert profile.calls > 0
+            assert 0 <= profile.peak <= profile.total
+            assert profile.mean == pytest.approx(profile.total / profile.calls)
+        assert [p.total for p in report] == sorted((p.total for p in report), reverse=True)
+        assert [p.calls for p in profiler.report(sort='calls')] == sorted((p.calls for p in report), reverse=True)
+
+    def test_format_and_reset(self, profiled):
+        interpreter, profiler = profiled
+        lines = profiler.format(sort='calls', limit=3).splitlines()
+        assert len(lines) == 4
+        assert lines[0].split()[0] == 'calls'
+
+        with pytest.raises(ValueError):
+            profiler.report(sort='unknown')
+
+        profiler.reset()
+        assert profiler.report() == []
+
+    def test_timer(self, mocker):
+        ticks = iter(range(1000))
+        profiler = code.Profiler(timer=lambda: next(ticks))
+        evaluator = code.PythonEvaluator(mocker.MagicMock(), profiler=profiler, initial_context={'x': 1})
+        evaluator._evaluate_code('x > 0')
+        evaluator._execute_code('x = 2')
+
+        assert [(p.owner, p.kind, p.code, p.calls, p.total, p.peak) for p in profiler.report(sort='calls')] == [
+            (None, 'code', 'x = 2', 1, 1, 1), (None, 'code', 'x > 0', 1, 1, 1)]
+
+    def test_failing_code_is_recorded(self, mocker):
+        profiler = code.Profiler()
+        evaluator = code.PythonEvaluator(mocker.MagicMock(), profiler=profiler)
+        with pytest.raises(CodeEvaluationError):
+            evaluator._evaluate_code('1 / 0')
+        assert profiler.report()[0].calls == 1
+
+
+def test_profile_cli(tmpdir, capsys):
+    script = tmpdir.join('script.yaml')
+    script.write('- event: floorSelected\n  parameters:\n    floor: 4\n- wait: 20\n')
+
+    assert profiler_cli(['docs/examples/elevator/elevator_contract.yaml', str(script), '--limit', '5']) == 0
+    assert len(capsys.readouterr().out.splitlines()) == 6
+
+    assert profiler_cli(['docs/examples/elevator/elevator_contract.yaml', str(script), '--json', '--repeat', '2']) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert {'owner': 'movingUp', 'kind': 'on_entry', 'code': 'current = current + 1'}.items() <= \
+        next(p for p in report if p['owner'] == 'movingUp' and p['kind'] == 'on_entry').items()
+    assert next(p for p in report if p['kind'] == 'preamble')['calls'] == 2
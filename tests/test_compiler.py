@@ -0,0 +1,130 @@
+import pytest
+
+from sismic.compiler import CompiledInterpreter, cli, compile_statechart, load_compiled_statechart
+from sismic.exceptions import SismicError
+from sismic.interpreter import Interpreter, hibernate, revive
+from sismic.io import export_to_yaml, import_from_yaml
+from sismic.io.datadict import export_to_dict
+
+
+def run(interpreter, events):
+    trace = []
+    try:
+        for i, event in enumerate(events):
+            interpreter.clock.time = i
+            interpreter.queue(event)
+            for step in interpreter.execute(max_steps=10):
+                trace.append((str(step), interpreter.configuration, dict(interpreter.context)))
+    except SismicError as e:
+        trace.append(type(e))
+    return trace
+
+
+def scenario(statechart):
+    events = statechart.events_for()
+    return (events * 3 + ['unknown']) if events else ['unknown'] * 3
+
+
+def test_generated_module(simple_statechart):
+    source = compile_statechart(simple_statechart)
+    assert 'class SimpleStatechartInterpreter(CompiledInterpreter):' in source
+
+    klass = load_compiled_statechart(source)
+    assert issubclass(klass, CompiledInterpreter)
+    assert klass.__name__ == 'SimpleStatechartInterpreter'
+
+    source = compile_statechart(simple_statechart, class_name='Simple')
+    assert load_compiled_statechart(source).__name__ == 'Simple'
+
+
+def test_statechart_is_rebuilt(example_from_docs):
+    klass = load_compiled_statechart(compile_statechart(example_from_docs))
+    statechart = klass.build_statechart()
+
+    assert export_to_dict(statechart) == export_to_dict(example_from_docs)
+    assert statechart.transitions == example_from_docs.transitions
+    for name in statechart.states:
+        assert statechart.children_for(name) == example_from_docs.children_for(name)
+
+
+def test_same_trace_for_tests(example_from_tests):
+    klass = load_compiled_statechart(compile_statechart(example_from_tests))
+    events = scenario(example_from_tests)
+
+    assert run(klass(), events) == run(Interpreter(example_from_tests), events)
+
+
+def test_same_trace_for_docs(example_from_docs):
+    klass = load_compiled_statechart(compile_statechart(example_from_docs))
+    events = scenario(example_from_docs)
+
+    assert run(klass(), events) == run(Interpreter(example_from_docs), events)
+
+
+def test_same_trace_for_elevator(elevator):
+    klass = load_compiled_statechart(compile_statechart(elevator.statechart))
+    compiled = klass()
+
+    for interpreter in (elevator, compiled):
+        interpreter.queue('floorSelected', floor=4)
+        interpreter.clock.time = 10
+        interpreter.queue('floorSelected', floor=1)
+
+    assert [str(step) for step in compiled.execute()] == [str(step) for step in elevator.execute()]
+    assert compiled.context == elevator.context
+
+
+def test_dispatch_methods(elevator):
+    klass = load_compiled_statechart(compile_statechart(elevator.statechart))
+    assert set(klass.DISPATCH) == {None, 'floorSelected'}
+    for name in klass.DISPATCH.values():
+        assert callable(getattr(klass, name))
+
+    compiled = klass()
+    assert compiled._evaluator.compile_functions
+    assert compiled.statechart is klass().statechart
+
+
+def test_given_statechart(elevator):
+    klass = load_compiled_statechart(compile_statechart(elevator.statechart))
+
+    # Transitions can be defined in another order
+    statechart = import_from_yaml(export_to_yaml(elevator.statechart))
+    transitions = statechart.transitions
+    for transition in transitions:
+        statechart.remove_transition(transition)
+    for transition in reversed(transitions):
+        statechart.add_transition(transition)
+
+    compiled = klass(statechart)
+    assert compiled.statechart is statechart
+    for interpreter in (elevator, compiled):
+        interpreter.queue('floorSelected', floor=4)
+        interpreter.clock.time = 10
+    assert [str(step) for step in compiled.execute()] == [str(step) for step in elevator.execute()]
+    assert all(transition in transitions for group in compiled._groups for transition in group)
+
+    statechart = import_from_yaml(export_to_yaml(elevator.statechart))
+    statechart.remove_transition(statechart.transitions[0])
+    with pytest.raises(ValueError, match='is not the one compiled'):
+        klass(statechart)
+
+
+def test_revive(elevator):
+    klass = load_compiled_statechart(compile_statechart(elevator.statechart))
+    compiled = klass(elevator.statechart)
+    compiled.queue('floorSelected', floor=4).execute_once()
+
+    revived = revive(hibernate(compiled), elevator.statechart, interpreter_klass=klass)
+    assert isinstance(revived, klass)
+    assert revived.configuration == compiled.configuration
+    assert [str(step) for step in revived.execute()] == [str(step) for step in compiled.execute()]
+
+
+def test_cli(tmpdir, capsys):
+    output = tmpdir.join('elevator.py')
+    assert cli(['docs/examples/elevator/elevator.yaml', '--class-name', 'Elevator', '-o', str(output)]) == 0
+    assert 'class Elevator(CompiledInterpreter)' in output.read()
+
+    assert cli(['docs/examples/elevator/elevator.yaml']) == 0
+    assert 'class ElevatorInterpreter(CompiledInterpreter)' in capsys.readouterr().out
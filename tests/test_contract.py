@@ -1,8 +1,14 @@
+import random
+
 import pytest
 
+from functools import partial
+
+from sismic.code import PythonEvaluator
 from sismic.exceptions import (InvariantError, PostconditionError,
                                PreconditionError)
-from sismic.interpreter import Interpreter, Event
+from sismic.interpreter import AsyncContractChecker, ContractPolicy, Interpreter, Event
+from sismic.io import import_from_yaml
 from sismic.model import StateMixin, Transition
 
 
@@ -71,3 +77,353 @@ def test_do_not_raise(elevator):
     transitions[0].postconditions.append('False')
 
     elevator.queue('floorSelected', floor=4).execute()
+
+
+class TestIncrementalInvariants:
+    @pytest.fixture()
+    def statechart(self):
+        statechart = import_from_yaml("""
+        statechart:
+          name: incremental invariants
+          preamble: |
+            x = 0
+            y = 0
+            items = []
+          root state:
+            name: root
+            initial: s1
+            contract:
+              - always: x >= 0
+              - always: len(items) < 2
+            states:
+            - name: s1
+              contract:
+                - always: y >= 0
+                - always: time >= 0
+              transitions:
+              - event: incx
+                action: x += 1
+              - event: incy
+                action: y += 1
+              - event: append
+                action: items.append(1)
+        """)
+        return statechart
+
+    @pytest.fixture()
+    def evaluated(self, mocker):
+        return mocker.spy(PythonEvaluator, '_evaluate_code')
+
+    def conditions(self, evaluated):
+        conditions = [call[0][1] for call in evaluated.call_args_list]
+        evaluated.reset_mock()
+        return conditions
+
+    def interpreter(self, statechart):
+        return Interpreter(statechart, evaluator_klass=partial(PythonEvaluator, incremental_invariants=True))
+
+    def test_invariants_are_checked_on_entry(self, statechart, evaluated):
+        interpreter = self.interpreter(statechart)
+        interpreter.execute_once()
+        assert sorted(self.conditions(evaluated)) == sorted(['x >= 0', 'len(items) < 2', 'y >= 0', 'time >= 0'])
+
+    def test_unchanged_invariants_are_skipped(self, statechart, evaluated):
+        interpreter = self.interpreter(statechart)
+        interpreter.execute()
+        self.conditions(evaluated)
+
+        # Invariants that read a mutable value are always evaluated
+        interpreter.execute_once()
+        assert sorted(self.conditions(evaluated)) == ['len(items) < 2', 'time >= 0']
+
+        interpreter.queue('incy').execute_once()
+        assert sorted(self.conditions(evaluated)) == ['len(items) < 2', 'time >= 0', 'y >= 0']
+
+        interpreter.queue('incx').execute_once()
+        assert sorted(self.conditions(evaluated)) == ['len(items) < 2', 'time >= 0', 'x >= 0']
+
+    def test_direct_context_modification(self, statechart, evaluated):
+        interpreter = self.interpreter(statechart)
+        interpreter.execute()
+        self.conditions(evaluated)
+
+        interpreter.context['x'] = -1
+        with pytest.raises(InvariantError) as e:
+            interpreter.execute_once()
+        assert e.value.condition == 'x >= 0'
+
+    def test_in_place_modification(self, statechart):
+        interpreter = self.interpreter(statechart)
+        interpreter.execute()
+
+        interpreter.context['items'].extend([1, 2])
+        with pytest.raises(InvariantError) as e:
+            interpreter.execute_once()
+        assert e.value.condition == 'len(items) < 2'
+
+    def test_violation_is_detected(self, statechart):
+        interpreter = self.interpreter(statechart)
+        interpreter.queue('append', 'append')
+
+        with pytest.raises(InvariantError) as e:
+            interpreter.execute()
+        assert e.value.condition == 'len(items) < 2'
+
+    def test_full_checks(self, statechart, evaluated):
+        interpreter = Interpreter(statechart)
+        interpreter.execute()
+        self.conditions(evaluated)
+
+        interpreter.execute_once()
+        assert len(self.conditions(evaluated)) == 4
+
+
+class TestOldSnapshots:
+    @pytest.fixture()
+    def interpreter(self):
+        statechart = import_from_yaml("""
+        statechart:
+          name: selective old
+          preamble: |
+            x = 0
+            y = []
+          root state:
+            name: root
+            initial: s1
+            states:
+            - name: s1
+              transitions:
+              - target: s2
+                event: next
+                action: x += 1
+                contract:
+                  - after: x == __old__.x + 1
+            - name: s2
+              contract:
+                - always: x > 0
+        """)
+        interpreter = Interpreter(statechart)
+        interpreter.execute()
+        return interpreter
+
+    def test_only_referenced_variables_are_copied(self, interpreter):
+        transition = interpreter.statechart.transitions_from('s1')[0]
+        interpreter.queue('next').execute()
+
+        memory = interpreter._evaluator._memory
+        assert dict(memory[id(transition)]) == {'x': 0}
+        assert id(interpreter.statechart.state_for('s2')) not in memory
+
+    def test_whole_context_is_copied_if_required(self, interpreter):
+        transition = interpreter.statechart.transitions_from('s1')[0]
+        transition.postconditions.append('len(__old__) > 0')
+        interpreter.queue('next').execute()
+
+        assert set(interpreter._evaluator._memory[id(transition)]) == {'x', 'y'}
+
+    def test_failing_postcondition(self, interpreter):
+        transition = interpreter.statechart.transitions_from('s1')[0]
+        transition.postconditions.append('y != __old__.y')
+
+        with pytest.raises(PostconditionError):
+            interpreter.queue('next').execute()
+
+
+class TestContractPolicy:
+    @pytest.fixture()
+    def statechart(self):
+        return import_from_yaml("""
+        statechart:
+          name: sampled contracts
+          preamble: x = 0
+          root state:
+            name: root
+            initial: s
+            states:
+            - name: s
+              contract:
+                - always: x >= 0
+              transitions:
+              - target: s
+                event: next
+                action: x += 1
+                contract:
+                  - before: x >= 0
+                  - after: x == __old__.x + 1
+        """)
+
+    def test_default(self, statechart):
+        policy = ContractPolicy()
+        interpreter = Interpreter(statechart, contract_policy=policy)
+        interpreter.queue(*['next'] * 4).execute(max_steps=5)
+
+        assert policy.checked_steps == 5
+        assert policy.skipped_steps == 0
+        assert policy.checked == {'preconditions': 4, 'postconditions': 4, 'invariants': 5}
+        assert sum(policy.skipped.values()) == 0
+
+    def test_every(self, statechart):
+        policy = ContractPolicy(every=2)
+        interpreter = Interpreter(statechart, contract_policy=policy)
+        interpreter.queue(*['next'] * 5).execute(max_steps=6)
+
+        assert (policy.checked_steps, policy.skipped_steps) == (3, 3)
+        assert policy.checked['postconditions'] == 2
+        assert policy.skipped['postconditions'] == 3
+
+    def test_skipped_violation(self, statechart):
+        statechart.state_for('s').invariants.append('x < 1')
+        interpreter = Interpreter(statechart, contract_policy=ContractPolicy(probability=0))
+        interpreter.queue('next', 'next').execute()
+        assert interpreter.context['x'] == 2
+
+        interpreter = Interpreter(statechart, contract_policy=ContractPolicy(every=2))
+        with pytest.raises(InvariantError):
+            interpreter.queue('next', 'next').execute()
+
+    def test_old_with_skipped_preconditions(self, statechart):
+        # Preconditions of a skipped step are not evaluated, but __old__ is still defined for the next steps
+        statechart.transitions_from('s')[0].preconditions.append('False')
+        interpreter = Interpreter(statechart, contract_policy=ContractPolicy(every=2))
+        interpreter.execute_once()
+        interpreter.queue('next').execute_once()
+
+        assert interpreter.context['x'] == 1
+
+    def test_probability(self, statechart):
+        policy = ContractPolicy(probability=0.5, rng=random.Random(42))
+        interpreter = Interpreter(statechart, contract_policy=policy)
+        interpreter.queue(*['next'] * 99).execute(max_steps=100)
+
+        assert policy.checked_steps + policy.skipped_steps == 100
+        assert 25 < policy.checked_steps < 75
+
+    def test_time_budget(self, statechart):
+        policy = ContractPolicy(time_budget=0)
+        interpreter = Interpreter(statechart, contract_policy=policy)
+        interpreter.queue('next').execute(max_steps=2)
+
+        assert sum(policy.checked.values()) == 0
+        assert policy.skipped == {'preconditions': 1, 'postconditions': 1, 'invariants': 2}
+
+    def test_invalid_parameters(self):
+        with pytest.raises(ValueError):
+            ContractPolicy(every=0)
+        with pytest.raises(ValueError):
+            ContractPolicy(probability=2)
+
+
+class TestAsyncContractChecker:
+    @pytest.fixture()
+    def checker(self):
+        checker = AsyncContractChecker()
+        yield checker
+        checker.stop()
+
+    def test_no_error(self, elevator, checker):
+        interpreter = Interpreter(elevator.statechart, contract_checker=checker)
+        interpreter.queue('floorSelected', floor=4).execute()
+        checker.wait()
+
+        assert checker.checked > 0 or len(elevator.statechart.state_for('movingUp').preconditions) == 0
+        assert checker.errors.empty()
+
+    def test_violation_is_not_raised(self, elevator, checker):
+        elevator.statechart.state_for('movingUp').preconditions.append('current > destination')
+        interpreter = Interpreter(elevator.statechart, contract_checker=checker)
+        interpreter.queue('floorSelected', floor=4).execute()
+        assert interpreter.context['current'] == 4
+
+        checker.wait()
+        errors = [checker.errors.get_nowait() for _ in range(checker.errors.qsize())]
+        assert len(errors) == 4  # Once per floor
+        assert all(isinstance(error, PreconditionError) for error in errors)
+        assert all(error.condition == 'current > destination' for error in errors)
+        assert [error.context['current'] for error in errors] == [0, 1, 2, 3]
+        assert 'movingUp' not in errors[0].configuration
+
+    def test_callback(self, elevator):
+        errors = []
+        checker = AsyncContractChecker(errors.append)
+        elevator.statechart.state_for('movingUp').invariants.append('current == 0')
+        interpreter = Interpreter(elevator.statechart, contract_checker=checker)
+        interpreter.queue('floorSelected', floor=4).execute()
+        checker.stop()
+
+        assert not checker.running
+        assert len(errors) > 0
+        assert all(isinstance(error, InvariantError) for error in errors)
+
+    def test_old(self, checker):
+        statechart = import_from_yaml("""
+        statechart:
+          name: async old
+          preamble: x = 0
+          root state:
+            name: root
+            initial: s
+            states:
+            - name: s
+              transitions:
+              - target: s
+                event: next
+                action: x += 1
+                contract:
+                  - after: x == __old__.x + 1
+                  - after: x == __old__.x
+        """)
+        interpreter = Interpreter(statechart, contract_checker=checker)
+        interpreter.queue('next', 'next').execute()
+        checker.wait()
+
+        errors = [checker.errors.get_nowait() for _ in range(checker.errors.qsize())]
+        assert [error.condition for error in errors] == ['x == __old__.x'] * 2
+        assert [error.context['x'] for error in errors] == [1, 2]
+
+    def test_shared_snapshots(self, mocker):
+        statechart = import_from_yaml("""
+        statechart:
+          name: shared snapshots
+          preamble: x = 0
+          root state:
+            name: root
+            initial: p
+            contract:
+              - always: x >= 0
+            states:
+            - name: p
+              parallel states:
+              - name: a
+                contract:
+                  - always: x < 10
+                transitions:
+                - event: next
+                  action: x += 1
+              - name: b
+                contract:
+                  - always: x != 2
+        """)
+        evaluators = []
+
+        def evaluator_klass(*args, **kwargs):
+            evaluators.append(PythonEvaluator(*args, **kwargs))
+            return evaluators[-1]
+
+        checker = AsyncContractChecker(evaluator_klass=evaluator_klass)
+        interpreter = Interpreter(statechart, contract_checker=checker)
+        interpreter.execute()
+        checker.wait()
+        check = mocker.spy(checker, '_check')
+        created = len(evaluators)
+
+        interpreter.queue('next', 'next').execute()
+        checker.stop()
+
+        # The invariants of the three states are checked on a single snapshot per call to execute_once
+        snapshots = [call[0][0] for call in check.call_args_list if call[0][4] == 'invariants']
+        assert len(snapshots) == 9 and len({id(snapshot) for snapshot in snapshots}) == 3
+        assert len(evaluators) - created == 3
+        assert evaluators[-1]._evaluable_code is evaluators[0]._evaluable_code
+
+        errors = [checker.errors.get_nowait() for _ in range(checker.errors.qsize())]
+        assert [(error.condition, error.context['x']) for error in errors] == [('x != 2', 2)] * 2
@@ -0,0 +1,66 @@
+import pytest
+
+from sismic.generator import generate_events, generate_statechart
+from sismic.interpreter import Interpreter
+from sismic.io import export_to_yaml
+from sismic.model import DeepHistoryState, OrthogonalState, ShallowHistoryState
+
+
+def test_shape():
+    statechart = generate_statechart(depth=4, width=3, regions=5, transitions=100, events=7)
+
+    assert isinstance(statechart.state_for('root'), OrthogonalState)
+    assert statechart.children_for('root') == ['r{}'.format(i) for i in range(5)]
+    assert len(statechart.states) == 1 + 5 * (1 + 4 * 3)
+    assert statechart.depth_for('r0_4_2') == 6
+    assert len(statechart.transitions) == 100
+    assert set(statechart.events_for()) <= {'e{}'.format(i) for i in range(7)}
+    assert all(t.guard is None and t.action is None for t in statechart.transitions)
+
+
+def test_transitions_stay_in_their_region():
+    statechart = generate_statechart(regions=10, transitions=200)
+    for transition in statechart.transitions:
+        region = transition.source.split('_')[0]
+        assert transition.target.split('_')[0] == region
+
+
+def test_guards_actions_and_history():
+    statechart = generate_statechart(depth=5, transitions=50, guards=1, actions=1, history=1)
+
+    assert all(t.guard is not None and t.action == 'x += 1' for t in statechart.transitions)
+    histories = [statechart.state_for('r0_{}_h'.format(level)) for level in range(1, 6)]
+    assert all(isinstance(state, (ShallowHistoryState, DeepHistoryState)) for state in histories)
+
+
+def test_determinism():
+    parameters = dict(depth=3, regions=2, transitions=50, guards=0.5, actions=0.5, history=0.5)
+    assert export_to_yaml(generate_statechart(**parameters)) == export_to_yaml(generate_statechart(**parameters))
+    assert export_to_yaml(generate_statechart(**parameters)) != export_to_yaml(generate_statechart(seed=1, **parameters))
+
+    statechart = generate_statechart(**parameters)
+    assert generate_events(statechart, 10) == generate_events(statechart, 10)
+    assert generate_events(statechart, 10) != generate_events(statechart, 10, seed=1)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_execution(seed):
+    statechart = generate_statechart(depth=4, regions=3, transitions=100, guards=0.5, actions=0.5, history=0.5,
+                                     seed=seed)
+    interpreter = Interpreter(statechart)
+    interpreter.execute()
+
+    for event in generate_events(statechart, 50, seed=seed):
+        interpreter.queue(event)
+    assert len(interpreter.execute()) == 50
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        generate_statechart(depth=0)
+    with pytest.raises(ValueError):
+        generate_statechart(transitions=-1)
+    with pytest.raises(ValueError):
+        generate_statechart(guards=2)
+    with pytest.raises(ValueError):
+        generate_events(generate_statechart(transitions=0), 10)
@@ -1,13 +1,30 @@
+import gc
+import io
+import json
+import os
 import pytest
 import pickle
-
-from collections import Counter
-
-from sismic.exceptions import ExecutionError, NonDeterminismError, ConflictingTransitionsError
-from sismic.code import DummyEvaluator
-from sismic.interpreter import Interpreter, Event, InternalEvent
-from sismic.helpers import coverage_from_trace, log_trace, run_in_background
-from sismic.model import Transition, MacroStep, MicroStep, MetaEvent
+import weakref
+
+from collections import Counter, OrderedDict
+from functools import partial
+
+from sismic.exceptions import (CodeEvaluationError, ExecutionError, NonDeterminismError, ConflictingTransitionsError,
+                               InvariantError, PropertyStatechartError, SismicError)
+from sismic.code import CompactPythonEvaluator, DummyEvaluator, PythonEvaluator
+from sismic.interpreter import (ChromeTracer, CompactInterpreter, Histogram, Interpreter, InterpreterMetrics,
+                                InterpreterRegistry, Event, InternalEvent, hibernate, memory_footprint, revive,
+                                statechart_fingerprint, DirectoryStore, MemoryStore, SessionManager, SqliteStore,
+                                WriteAheadLog, EventRecorder, replay, BinaryTraceReader, BinaryTraceWriter,
+                                MacroStepView, CoverageCollector)
+from sismic.interpreter.recording import cli as replay_cli
+from sismic.clock import SimulatedClock
+from sismic.interpreter.memory import _instance_dict
+from sismic.generator import generate_events, generate_statechart
+from sismic.io import export_to_yaml, import_from_yaml
+from sismic.helpers import BoundedTrace, coverage_from_trace, log_trace, run_in_background
+from sismic.model import (BasicState, CompoundState, InternalEvent, MacroStep, MetaEvent, MicroStep, Statechart,
+                          Transition)
 from sismic import testing
 
 
@@ -97,6 +114,16 @@ class TestInterpreterWithInternal:
 
         assert step.event.name == 'next'
 
+    def test_sent_event_names(self, internal_statechart):
+        interpreter = Interpreter(internal_statechart)
+        interpreter.execute_once()
+        assert interpreter._sent_event_names == Counter(next=1)
+        assert interpreter._evaluator._sent('next')
+
+        interpreter.execute_once()
+        assert interpreter._sent_event_names == Counter()
+        assert not interpreter._evaluator._sent('next')
+
     def test_internal_before_external(self, interpreter):
         assert interpreter.queue('not_next').execute_once().event.name == 'next'
 
@@ -155,9 +182,9 @@ class TestInterpreterWithFinal:
 
 
 class TestInterpreterWithNonDeterministic:
-    @pytest.fixture()
-    def interpreter(self, nondeterministic_statechart):
-        interpreter = Interpreter(nondeterministic_statechart, evaluator_klass=DummyEvaluator)
+    @pytest.fixture(params=[DummyEvaluator, partial(PythonEvaluator, compile_functions=True)], ids=['dummy', 'fused'])
+    def interpreter(self, nondeterministic_statechart, request):
+        interpreter = Interpreter(nondeterministic_statechart, evaluator_klass=request.param)
 
         # Stabilization
         interpreter.execute_once()
@@ -169,6 +196,37 @@ class TestInterpreterWithNonDeterministic:
             interpreter.execute_once()
 
 
+class TestTrustedInterpreter:
+    def test_nondeterminism(self, nondeterministic_statechart):
+        interpreter = Interpreter(nondeterministic_statechart, evaluator_klass=DummyEvaluator, trusted=True)
+        interpreter.execute_once()
+        step = interpreter.execute_once()
+        assert [t.target for t in step.transitions] == ['s2']
+
+    def test_conflicting_transitions(self, parallel_statechart):
+        interpreter = Interpreter(parallel_statechart, evaluator_klass=DummyEvaluator, trusted=True)
+        transitions = [t for t in parallel_statechart.transitions if t.event == 'conflict1']
+        assert len(interpreter._sort_transitions(transitions)) == 2
+
+    @pytest.mark.parametrize('compile_functions', [False, True])
+    def test_first_enabled_transition(self, compile_functions, mocker):
+        statechart = Statechart('dispatch', preamble='x = 1')
+        statechart.add_state(CompoundState('root', initial='s'), None)
+        for name in ['s', 't1', 't2', 't3']:
+            statechart.add_state(BasicState(name), 'root')
+        statechart.add_transition(Transition('s', 't1', event='e', guard='x == 0'))
+        statechart.add_transition(Transition('s', 't2', event='e', guard='x == 1'))
+        statechart.add_transition(Transition('s', 't3', event='e', guard='x.y'))
+
+        interpreter = Interpreter(statechart, trusted=True,
+                                  evaluator_klass=partial(PythonEvaluator, compile_functions=compile_functions))
+        mocker.spy(interpreter._evaluator, '_evaluate_code')
+        interpreter.execute_once()
+        interpreter.queue('e').execute_once()
+        assert interpreter.configuration == ['root', 't2']
+        assert all(call[0][0] != 'x.y' for call in interpreter._evaluator._evaluate_code.call_args_list)
+
+
 class TestInterpreterWithHistory:
     @pytest.fixture()
     def interpreter(self, history_statechart):
@@ -432,9 +490,9 @@ class TestInterpreterWithNestedParallel:
 
 
 class TestTransitionPriority:
-    @pytest.fixture()
-    def interpreter(self, priority_statechart):
-        interpreter = Interpreter(priority_statechart, evaluator_klass=DummyEvaluator)
+    @pytest.fixture(params=[DummyEvaluator, partial(PythonEvaluator, compile_functions=True)], ids=['dummy', 'fused'])
+    def interpreter(self, priority_statechart, request):
+        interpreter = Interpreter(priority_statechart, evaluator_klass=request.param)
         interpreter.execute_once()
         assert interpreter.configuration == ['root', 'a']
         return interpreter
@@ -472,6 +530,936 @@ class TestTransitionPriority:
         assert interpreter.configuration == ['root', 'c']
 
 
+@pytest.mark.parametrize('compile_functions', [False, True])
+class TestGuardsByGroup:
+    @pytest.fixture()
+    def interpreter(self, compile_functions):
+        statechart = Statechart('dispatch', preamble='x = 0')
+        statechart.add_state(CompoundState('root', initial='s'), None)
+        for name in ['s', 'high', 'normal1', 'normal2', 'low']:
+            statechart.add_state(BasicState(name), 'root')
+
+        statechart.add_transition(Transition('s', 'high', event='e', guard='x > 1', priority=1))
+        statechart.add_transition(Transition('s', 'normal1', event='e', guard='x == 1 and event.a'))
+        statechart.add_transition(Transition('s', 'normal2', event='e', guard='x == 1 and active("s")'))
+        statechart.add_transition(Transition('s', 'low', event='e', guard='x.y', priority=-1))
+
+        interpreter = Interpreter(statechart, evaluator_klass=partial(PythonEvaluator, compile_functions=compile_functions))
+        interpreter.execute_once()
+        return interpreter
+
+    def test_priority(self, interpreter):
+        interpreter.context['x'] = 2
+        interpreter.queue('e', a=True).execute_once()
+        assert interpreter.configuration == ['root', 'high']
+
+    def test_single(self, interpreter):
+        interpreter.context['x'] = 1
+        interpreter.queue('e', a=False).execute_once()
+        assert interpreter.configuration == ['root', 'normal2']
+
+    def test_nondeterminism(self, interpreter):
+        interpreter.context['x'] = 1
+        with pytest.raises(NonDeterminismError):
+            interpreter.queue('e', a=True).execute_once()
+
+    def test_error(self, interpreter):
+        with pytest.raises(CodeEvaluationError, match='x.y'):
+            interpreter.queue('e', a=True).execute_once()
+
+    def test_evaluated_once_by_group(self, interpreter, mocker, compile_functions):
+        mocker.spy(interpreter._evaluator, 'evaluate_guard')
+        interpreter.context['x'] = 2
+        interpreter.queue('e', a=True).execute_once()
+        assert interpreter._evaluator.evaluate_guard.call_count == (0 if compile_functions else 1)
+
+
+class TestInterpreterMetrics:
+    @pytest.fixture()
+    def metrics(self):
+        return InterpreterMetrics()
+
+    def test_counters(self, simple_statechart, metrics):
+        interpreter = Interpreter(simple_statechart, evaluator_klass=DummyEvaluator, metrics=metrics)
+        assert interpreter.metrics is metrics
+
+        interpreter.execute()
+        interpreter.queue('goto s2', 'unknown', 'goto s1')
+        interpreter.execute()
+
+        assert {name: value for name, value in metrics.as_dict().items() if name != 'latency'} == {
+            'macro_steps': 5, 'micro_steps': 6, 'stabilization_steps': 1,
+            'events_consumed': 3, 'events_discarded': 1,
+            'transitions_considered': 3, 'transitions_fired': 3, 'guards_evaluated': 0,
+            'internal_queue_depth': 0, 'external_queue_depth': 0,
+            'max_internal_queue_depth': 0, 'max_external_queue_depth': 3, 'errors': 0,
+        }
+        assert metrics.latency.count == 7  # Including the calls that returned None
+        assert sum(metrics.latency.counts) == 7
+
+        metrics.reset()
+        assert metrics.macro_steps == metrics.max_external_queue_depth == metrics.latency.count == 0
+
+    @pytest.mark.parametrize('trusted', [False, True])
+    def test_guards(self, metrics, trusted):
+        statechart = Statechart('guards', preamble='x = 1')
+        statechart.add_state(CompoundState('root', initial='s'), None)
+        for name in ['s', 'high', 'normal1', 'normal2']:
+            statechart.add_state(BasicState(name), 'root')
+        statechart.add_transition(Transition('s', 'high', event='e', guard='x > 1', priority=1))
+        statechart.add_transition(Transition('s', 'normal1', event='e', guard='x == 1'))
+        statechart.add_transition(Transition('s', 'normal2', event='e', guard='x == 2'))
+
+        interpreter = Interpreter(statechart, metrics=metrics, trusted=trusted)
+        interpreter.queue('e').execute()
+
+        assert interpreter.configuration == ['root', 'normal1']
+        assert metrics.transitions_considered == 3
+        assert metrics.guards_evaluated == (2 if trusted else 3)
+        assert metrics.transitions_fired == 1
+
+    def test_errors(self, metrics):
+        statechart = Statechart('errors')
+        statechart.add_state(CompoundState('root', initial='s'), None)
+        statechart.add_state(BasicState('s'), 'root')
+        statechart.add_transition(Transition('s', None, event='e', action='1 / 0'))
+
+        interpreter = Interpreter(statechart, metrics=metrics)
+        interpreter.execute()
+        with pytest.raises(CodeEvaluationError):
+            interpreter.queue('e').execute()
+
+        assert metrics.errors == 1
+        assert metrics.latency.count == 3  # Including the call that raised
+
+    def test_histogram(self):
+        histogram = Histogram([1, 2, 5])
+        for value in [0.5, 1, 1.5, 3, 4, 10]:
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 1, 2, 1]
+        assert (histogram.count, histogram.sum, histogram.max) == (6, 20, 10)
+        assert histogram.quantile(0) == 1
+        assert histogram.quantile(0.5) == 2
+        assert histogram.quantile(0.8) == 5
+        assert histogram.quantile(1) == 10
+        assert histogram.as_dict()['counts'] == [2, 1, 2, 1]
+
+        with pytest.raises(ValueError):
+            Histogram([2, 1])
+        with pytest.raises(ValueError):
+            histogram.quantile(2)
+
+
+class TestChromeTracer:
+    @pytest.fixture()
+    def interpreter(self, elevator):
+        elevator.bind_property_statechart(
+            import_from_yaml(filepath='docs/examples/elevator/tester_elevator_7th_floor_never_reached.yaml'))
+        return elevator
+
+    def run(self, interpreter):
+        interpreter.queue('floorSelected', floor=4).execute()
+        interpreter.clock.time += 20
+        interpreter.execute()
+
+    def test_spans(self, interpreter):
+        tracer = ChromeTracer()
+        tracer.attach(interpreter)
+        self.run(interpreter)
+
+        categories = Counter(event['cat'] for event in tracer.events)
+        assert set(categories) == {'macro step', 'micro step', 'action', 'guard'}
+        assert tracer.sampled_steps > 0 and tracer.skipped_steps == 0
+
+        names = [event['name'] for event in tracer.events]
+        assert 'Elevator: floorSelected' in names
+        assert 'on entry movingUp' in names
+        assert any(name.startswith('Test that the elevator never reachs 7th floor') for name in names)
+
+        # Spans are nested in the macro step of the elevator that contains them
+        macro_steps = [e for e in tracer.events if e['cat'] == 'macro step' and e['args']['statechart'] == 'Elevator']
+        for event in tracer.events:
+            assert event['ph'] == 'X' and event['dur'] >= 0
+            assert any(m['ts'] <= event['ts'] and event['ts'] + event['dur'] <= m['ts'] + m['dur']
+                       for m in macro_steps)
+
+    def test_export(self, interpreter, tmpdir):
+        tracer = ChromeTracer()
+        tracer.attach(interpreter)
+        self.run(interpreter)
+
+        filepath = str(tmpdir.join('trace.json'))
+        output = tracer.export(filepath=filepath)
+        with open(filepath) as f:
+            assert f.read() == output
+
+        trace = json.loads(output)
+        assert trace['traceEvents'] == json.loads(json.dumps(tracer.events, default=str))
+        assert trace['otherData']['sampled steps'] == tracer.sampled_steps
+
+        tracer.clear()
+        assert tracer.events == [] and tracer.sampled_steps == 0
+
+    def test_sampling(self, interpreter):
+        tracer = ChromeTracer(every=2, max_events=10)
+        tracer.attach(interpreter)
+        self.run(interpreter)
+
+        assert tracer.sampled_steps == tracer.skipped_steps or tracer.sampled_steps == tracer.skipped_steps + 1
+        assert len(tracer.events) == 10
+        assert tracer.dropped_events > 0
+
+        tracer = ChromeTracer(probability=0)
+        tracer.attach(interpreter)
+        self.run(interpreter)
+        assert tracer.events == []
+        assert tracer.sampled_steps == 0 and tracer.skipped_steps > 0
+
+        with pytest.raises(ValueError):
+            ChromeTracer(every=0)
+        with pytest.raises(ValueError):
+            ChromeTracer(probability=2)
+
+    def test_detach(self, interpreter):
+        tracer = ChromeTracer()
+        tracer.attach(interpreter)
+        with pytest.raises(ValueError):
+            tracer.attach(interpreter)
+
+        tracer.detach(interpreter)
+        assert 'execute_once' not in interpreter.__dict__
+        assert 'execute_on_entry' not in interpreter._evaluator.__dict__
+        self.run(interpreter)
+        assert tracer.events == []
+
+    def test_detach_stacked(self, interpreter):
+        first, second = ChromeTracer(), ChromeTracer()
+        first.attach(interpreter)
+        second.attach(interpreter)
+        with pytest.raises(ValueError):
+            first.detach(interpreter)
+
+        second.detach(interpreter)
+        self.run(interpreter)
+        assert len(first.events) > 0 and second.events == []
+
+        first.detach(interpreter)
+        assert 'execute_once' not in interpreter.__dict__
+
+
+class TestCompactInterpreter:
+    def run(self, interpreter, events):
+        trace = []
+        try:
+            for event in [None] + events:
+                if event is not None:
+                    interpreter.queue(event)
+                for step in interpreter.execute(max_steps=10):
+                    trace.append((str(step), interpreter.configuration, dict(interpreter.context)))
+        except SismicError as e:
+            trace.append(type(e))
+        return trace
+
+    def test_same_execution(self, example_from_docs):
+        events = example_from_docs.events_for() * 3
+        expected = self.run(Interpreter(example_from_docs), events)
+        assert self.run(CompactInterpreter(example_from_docs), events) == expected
+
+    @pytest.mark.parametrize('options', [dict(compile_functions=True), dict(cache_guards=True),
+                                         dict(incremental_invariants=True)])
+    def test_evaluator_options(self, elevator, options):
+        events = [Event('floorSelected', floor=floor) for floor in (4, 1, 6, 0)]
+        expected = self.run(Interpreter(elevator.statechart, evaluator_klass=partial(PythonEvaluator, **options)), events)
+        compact = CompactInterpreter(elevator.statechart, evaluator_klass=partial(CompactPythonEvaluator, **options))
+        assert self.run(compact, events) == expected
+
+    def test_history(self, history_statechart):
+        interpreter = CompactInterpreter(history_statechart)
+        assert interpreter._lazy_memory is None
+
+        interpreter.queue('next', 'pause', 'continue').execute()
+        assert interpreter.configuration == ['root', 'loop', 's2']
+        assert interpreter._memory == {'loop.H': ['s2']}
+
+    def test_slots(self, microwave):
+        interpreter = CompactInterpreter(microwave.statechart)
+        interpreter.queue('door_opened', 'item_placed', 'door_closed').execute()
+
+        assert isinstance(interpreter._evaluator, CompactPythonEvaluator)
+        assert _instance_dict(interpreter) is None
+        assert _instance_dict(interpreter._evaluator) is None
+
+    def test_wrapped_methods(self, microwave):
+        # Methods are wrapped in the __dict__ inherited from Interpreter and PythonEvaluator
+        interpreter = CompactInterpreter(microwave.statechart)
+        trace = BoundedTrace(interpreter)
+        collector = CoverageCollector(microwave.statechart)
+        collector.attach(interpreter)
+        interpreter.queue('door_opened', 'item_placed', 'door_closed', 'timer_inc', 'cooking_start').execute()
+
+        assert len(trace) > 0 and sum(collector.guards_true.values()) > 0
+        collector.detach(interpreter)
+        trace.detach()
+        assert _instance_dict(interpreter) is None
+        assert _instance_dict(interpreter._evaluator) is None
+
+    def test_shared_caches(self, microwave, elevator):
+        first, second = CompactInterpreter(microwave.statechart), CompactInterpreter(microwave.statechart)
+        assert first._evaluator._evaluable_code is second._evaluator._evaluable_code
+        assert first._evaluator._code_info is second._evaluator._code_info
+        assert CompactInterpreter(elevator.statechart)._evaluator._code_info is not first._evaluator._code_info
+
+        # Caches can be emptied
+        first.queue('door_opened', 'item_placed', 'door_closed').execute()
+        assert len(second._evaluator._code_info) > 0
+        CompactPythonEvaluator.clear_shared_caches()
+        assert len(second._evaluator._code_info) == 0
+        second.queue('door_opened', 'item_placed', 'door_closed').execute()
+        assert second.configuration == first.configuration
+
+    def test_shared_caches_are_released(self):
+        statechart = import_from_yaml(filepath='docs/examples/microwave/microwave.yaml')
+        CompactInterpreter(statechart).queue('door_opened').execute()
+        assert statechart in CompactPythonEvaluator._shared_caches
+
+        caches = CompactPythonEvaluator._shared_caches[statechart]
+        reference = weakref.ref(statechart)
+        del statechart
+        gc.collect()
+        assert reference() is None
+        assert all(value is not caches for value in CompactPythonEvaluator._shared_caches.values())
+
+    def test_serialisable(self, microwave):
+        interpreter = CompactInterpreter(microwave.statechart)
+        interpreter.queue('door_opened', 'item_placed', 'door_closed', 'timer_inc', 'cooking_start').execute()
+
+        copy = pickle.loads(pickle.dumps(interpreter))
+        assert copy.configuration == interpreter.configuration
+        assert copy.context == interpreter.context
+        assert copy._evaluator._evaluable_code is CompactInterpreter(copy.statechart)._evaluator._evaluable_code
+
+        copy.queue('door_opened').execute()
+        assert 'door opened' in copy.configuration
+
+    def test_memory_footprint(self, elevator):
+        elevator.queue('floorSelected', floor=4).execute()
+        footprint = memory_footprint(elevator)
+
+        assert footprint['total'] == sum(value for key, value in footprint.items() if key != 'total')
+        assert footprint['interpreter'] > 0 and footprint['evaluator'] > 0
+        assert footprint['_configuration'] > 0
+        assert footprint['evaluator._evaluable_code'] > 0
+        # Shared with the statechart
+        assert footprint['_statechart'] == 0
+
+        compact = CompactInterpreter(elevator.statechart)
+        compact.queue('floorSelected', floor=4).execute()
+        compact_footprint = memory_footprint(compact)
+
+        assert compact_footprint.keys() == footprint.keys()
+        assert compact_footprint['evaluator._evaluable_code'] == 0
+        assert compact_footprint['total'] < footprint['total']
+
+    def test_memory_footprint_exclude(self, elevator):
+        footprint = memory_footprint(elevator)
+        assert memory_footprint(elevator, exclude=[elevator.clock])['clock'] == 0 < footprint['clock']
+
+
+class TestHibernation:
+    def test_fingerprint(self, elevator, microwave):
+        assert statechart_fingerprint(elevator.statechart) != statechart_fingerprint(microwave.statechart)
+
+    def test_fingerprint_is_canonical(self, elevator):
+        fingerprint = statechart_fingerprint(elevator.statechart)
+        assert fingerprint == statechart_fingerprint(import_from_yaml(export_to_yaml(elevator.statechart)))
+
+    def test_round_trip(self, elevator):
+        elevator.queue('floorSelected', floor=4).execute(max_steps=3)
+        elevator.queue(Event('floorSelected', floor=1, delay=5))
+
+        blob = hibernate(elevator)
+        assert isinstance(blob, bytes)
+
+        revived = revive(blob, elevator.statechart)
+        assert revived.configuration == elevator.configuration
+        assert revived.context == elevator.context
+        assert revived.time == elevator.time
+        assert revived.clock.time == elevator.clock.time
+        assert revived._external_queue == elevator._external_queue
+
+        for interpreter in (elevator, revived):
+            interpreter.clock.time += 10
+        assert [str(s) for s in revived.execute()] == [str(s) for s in elevator.execute()]
+        assert revived.context == elevator.context
+
+    def test_old_values(self):
+        statechart = import_from_yaml(filepath='docs/examples/elevator/elevator_contract.yaml')
+        interpreter = Interpreter(statechart)
+        interpreter.queue('floorSelected', floor=4).execute(max_steps=4)
+        assert 'movingUp' in interpreter.configuration
+
+        revived = revive(hibernate(interpreter), statechart)
+        revived.execute()  # Postconditions of movingUp rely on __old__
+        assert revived.context['current'] == 4
+
+    def test_history(self, history_statechart):
+        interpreter = Interpreter(history_statechart)
+        interpreter.queue('next', 'pause').execute()
+
+        revived = revive(hibernate(interpreter), history_statechart, interpreter_klass=CompactInterpreter)
+        assert isinstance(revived, CompactInterpreter)
+        revived.queue('continue').execute()
+        assert revived.configuration == ['root', 'loop', 's2']
+
+    def test_preamble_with_code(self, tmpdir):
+        statechart = import_from_yaml("""
+        statechart:
+          name: preamble
+          preamble: |
+            import math
+            from collections import OrderedDict
+            def double(x):
+              return 2 * x
+            x = 1
+          root state:
+            name: root
+            initial: s1
+            states:
+            - name: s1
+              contract:
+              - always: x >= __old__.x
+              transitions:
+              - target: s1
+                event: next
+                guard: math.floor(double(x)) > 0
+                action: x = double(x)
+        """)
+        interpreter = Interpreter(statechart)
+        interpreter.queue('next').execute()
+        interpreter.context['y'] = OrderedDict()
+
+        revived = revive(hibernate(interpreter), statechart)
+        assert revived.context['x'] == 2 and 'y' in revived.context
+        assert revived.context['double'](3) == 6
+        revived.queue('next').execute()
+        assert revived.context['x'] == 4
+
+        manager = SessionManager(statechart, MemoryStore(), capacity=1)
+        manager.deliver('a', [Event('next')])
+        manager.deliver('b', [Event('next')])
+        assert manager.queue('a', 'next').execute() and manager.get('a').context['x'] == 4
+
+        with EventRecorder(str(tmpdir.join('recording.jsonl'))) as recorder:
+            recorder.attach(interpreter)
+            interpreter.queue('next').execute()
+        assert replay(str(tmpdir.join('recording.jsonl')), statechart).interpreter.context['x'] == 4
+
+    def test_statechart_mismatch(self, elevator, microwave):
+        blob = hibernate(elevator)
+        with pytest.raises(ValueError, match='does not match'):
+            revive(blob, microwave.statechart)
+        with pytest.raises(ValueError, match='format'):
+            revive(b'\x00' + blob[1:], elevator.statechart)
+
+
+class TestInterpreterRegistry:
+    @pytest.fixture()
+    def clock(self):
+        return [0]
+
+    @pytest.fixture()
+    def registry(self, elevator, clock):
+        return InterpreterRegistry(elevator.statechart, idle_timeout=10, timer=lambda: clock[0])
+
+    def test_create(self, registry):
+        interpreter = registry.create('a')
+        assert registry.get('a') is interpreter
+        assert 'a' in registry and 'b' not in registry
+        assert len(registry) == 1 and registry.keys() == ['a']
+
+        with pytest.raises(KeyError):
+            registry.create('a')
+        with pytest.raises(KeyError):
+            registry.get('b')
+
+    def test_idle_timeout(self, registry, clock):
+        registry.create('a').execute()
+        clock[0] = 5
+        registry.create('b')
+        clock[0] = 11
+
+        registry.queue('b', 'floorSelected', floor=2).execute()
+        assert registry.is_hibernated('a') and not registry.is_hibernated('b')
+        assert registry.hibernations == 1 and registry.revivals == 0
+        assert len(registry) == 2
+
+        interpreter = registry.queue('a', 'floorSelected', floor=4)
+        assert not registry.is_hibernated('a')
+        assert registry.revivals == 1
+        interpreter.execute()
+        assert interpreter.context['current'] == 4
+
+    def test_hibernate_idle(self, registry, clock):
+        for key in range(5):
+            clock[0] = key
+            registry.create(key)
+
+        clock[0] = 13
+        assert registry.hibernate_idle() == [0, 1, 2]
+        assert [registry.is_hibernated(key) for key in range(5)] == [True, True, True, False, False]
+
+    def test_capacity(self, elevator):
+        registry = InterpreterRegistry(elevator.statechart, capacity=2)
+        for key in ('a', 'b', 'c'):
+            registry.create(key)
+        assert [registry.is_hibernated(key) for key in 'abc'] == [True, False, False]
+
+        registry.get('b')
+        registry.get('a')
+        assert [registry.is_hibernated(key) for key in 'abc'] == [False, False, True]
+        assert registry.hibernations == 2 and registry.revivals == 1
+
+        with pytest.raises(ValueError):
+            InterpreterRegistry(elevator.statechart, capacity=0)
+
+    def test_hibernate_and_remove(self, registry):
+        registry.create('a').queue('floorSelected', floor=4).execute()
+        registry.hibernate('a')
+        registry.hibernate('a')
+        assert registry.is_hibernated('a')
+        assert registry.get('a').context['current'] == 4
+
+        registry.remove('a')
+        assert 'a' not in registry
+        with pytest.raises(KeyError):
+            registry.is_hibernated('a')
+        with pytest.raises(KeyError):
+            registry.hibernate('a')
+
+
+@pytest.fixture(params=['memory', 'directory', 'sqlite'])
+def store(request, tmpdir):
+    if request.param == 'memory':
+        store = MemoryStore()
+    elif request.param == 'directory':
+        store = DirectoryStore(str(tmpdir.join('sessions')))
+    else:
+        store = SqliteStore(str(tmpdir.join('sessions.db')))
+    yield store
+    store.close()
+
+
+class TestSessionStore:
+    def test_store(self, store):
+        assert store.load('a') is None
+        assert 'a' not in store
+
+        store.save('a', b'1')
+        store.save('b/é', b'2')
+        store.save('a', b'3')
+        assert store.load('a') == b'3' and store.load('b/é') == b'2'
+        assert sorted(store.keys()) == ['a', 'b/é']
+        assert 'b/é' in store
+
+        store.delete('a')
+        store.delete('a')
+        assert store.keys() == ['b/é']
+
+    def test_persistence(self, tmpdir):
+        for klass, path in ((DirectoryStore, 'sessions'), (SqliteStore, 'sessions.db')):
+            store = klass(str(tmpdir.join(path)))
+            store.save('a', b'1')
+            store.close()
+
+            store = klass(str(tmpdir.join(path)))
+            assert store.load('a') == b'1'
+            store.close()
+
+    def test_directory_long_keys(self, tmpdir):
+        store = DirectoryStore(str(tmpdir.join('sessions')), fsync=False)
+        key = 'é' * (DirectoryStore.MAX_KEY_LENGTH // 2)
+        store.save(key, b'1')
+        assert store.keys() == [key]
+
+        with pytest.raises(ValueError, match='too long'):
+            store.save(key + 'a', b'2')
+
+    def test_sqlite_table_name(self, tmpdir):
+        store = SqliteStore(str(tmpdir.join('sessions.db')), table='my_sessions2')
+        store.save('a', b'1')
+        assert store.keys() == ['a']
+        store.close()
+
+        for table in ('', '2sessions', 'sessions"; DROP TABLE sessions; --', 'my sessions'):
+            with pytest.raises(ValueError, match='table name'):
+                SqliteStore(str(tmpdir.join('sessions.db')), table=table)
+
+
+class TestSessionManager:
+    @pytest.fixture()
+    def manager(self, elevator, store):
+        return SessionManager(elevator.statechart, store, capacity=2)
+
+    def test_lru_eviction(self, manager, store):
+        for key in ('a', 'b', 'c'):
+            manager.deliver(key, [Event('floorSelected', floor=1)])
+        assert not manager.is_resident('a') and manager.is_resident('b') and manager.is_resident('c')
+        assert store.keys() == ['a']
+        assert manager.creations == 3 and manager.hibernations == 1
+
+        manager.get('b')
+        manager.get('a')
+        assert manager.revivals == 1
+        assert manager.is_resident('b') and not manager.is_resident('c')
+        assert sorted(manager.keys()) == ['a', 'b', 'c'] and len(manager) == 3
+
+    def test_state_is_kept(self, manager):
+        manager.deliver('a', [Event('floorSelected', floor=4)])
+        for key in ('b', 'c'):
+            manager.get(key)
+        assert not manager.is_resident('a')
+
+        assert manager.get('a').context['current'] == 4
+        steps = manager.queue('a', 'floorSelected', floor=1).execute()
+        assert len(steps) > 0 and manager.get('a').context['current'] == 1
+
+    def test_deliver_all(self, manager, mocker):
+        manager.get = mocker.MagicMock(wraps=manager.get)
+        steps = manager.deliver_all([
+            ('a', Event('floorSelected', floor=1)), ('b', Event('floorSelected', floor=2)),
+            ('a', Event('floorSelected', floor=3)),
+        ])
+        assert list(steps.keys()) == ['a', 'b']
+        assert manager.get.call_count == 2
+        assert manager.get('a').context['current'] == 3
+
+    def test_flush_close_remove(self, elevator, store):
+        manager = SessionManager(elevator.statechart, store, capacity=10)
+        manager.deliver('a', [Event('floorSelected', floor=4)])
+        assert 'a' in manager and 'a' not in store
+
+        manager.flush()
+        assert 'a' in store and manager.is_resident('a')
+
+        manager.remove('a')
+        assert 'a' not in manager and 'a' not in store
+
+    def test_revived_state_is_kept_until_flush(self, manager, store):
+        manager.deliver('a', [Event('floorSelected', floor=4)])
+        manager.hibernate('a')
+        blob = store.load('a')
+
+        manager.deliver('a', [Event('floorSelected', floor=1)])
+        assert store.load('a') == blob  # Stale until the next eviction or flush
+        manager.flush()
+        assert store.load('a') != blob
+
+    def test_hibernate_and_create(self, manager, store):
+        manager.deliver('a', [Event('floorSelected', floor=4)])
+        manager.hibernate('a')
+        assert not manager.is_resident('a') and manager.is_hibernated('a') and 'a' in store
+
+        with pytest.raises(KeyError):
+            manager.create('a')
+        manager.create('b')
+        assert manager.creations == 2
+
+    def test_invalid_capacity(self, elevator):
+        with pytest.raises(ValueError):
+            SessionManager(elevator.statechart, MemoryStore(), capacity=0)
+
+
+class TestWriteAheadLog:
+    @pytest.fixture()
+    def path(self, tmpdir):
+        return str(tmpdir.join('log'))
+
+    def run(self, interpreter, clock, floors):
+        steps = []
+        for floor in floors:
+            interpreter.queue('floorSelected', floor=floor)
+            clock.time += 7
+            steps.extend(str(step) for step in interpreter.execute())
+        return steps
+
+    def test_recovery(self, elevator, path):
+        log = WriteAheadLog(path, checkpoint_every=None)
+        clock = SimulatedClock()
+        interpreter = log.recover(elevator.statechart, clock=clock)
+        assert interpreter.clock is clock
+
+        floors = [4, 1, 0, 5, 2]
+        assert self.run(interpreter, clock, floors) == self.run(elevator, elevator.clock, floors)
+        interpreter.queue(Event('floorSelected', floor=3, delay=5))
+        # No close, as if the process crashed
+
+        recovered = WriteAheadLog(path).recover(elevator.statechart)
+        assert recovered.configuration == interpreter.configuration
+        assert recovered.context == interpreter.context
+        assert recovered.time == interpreter.time
+        assert recovered._external_queue == interpreter._external_queue
+
+        clock.time += 10
+        recovered.clock.time = clock.time
+        assert [str(s) for s in recovered.execute()] == [str(s) for s in interpreter.execute()]
+
+    def test_checkpoints(self, elevator, path):
+        log = WriteAheadLog(path, checkpoint_every=10)
+        clock = SimulatedClock()
+        interpreter = log.recover(elevator.statechart, clock=clock)
+        self.run(interpreter, clock, [4, 1, 0, 5, 2, 3])
+        assert log.checkpoints > 1
+        assert len([name for name in os.listdir(path) if name.endswith('.log')]) == 1
+        log.close()
+
+        log = WriteAheadLog(path, checkpoint_every=10)
+        recovered = log.recover(elevator.statechart)
+        assert 0 <= log.replayed < 10
+        assert recovered.context == interpreter.context
+
+    def test_truncated_record(self, elevator, path):
+        log = WriteAheadLog(path, checkpoint_every=None)
+        clock = SimulatedClock()
+        interpreter = log.recover(elevator.statechart, clock=clock)
+        self.run(interpreter, clock, [4])
+        interpreter.queue('floorSelected', floor=1)
+        log.close()
+
+        segment = os.path.join(path, [name for name in os.listdir(path) if name.endswith('.log')][0])
+        with open(segment, 'r+b') as f:
+            f.truncate(os.path.getsize(segment) - 3)
+
+        log = WriteAheadLog(path)
+        recovered = log.recover(elevator.statechart)
+        assert recovered._external_queue == []
+        assert recovered.context['current'] == 4
+
+        # The log can be appended to after the discarded record
+        recovered.queue('floorSelected', floor=2)
+        log.close()
+        assert len(WriteAheadLog(path).recover(elevator.statechart)._external_queue) == 1
+
+    def test_sync_batching(self, elevator, path):
+        log = WriteAheadLog(path, sync_every=5, fsync=False, checkpoint_every=None)
+        interpreter = log.recover(elevator.statechart)
+        for floor in range(4):
+            interpreter.queue('floorSelected', floor=floor)
+        assert log.records == 4 and log.syncs == 0
+        interpreter.queue('floorSelected', floor=4)
+        assert log.syncs == 1
+
+    def test_close_and_mismatch(self, elevator, microwave, path):
+        log = WriteAheadLog(path)
+        interpreter = log.recover(elevator.statechart)
+        with pytest.raises(ValueError, match='already attached'):
+            log.recover(elevator.statechart)
+
+        log.close()
+        interpreter.queue('floorSelected', floor=1)
+        assert log.records == 0 and log.interpreter is None
+
+        with pytest.raises(ValueError, match='does not match'):
+            WriteAheadLog(path).recover(microwave.statechart)
+
+    def test_close_stacked(self, elevator, path):
+        log = WriteAheadLog(path, fsync=False)
+        interpreter = log.recover(elevator.statechart)
+        tracer = ChromeTracer()
+        tracer.attach(interpreter)
+        with pytest.raises(ValueError, match='wrapped again'):
+            log.close()
+
+        tracer.detach(interpreter)
+        log.close()
+        assert 'execute_once' not in interpreter.__dict__ and '_queue_event' not in interpreter.__dict__
+
+    def test_invalid_parameters(self, path):
+        with pytest.raises(ValueError):
+            WriteAheadLog(path, sync_every=0)
+        with pytest.raises(ValueError):
+            WriteAheadLog(path, checkpoint_every=0)
+
+
+class TestEventRecorder:
+    @pytest.fixture()
+    def recording(self, elevator, tmpdir):
+        filepath = str(tmpdir.join('recording.jsonl'))
+        elevator.queue('floorSelected', floor=2).execute()
+
+        with EventRecorder(filepath) as recorder:
+            recorder.attach(elevator)
+            for floor in (4, 1, 5):
+                elevator.queue('floorSelected', floor=floor)
+                elevator.clock.time += 6
+                elevator.execute()
+            elevator.queue(Event('floorSelected', floor=0, delay=3))
+            assert recorder.events == 4 and recorder.steps > 3
+        return filepath
+
+    def test_replay(self, elevator, recording):
+        report = replay(recording, elevator.statechart)
+        assert report.events == 4 and report.divergences == []
+        assert report.steps_per_second > 0
+
+        interpreter = report.interpreter
+        assert interpreter.configuration == elevator.configuration
+        assert interpreter.context == elevator.context
+        assert interpreter._external_queue == elevator._external_queue
+
+    def test_divergence(self, elevator, recording):
+        statechart = import_from_yaml(export_to_yaml(elevator.statechart))
+        statechart.state_for('doorsOpen').on_entry = 'destination = 2'
+        with open(recording) as f:
+            lines = f.readlines()
+        with pytest.raises(ValueError, match='does not match'):
+            replay(lines, statechart)
+
+        # Replace the digest of the first recorded step
+        number = next(i for i, line in enumerate(lines) if '"step"' in line)
+        record = json.loads(lines[number])
+        record['digest'] += 1
+        lines[number] = json.dumps(record)
+        assert replay(lines, elevator.statechart).divergences == [number + 1]
+        assert replay(lines, elevator.statechart, check=False).divergences == []
+
+    def test_detach(self, elevator, tmpdir):
+        recorder = EventRecorder(str(tmpdir.join('recording.jsonl')))
+        recorder.attach(elevator)
+        with pytest.raises(ValueError, match='already attached'):
+            recorder.attach(elevator)
+        recorder.close()
+
+        elevator.queue('floorSelected', floor=1).execute()
+        assert recorder.events == 0 and recorder.steps == 0
+
+    def test_detach_stacked(self, elevator, tmpdir):
+        tracer = ChromeTracer()
+        tracer.attach(elevator)
+        recorder = EventRecorder(str(tmpdir.join('recording.jsonl')))
+        recorder.attach(elevator)
+        recorder.close()
+
+        elevator.queue('floorSelected', floor=1).execute()
+        assert recorder.steps == 0 and tracer.sampled_steps > 0
+
+    @pytest.mark.parametrize('parameters', [{'floor': (1, 2)}, {'floor': {1: 2}}, {'floor': object()}])
+    def test_parameters_not_preserved(self, elevator, parameters):
+        output = io.StringIO()
+        recorder = EventRecorder(output)
+        recorder.attach(elevator)
+        header = output.getvalue()
+
+        with pytest.raises(ValueError, match='Parameters'):
+            elevator.queue('floorSelected', **parameters)
+        assert output.getvalue() == header and recorder.events == 0
+        assert len(elevator._external_queue) == 0
+
+    def test_cli(self, elevator, recording, tmpdir, capsys):
+        filepath = str(tmpdir.join('elevator.yaml'))
+        export_to_yaml(elevator.statechart, filepath=filepath)
+        assert replay_cli([filepath, recording, '--json']) == 0
+        assert json.loads(capsys.readouterr().out)['events'] == 4
+
+
+class TestBinaryTrace:
+    @pytest.fixture()
+    def traces(self, elevator, tmpdir):
+        filepath = str(tmpdir.join('trace.bin'))
+        trace = log_trace(elevator)
+        with BinaryTraceWriter(filepath) as writer:
+            writer.attach(elevator)
+            for floor in (4, 1, 5, 0):
+                elevator.queue(Event('floorSelected', floor=floor))
+                elevator.clock.time += 6
+                elevator.execute()
+            assert writer.steps == len(trace)
+        return filepath, trace
+
+    @staticmethod
+    def summary(step):
+        return (
+            float(step.time), step.event, [(t.source, t.target, t.event) for t in step.transitions],
+            step.entered_states, step.exited_states, step.sent_events, [s.event for s in step.steps],
+        )
+
+    def test_read(self, elevator, traces):
+        filepath, trace = traces
+        with BinaryTraceReader(filepath, statechart=elevator.statechart) as reader:
+            assert len(reader) == len(trace)
+            assert all(isinstance(step, MacroStepView) for step in reader)
+            assert [self.summary(step) for step in reader] == [self.summary(step) for step in trace]
+            assert reader[-1].transitions == trace[-1].transitions
+            assert [self.summary(step) for step in reader[1:3]] == [self.summary(step) for step in trace[1:3]]
+            assert coverage_from_trace(reader) == coverage_from_trace(trace)
+
+    def test_read_with_reordered_statechart(self, elevator, traces):
+        filepath, trace = traces
+        statechart = import_from_yaml(export_to_yaml(elevator.statechart))
+        transitions = statechart.transitions
+        for transition in transitions:
+            statechart.remove_transition(transition)
+        for transition in reversed(transitions):
+            statechart.add_transition(transition)
+
+        with BinaryTraceReader(filepath, statechart=statechart) as reader:
+            assert [step.transitions for step in reader] == [step.transitions for step in trace]
+            assert all(any(t is other for other in transitions) for step in reader for t in step.transitions)
+
+    def test_detach_stacked(self, elevator, tmpdir):
+        tracer = ChromeTracer()
+        tracer.attach(elevator)
+        with BinaryTraceWriter(str(tmpdir.join('trace.bin'))) as writer:
+            writer.attach(elevator)
+        elevator.queue('floorSelected', floor=4).execute()
+        assert writer.steps == 0 and tracer.sampled_steps > 0
+
+    def test_read_without_statechart(self, traces):
+        filepath, trace = traces
+        with BinaryTraceReader(filepath) as reader:
+            assert [self.summary(step) for step in reader] == [self.summary(step) for step in trace]
+            assert reader[-1].transitions[0].guard is None
+
+    def test_truncated_trace(self, traces):
+        filepath, trace = traces
+        with open(filepath, 'r+b') as f:
+            f.truncate(os.path.getsize(filepath) - 1)
+        with BinaryTraceReader(filepath) as reader:
+            assert len(reader) == len(trace) - 1
+
+    def test_parameters(self, elevator, tmpdir):
+        filepath = str(tmpdir.join('trace.bin'))
+        with BinaryTraceWriter(filepath, parameters=False) as writer:
+            writer.attach(elevator)
+            elevator.queue('floorSelected', floor=4).execute()
+        with BinaryTraceReader(filepath) as reader:
+            assert reader[1].event == Event('floorSelected')
+
+    def test_kinds_of_events(self, elevator, tmpdir):
+        filepath = str(tmpdir.join('trace.bin'))
+        step = MacroStep(1, [MicroStep(
+            event=MetaEvent('step started'),
+            sent_events=[InternalEvent('a', x=1), Event('b'), MetaEvent('event sent', event=Event('c'))],
+        )])
+        with BinaryTraceWriter(filepath) as writer:
+            writer.attach(elevator)
+            writer.write(step)
+        with BinaryTraceReader(filepath) as reader:
+            decoded = reader[0]
+            assert [decoded.event] + decoded.sent_events == [step.event] + step.sent_events
+            assert [type(e) for e in [decoded.event] + decoded.sent_events] == [
+                MetaEvent, InternalEvent, Event, MetaEvent]
+
+    def test_invalid_files(self, elevator, microwave, traces, tmpdir):
+        with pytest.raises(ValueError, match='does not match'):
+            BinaryTraceReader(traces[0], statechart=microwave.statechart)
+
+        filepath = str(tmpdir.join('empty.bin'))
+        open(filepath, 'wb').close()
+        with pytest.raises(ValueError, match='not a binary trace'):
+            BinaryTraceReader(filepath)
+
+
 class TestLogTrace:
     @pytest.fixture(autouse=True)
     def setup(self, elevator):
@@ -489,6 +1477,78 @@ class TestLogTrace:
         assert steps == self.steps
 
 
+class TestBoundedTrace:
+    def test_capacity(self, elevator):
+        trace = BoundedTrace(elevator, 3)
+        steps = elevator.queue('floorSelected', floor=4).execute()
+        assert len(steps) > 3
+
+        assert trace.steps == steps[-3:] and list(trace) == steps[-3:]
+        assert trace.recorded == len(steps) and trace.discarded == len(steps) - 3
+
+        trace.detach()
+        elevator.queue('floorSelected', floor=1).execute()
+        assert trace.recorded == len(steps)
+
+        trace.clear()
+        assert len(trace) == 0
+
+    def test_detach_stacked(self, elevator):
+        steps = log_trace(elevator)
+        first = BoundedTrace(elevator)
+        second = BoundedTrace(elevator)
+        with pytest.raises(ValueError, match='wrapped again'):
+            first.detach()
+
+        second.detach()
+        first.detach()
+        elevator.queue('floorSelected', floor=4).execute()
+        assert len(steps) > 0 and len(first) == len(second) == 0
+
+    def test_dump(self, elevator, tmpdir):
+        trace = BoundedTrace(elevator, 2)
+        elevator.queue('floorSelected', floor=4).execute()
+
+        output = trace.dump()
+        lines = output.splitlines()
+        assert lines[0] == '{} macro steps recorded, {} discarded'.format(trace.recorded, trace.discarded)
+        assert lines[1:] == [str(step) for step in trace.steps]
+
+        filepath = str(tmpdir.join('trace.log'))
+        trace.dump(filepath)
+        trace.dump(filepath)
+        with open(filepath) as f:
+            assert f.read() == output * 2
+
+    def test_dump_on_contract_error(self, elevator, tmpdir):
+        filepath = str(tmpdir.join('trace.log'))
+        trace = BoundedTrace(elevator, 10, dump_to=filepath)
+        elevator.execute()
+        elevator.statechart.state_for('movingUp').invariants.append('False')
+
+        with pytest.raises(InvariantError) as e:
+            elevator.queue('floorSelected', floor=4).execute()
+        assert trace.error is e.value
+        with open(filepath) as f:
+            content = f.read()
+        assert str(trace.steps[-1]) in content and 'InvariantError' in content
+
+    def test_dump_on_property_error(self, elevator):
+        output = io.StringIO()
+        trace = BoundedTrace(elevator, dump_to=output)
+        elevator.bind_property_statechart(
+            import_from_yaml(filepath='docs/examples/elevator/tester_elevator_7th_floor_never_reached.yaml'))
+
+        with pytest.raises(PropertyStatechartError):
+            elevator.queue('floorSelected', floor=7).execute()
+        assert isinstance(trace.error, PropertyStatechartError)
+        assert output.getvalue() == trace.dump()
+
+    def test_invalid_capacity(self, elevator):
+        with pytest.raises(ValueError):
+            BoundedTrace(elevator, 0)
+
+
 def test_run_in_background(elevator):
     from time import sleep
 
@@ -543,6 +1603,186 @@ class TestCoverageFromTrace:
         assert coverage_from_trace(trace) == expected
 
 
+class TestCoverageCollector:
+    @pytest.fixture()
+    def statechart(self):
+        return generate_statechart(depth=3, regions=2, transitions=60, guards=0.5, actions=0.5, history=0.3)
+
+    def run(self, statechart, collector, seed=0):
+        interpreter = Interpreter(statechart)
+        collector.attach(interpreter)
+        trace = log_trace(interpreter)
+        interpreter.execute()
+        for event in generate_events(statechart, 200, seed=seed):
+            interpreter.queue(event).execute()
+        return interpreter, trace
+
+    @pytest.mark.parametrize('seed', range(3))
+    def test_same_as_trace(self, statechart, seed):
+        collector = CoverageCollector(statechart)
+        _, trace = self.run(statechart, collector, seed)
+        assert collector.coverage() == coverage_from_trace(trace)
+
+    def test_guards(self, elevator):
+        collector = CoverageCollector(elevator.statechart)
+        collector.attach(elevator)
+        elevator.queue('floorSelected', floor=4).execute()
+
+        guarded = [i for i, t in enumerate(elevator.statechart.transitions) if t.guard is not None]
+        assert sum(collector.guards_true[i] for i in guarded) > 0
+        assert sum(collector.guards_false[i] for i in guarded) > 0
+        assert set(collector.guards_true) | set(collector.guards_false) <= set(guarded)
+        assert set(collector.uncovered_guards()) <= {elevator.statechart.transitions[i] for i in guarded}
+
+        collector.detach(elevator)
+        collector = CoverageCollector(elevator.statechart, guards=False)
+        collector.attach(elevator)
+        elevator.queue('floorSelected', floor=1).execute()
+        assert len(collector.guards_true) == 0 and 'Guards' not in collector.report()
+
+    @pytest.mark.parametrize('guards', [True, False])
+    def test_transitions_with_same_source_target_and_event(self, guards):
+        statechart = import_from_yaml("""
+        statechart:
+          name: priorities
+          root state:
+            name: root
+            initial: s1
+            states:
+            - name: s1
+              transitions:
+              - target: s2
+                event: e
+              - target: s2
+                event: e
+                priority: 1
+              - target: s2
+                event: f
+                guard: x
+              - target: s2
+                event: f
+                guard: not x
+            - name: s2
+              transitions:
+              - target: s1
+                event: back
+          preamble: x = False
+        """)
+        interpreter = Interpreter(statechart)
+        collector = CoverageCollector(statechart, guards=guards)
+        collector.attach(interpreter)
+        interpreter.queue('e', 'back', 'f').execute()
+
+        assert {str(t): n for t, n in collector.coverage()['processed transitions'].items()} == {
+            's1 -> 1:e [None] -> s2': 1, 's2 -> back [None] -> s1': 1, 's1 -> f [not x] -> s2': 1}
+        assert collector.ambiguous_transitions == 0
+        assert len(collector.guards_false) == (1 if guards else 0)
+
+        # A processed transition that cannot be identified is not credited to any transition
+        listener = collector._attached[id(interpreter)][0]
+        listener(MetaEvent('transition processed', source='s1', target='s2', event=Event('e')))
+        assert collector.ambiguous_transitions == 1 and sum(collector.processed_transitions.values()) == 3
+        assert '1 processed transitions could not be identified' in collector.report()
+        assert CoverageCollector.from_dict(statechart, collector.as_dict()).ambiguous_transitions == 1
+
+    def test_detach(self, elevator):
+        collector = CoverageCollector(elevator.statechart)
+        collector.attach(elevator)
+        with pytest.raises(ValueError, match='already attached'):
+            collector.attach(elevator)
+
+        collector.detach(elevator)
+        elevator.queue('floorSelected', floor=4).execute()
+        assert len(collector.entered_states) == 0 and len(collector.guards_false) == 0
+
+    def test_merge(self, statechart):
+        collectors = [CoverageCollector(statechart) for _ in range(3)]
+        for seed, collector in enumerate(collectors):
+            self.run(statechart, collector, seed)
+
+        # Merge across processes through a JSON representation
+        merged = CoverageCollector(statechart)
+        for collector in collectors:
+            merged.merge(json.loads(json.dumps(collector.as_dict())))
+        assert merged.as_dict() == (collectors[0] + collectors[1] + collectors[2]).as_dict()
+        assert sum(merged.entered_states.values()) == sum(sum(c.entered_states.values()) for c in collectors)
+        assert len(merged.uncovered_transitions()) <= min(len(c.uncovered_transitions()) for c in collectors)
+
+        # A single collector can be attached to several interpreters
+        shared = CoverageCollector(statechart)
+        for seed in range(3):
+            self.run(statechart, shared, seed)
+        assert shared.as_dict() == merged.as_dict()
+
+    def test_merge_reordered(self, statechart):
+        collector = CoverageCollector(statechart)
+        self.run(statechart, collector)
+
+        # A copy of the statechart whose transitions are in reverse order
+        reordered = import_from_yaml(export_to_yaml(statechart))
+        transitions = reordered.transitions
+        for transition in transitions:
+            reordered.remove_transition(transition)
+        for transition in reversed(transitions):
+            reordered.add_transition(transition)
+        assert [str(t) for t in reordered.transitions] != [str(t) for t in statechart.transitions]
+
+        def counts(c, counter):
+            return sorted((str(t), counter[i]) for i, t in enumerate(c.statechart.transitions))
+
+        for other in (CoverageCollector.from_dict(reordered, json.loads(json.dumps(collector.as_dict()))),
+                      CoverageCollector(reordered).merge(collector)):
+            assert counts(other, other.processed_transitions) == counts(collector, collector.processed_transitions)
+            assert counts(other, other.guards_true) == counts(collector, collector.guards_true)
+            assert counts(other, other.guards_false) == counts(collector, collector.guards_false)
+            assert other.as_dict() == collector.as_dict()
+
+        data = collector.as_dict()
+        data['processed transitions']['unknown'] = 1
+        with pytest.raises(ValueError, match='unknown'):
+            CoverageCollector.from_dict(statechart, data)
+
+    def test_detach_stacked(self, elevator):
+        evaluate_guards = elevator._evaluator.evaluate_guards
+        first, second = CoverageCollector(elevator.statechart), CoverageCollector(elevator.statechart)
+        first.attach(elevator)
+        second.attach(elevator)
+
+        # The last collector must be detached first
+        with pytest.raises(ValueError, match='wrapped again'):
+            first.detach(elevator)
+        elevator.queue('floorSelected', floor=4).execute()
+        assert first.guards_true == second.guards_true and len(first.guards_true) > 0
+
+        second.detach(elevator)
+        elevator.queue('floorSelected', floor=1).execute()
+        assert first.guards_true != second.guards_true
+        first.detach(elevator)
+        assert elevator._evaluator.evaluate_guards == evaluate_guards
+        assert 'evaluate_guards' not in elevator._evaluator.__dict__
+
+    def test_report(self, elevator):
+        collector = CoverageCollector(elevator.statechart)
+        collector.attach(elevator)
+        elevator.execute()
+
+        uncovered = collector.uncovered_states()
+        assert 'active' not in uncovered and 'movingUp' in uncovered
+        assert collector.uncovered_transitions() == elevator.statechart.transitions
+        report = collector.report()
+        assert 'never entered: movingUp' in report
+        assert 'Transitions: 0/{} processed'.format(len(elevator.statechart.transitions)) in report
+
+    def test_mismatch(self, elevator, microwave):
+        collector = CoverageCollector(elevator.statechart)
+        with pytest.raises(ValueError):
+            collector.attach(microwave)
+        with pytest.raises(ValueError):
+            collector.merge(CoverageCollector(microwave.statechart))
+        with pytest.raises(ValueError):
+            CoverageCollector.from_dict(microwave.statechart, collector.as_dict())
+
+
 class TestInterpreterBinding:
     @pytest.fixture()
     def interpreter(self, simple_statechart):
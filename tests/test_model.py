@@ -78,6 +78,10 @@ class TestStatechartTraveral:
         assert sorted(composite_statechart.leaf_for(['s1', 's2'])) == ['s1', 's2']
         assert sorted(composite_statechart.leaf_for(['s1', 's1b1', 's2'])) == ['s1b1', 's2']
         assert sorted(composite_statechart.leaf_for(['s1', 's1b', 's1b1'])) == ['s1b1']
+        assert sorted(composite_statechart.leaf_for(['s1b1', 's1', 's1b1', 's1a'])) == ['s1a', 's1b1']
+
+        with pytest.raises(StatechartError):
+            composite_statechart.leaf_for(['s1', 'unknown'])
 
     def test_events_for(self, composite_statechart):
         assert set(composite_statechart.events_for()) == {'click', 'close', 'validate'}
@@ -287,6 +291,48 @@ class TestTransition:
         internal_statechart.validate()
 
 
+    def test_indexes_after_rotate(self, internal_statechart):
+        tr = next(t for t in internal_statechart.transitions if t.source == 's1')
+        internal_statechart.rotate_transition(tr, new_source='active', new_target='s1')
+
+        assert tr not in internal_statechart.transitions_from('s1')
+        assert any(t is tr for t in internal_statechart.transitions_from('active'))
+        assert any(t is tr for t in internal_statechart.transitions_to('s1'))
+
+        internal_statechart.rotate_transition(tr, new_target=None)
+        assert any(t is tr for t in internal_statechart.transitions_to('active'))
+
+    def test_indexes_keep_order_after_changes(self, example_from_tests):
+        transitions = example_from_tests.transitions
+        for transition in transitions[::2]:
+            example_from_tests.rotate_transition(transition, new_source=transitions[-1].source)
+        name = transitions[0].source
+        example_from_tests.rename_state(name, name + ' renamed')
+
+        for name in example_from_tests.states:
+            assert example_from_tests.transitions_from(name) == [t for t in transitions if t.source == name]
+            assert example_from_tests.transitions_to(name) == [
+                t for t in transitions if t.target == name or (t.target is None and t.source == name)
+            ]
+
+    def test_indexes_after_remove(self, internal_statechart):
+        for transition in internal_statechart.transitions_with('next'):
+            internal_statechart.remove_transition(transition)
+
+        assert internal_statechart.transitions_with('next') == []
+        assert 'next' not in internal_statechart.events_for()
+
+    def test_indexes_match_scan(self, example_from_tests):
+        transitions = example_from_tests.transitions
+        for name in example_from_tests.states:
+            assert example_from_tests.transitions_from(name) == [t for t in transitions if t.source == name]
+            assert example_from_tests.transitions_to(name) == [
+                t for t in transitions if t.target == name or (t.target is None and t.source == name)
+            ]
+        for event in {t.event for t in transitions}:
+            assert example_from_tests.transitions_with(event) == [t for t in transitions if t.event == event]
+
+
 class TestStatechartStates:
     def test_remove_existing_state(self, internal_statechart):
         internal_statechart.remove_state('active')
@@ -420,6 +466,19 @@ class TestStatechartStates:
         assert len(internal_statechart.transitions_to('s2')) == 2
         internal_statechart.validate()
 
+    def test_rename_adapt_indexes(self, internal_statechart):
+        internal_statechart.rename_state('active', 'new name')
+
+        assert len(internal_statechart.transitions_from('new name')) == 2
+        assert 'active' not in internal_statechart._transitions_by_source
+
+    def test_remove_state_adapt_indexes(self, internal_statechart):
+        internal_statechart.remove_state('s1')
+
+        assert all(t.source != 's1' and t.target != 's1' for t in internal_statechart.transitions)
+        assert 's1' not in internal_statechart._transitions_by_source
+        assert 's1' not in internal_statechart._transitions_by_target
+
     def test_rename_root(self, internal_statechart):
         internal_statechart.rename_state('root', 'new root')
 
@@ -2,8 +2,8 @@ import pytest
 
 from time import sleep 
 
-from sismic.runner import AsyncRunner
-from sismic.interpreter import Interpreter
+from sismic.runner import AsyncRunner, RunnerMetrics
+from sismic.interpreter import Interpreter, InterpreterMetrics
 
 
 class TestAsyncRunner:
@@ -143,3 +143,17 @@ class TestAsyncRunner:
         runner.start()
         runner.stop()
         runner.wait()
+
+    def test_metrics(self, simple_statechart):
+        metrics = RunnerMetrics()
+        runner = AsyncRunner(Interpreter(simple_statechart, metrics=InterpreterMetrics()),
+                             interval=0, execute_all=True, metrics=metrics)
+        runner.start()
+        runner.interpreter.queue('goto s2', 'goto final')
+        runner.wait()
+
+        assert runner.interpreter.final
+        assert metrics.cycles > 0
+        assert metrics.macro_steps == runner.interpreter.metrics.macro_steps == 4
+        assert metrics.latency.count == metrics.cycles
+        assert metrics.as_dict()['cycles'] == metrics.cycles